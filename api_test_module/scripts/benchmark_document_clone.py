@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Document Clone Benchmark Script
+文档克隆性能测试脚本
+
+Compares the legacy save-to-temp-and-reload copy used before applying
+modifications with the in-memory clone from cached original bytes.
+对比应用修改前旧的"保存临时文件再重新加载"复制方式与基于缓存字节的内存克隆方式。
+
+Usage / 使用方法:
+    python benchmark_document_clone.py [--size-mb 10] [--iterations 5]
+
+Author: sawyer-shi
+License: Apache 2.0
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+from docx import Document
+from docx.shared import Inches
+from PIL import Image
+
+# 允许从项目根目录导入 / Allow imports from project root
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from utils.document_processor import EnhancedWordProcessor
+
+
+def build_image_heavy_document(path: str, size_mb: int):
+    """生成图片密集型测试文档 / Build an image-heavy test document"""
+    doc = Document()
+    image_bytes = 0
+    index = 0
+
+    while image_bytes < size_mb * 1024 * 1024:
+        # 随机噪声PNG几乎不可压缩，能真实反映大文档体积 / Noise PNGs barely compress
+        image = Image.frombytes('RGB', (512, 512), os.urandom(512 * 512 * 3))
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        image_bytes += buffer.tell()
+        buffer.seek(0)
+
+        doc.add_paragraph(f"Figure {index}: benchmark image / 性能测试图片")
+        doc.add_picture(buffer, width=Inches(3))
+        index += 1
+
+    doc.save(path)
+    return index
+
+
+def legacy_clone(processor: EnhancedWordProcessor):
+    """旧方式：保存到临时文件再重新加载 / Legacy: save to temp file and reload"""
+    temp_path = os.path.join(tempfile.gettempdir(), f"temp_original_{id(processor)}.docx")
+    processor.original_doc.save(temp_path)
+    try:
+        return Document(temp_path)
+    finally:
+        os.remove(temp_path)
+
+
+def time_it(func, iterations: int) -> float:
+    """返回平均耗时（秒） / Return average duration in seconds"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    """主函数 / Main function"""
+    parser = argparse.ArgumentParser(description='Document clone benchmark / 文档克隆性能测试')
+    parser.add_argument('--size-mb', type=int, default=10, help='Approximate image payload in MB')
+    parser.add_argument('--iterations', type=int, default=5, help='Clones per method')
+    args = parser.parse_args()
+
+    print("⏱️  Document Clone Benchmark / 文档克隆性能测试")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        doc_path = os.path.join(work_dir, 'image_heavy.docx')
+        image_count = build_image_heavy_document(doc_path, args.size_mb)
+        file_size = os.path.getsize(doc_path) / (1024 * 1024)
+        print(f"Document / 文档: {image_count} images, {file_size:.1f} MB")
+
+        processor = EnhancedWordProcessor()
+        with open(doc_path, 'rb') as f:
+            processor._original_bytes = f.read()
+        processor.original_doc = Document(io.BytesIO(processor._original_bytes))
+
+        legacy = time_it(lambda: legacy_clone(processor), args.iterations)
+        in_memory = time_it(processor._clone_original_document, args.iterations)
+
+    print(f"Legacy save+reload / 旧方式:   {legacy * 1000:8.1f} ms")
+    print(f"In-memory clone / 内存克隆:    {in_memory * 1000:8.1f} ms")
+    if in_memory > 0:
+        print(f"Speedup / 加速比:              {legacy / in_memory:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
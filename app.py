@@ -72,6 +72,16 @@ def create_app(config_name=None):
     os.makedirs(app.config.get('UPLOAD_FOLDER', 'uploads'), exist_ok=True)
     os.makedirs(app.config.get('TEMP_FOLDER', 'temp'), exist_ok=True)
     
+    # 在处理第一个请求时启动后台临时文件清理（只启动一次）；
+    # 并行改写的spawn工作进程会重新导入主模块，但从不处理请求，因此不会启动清理线程
+    if app.config.get('JANITOR_INTERVAL'):
+        from routes.document_routes import janitor
+        
+        @app.before_request
+        def start_janitor():
+            """启动后台临时文件清理"""
+            janitor.start()
+    
     return app
 
 # 创建应用实例
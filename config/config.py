@@ -31,9 +31,45 @@ class Config:
     UPLOAD_FOLDER = 'uploads'
     ALLOWED_EXTENSIONS = {'docx', 'doc', 'txt'}
     
+    # 异步上传配置：后台提取的工作线程数，以及内容请求等待提取完成的最长秒数（超时返回202）
+    EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS', 2))
+    EXTRACTION_WAIT_TIMEOUT = float(os.environ.get('EXTRACTION_WAIT_TIMEOUT', 10))
+    
+    # 文档存储配置：已加载文档的内存预算（MB，0为不限制），超出时释放最近最少使用的文档，下次访问时从上传文件重新加载
+    DOCUMENT_STORE_MEMORY_BUDGET = int(os.environ.get('DOCUMENT_STORE_MEMORY_BUDGET_MB', 1024)) * 1024 * 1024
+    # 多个工作进程共享的文档登记表（SQLite）
+    DOCUMENT_REGISTRY_PATH = os.environ.get('DOCUMENT_REGISTRY_PATH', os.path.join('uploads', 'documents.sqlite3'))
+    
     # 临时文件配置
     TEMP_FOLDER = 'temp'
     TEMP_FILE_LIFETIME = timedelta(hours=24)  # 临时文件保存24小时
+    # 后台清理：两轮清理之间的秒数（0为不启动）以及每轮最多删除的文档数和文件数
+    JANITOR_INTERVAL = int(os.environ.get('JANITOR_INTERVAL', 600))
+    JANITOR_BATCH_SIZE = int(os.environ.get('JANITOR_BATCH_SIZE', 100))
+    # 提取结果缓存：按上传文件内容哈希和提取器版本保存提取内容、样式、图片索引和文本索引，重启后不再重新解析
+    EXTRACTION_CACHE_FOLDER = os.environ.get('EXTRACTION_CACHE_FOLDER', os.path.join('temp', 'extraction_cache'))
+    
+    # 流式改写配置：word/document.xml超过该大小时修改文档不经过python-docx对象模型（原始文档仍解析一次用于提取）
+    STREAMING_REWRITE_THRESHOLD = int(os.environ.get('STREAMING_REWRITE_THRESHOLD', 100 * 1024 * 1024))  # 100MB
+    
+    # 并行改写配置：正文块级元素数量达到阈值时在进程池中分片应用修改，工作进程数为1时关闭
+    PARALLEL_APPLY_WORKERS = int(os.environ.get('PARALLEL_APPLY_WORKERS', os.cpu_count() or 1))
+    PARALLEL_APPLY_MIN_BLOCKS = int(os.environ.get('PARALLEL_APPLY_MIN_BLOCKS', 2000))
+    
+    # 内容分窗配置：接口每次返回的内容块数量，前端滚动时按窗口继续获取
+    CONTENT_WINDOW_SIZE = int(os.environ.get('CONTENT_WINDOW_SIZE', 200))
+    CONTENT_WINDOW_MAX = int(os.environ.get('CONTENT_WINDOW_MAX', 2000))
+    
+    # 响应压缩配置：文档信息按版本缓存序列化和压缩结果，小于阈值的响应不压缩
+    PAYLOAD_COMPRESSION_MIN_SIZE = int(os.environ.get('PAYLOAD_COMPRESSION_MIN_SIZE', 1024))
+    PAYLOAD_GZIP_LEVEL = int(os.environ.get('PAYLOAD_GZIP_LEVEL', 9))
+    PAYLOAD_BROTLI_QUALITY = int(os.environ.get('PAYLOAD_BROTLI_QUALITY', 9))
+    
+    # 图片预览配置：按请求宽度向上取整到以下宽度生成WebP/JPEG预览图，按内容哈希和宽度缓存到磁盘
+    THUMBNAIL_FOLDER = os.environ.get('THUMBNAIL_FOLDER', os.path.join('temp', 'thumbnails'))
+    THUMBNAIL_WIDTHS = (320, 640, 960, 1280, 1920)
+    THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', min(4, os.cpu_count() or 1)))
+    THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY', 80))
     
     # 国际化配置
     LANGUAGES = {
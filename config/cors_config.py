@@ -47,6 +47,7 @@ class CORSConfig:
         'X-Custom-Header',
         'Cache-Control',
         'Pragma',
+        'If-None-Match',
         'X-API-Key',
         'X-Client-Version'
     ]
@@ -67,6 +68,7 @@ class CORSConfig:
         'Content-Disposition',
         'Content-Length',
         'Content-Type',
+        'ETag',
         'X-Total-Count',
         'X-Page-Count'
     ]
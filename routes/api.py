@@ -106,10 +106,15 @@ def api_root():
                 'upload': '/api/upload_document',
                 'download': '/api/download_document/<doc_id>',
                 'info': '/api/document_info/<doc_id>',
+                'status': '/api/document_status/<doc_id>',
+                'content': '/api/document_content/<doc_id>?offset=&limit=&version=',
+                'search': '/api/search/<doc_id>?q=',
+                'image': '/api/document_image/<doc_id>/<hash>',
                 'cleanup': '/api/cleanup/<doc_id>'
             },
             'modifications': {
                 'add': '/api/add_modifications',
+                'match_report': '/api/match_report',
                 'process': '/api/process_document'
             },
             'auto_load': {
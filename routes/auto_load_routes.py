@@ -17,12 +17,12 @@ from datetime import datetime
 from flask import Blueprint, request, jsonify
 from urllib.parse import urlparse, unquote
 
-from utils.document_processor import EnhancedWordProcessor
 from utils.i18n import get_text, set_language
 from utils.logger import log_info, log_error
+from utils.shared_documents import store_blob
 from config import Config
-from .document_routes import uploaded_documents
-from .modification_routes import modification_items, decode_file_content, parse_csv_modifications
+from .document_routes import uploaded_documents, document_changed, load_original, remove_upload
+from .modification_routes import modification_items, decode_file_content, parse_csv_modifications, normalize_match_rules
 
 # Create auto-load blueprint / 创建自动加载蓝图
 auto_load_bp = Blueprint('auto_load', __name__)
@@ -244,51 +244,58 @@ def auto_load_document_and_modifications():
                 'message': get_text('no_valid_modifications')
             }), 400
         
+        # Normalize match types and reject invalid patterns / 规范化匹配方式并拒绝无效模式
+        match_error = normalize_match_rules(modifications)
+        if match_error:
+            return jsonify({
+                'success': False,
+                'message': match_error
+            }), 400
+        
         # Generate unique document ID / 生成唯一文档ID
         doc_id = str(uuid.uuid4())
         
-        # Create permanent file path / 创建永久文件路径
+        # Create uploads directory if it doesn't exist / 如果上传目录不存在则创建
         upload_dir = Config.UPLOAD_FOLDER
         if not os.path.exists(upload_dir):
             os.makedirs(upload_dir)
         
-        permanent_file_path = os.path.join(upload_dir, f"{doc_id}_{doc_filename}")
-        
-        # Copy to permanent location if it's a temporary file / 如果是临时文件则复制到永久位置
-        if doc_file_path != permanent_file_path:
-            import shutil
-            shutil.copy2(doc_file_path, permanent_file_path)
-            # Clean up temporary file / 清理临时文件
-            if doc_file_path.startswith(tempfile.gettempdir()):
-                os.unlink(doc_file_path)
-        
-        # Initialize document processor to get content / 初始化文档处理器获取内容
-        processor = EnhancedWordProcessor()
-        success, message = processor.load_document(permanent_file_path)
-        if not success:
-            return jsonify({
-                'success': False,
-                'message': f"{get_text('document_processing_error')}: {message}"
-            }), 400
+        # Store the file hashed; identical documents share one file and one parse / 计算哈希后存储文件，内容相同的文档共享一个文件和一次解析
+        extension = os.path.splitext(doc_filename)[1] or '.docx'
+        with open(doc_file_path, 'rb') as source:
+            content_hash, permanent_file_path = store_blob(source, upload_dir, extension, uploaded_documents.registry)
+        # Clean up temporary file / 清理临时文件
+        if doc_file_path.startswith(tempfile.gettempdir()):
+            os.unlink(doc_file_path)
         
-        # Extract document content with formatting / 提取带格式的文档内容
-        original_content = processor.extract_content_with_formatting(processor.original_doc)
-        
-        # Store document info / 存储文档信息
-        uploaded_documents[doc_id] = {
+        doc_info = {
             'id': doc_id,
             'original_filename': doc_filename,
             'safe_filename': doc_filename,
             'file_path': permanent_file_path,
+            'content_hash': content_hash,
             'upload_time': datetime.now().isoformat(),
             'processed': False,
             'modifications_applied': False,
             'auto_loaded': True,
-            'content': original_content,  # Store original content / 存储原始内容
-            'processor': processor,  # Store processor instance / 存储处理器实例
             'modifications': modifications  # Store modifications / 存储修改条目
         }
         
+        # Load the document and extract content with formatting / 加载文档并提取带格式的内容
+        try:
+            load_original(doc_info)
+        except RuntimeError as e:
+            remove_upload(doc_info)
+            return jsonify({
+                'success': False,
+                'message': f"{get_text('document_processing_error')}: {str(e)}"
+            }), 400
+        processor = doc_info['processor']
+        original_content = doc_info['content']
+        
+        # Store document info / 存储文档信息
+        uploaded_documents[doc_id] = doc_info
+        
         # Store modifications / 存储修改条目
         modification_items[doc_id] = {
             'doc_id': doc_id,
@@ -309,28 +316,32 @@ def auto_load_document_and_modifications():
             # Log document copy creation / 记录文档副本创建
             log_info('document_copy_created')
             
-            # Apply modifications / 应用修改
-            success, message = processor.apply_modifications(modifications)
+            # The document is already published, other requests may use the processor / 文档已发布，其他请求可能正在使用处理器
+            with processor.lock:
+                # Apply modifications / 应用修改
+                success, message = processor.apply_modifications(modifications)
             
-            if not success:
-                return jsonify({
-                    'success': False,
-                    'message': message
-                }), 500
+                if not success:
+                    return jsonify({
+                        'success': False,
+                        'message': message
+                    }), 500
             
-            # Get modified content / 获取修改后的内容
-            modified_content = processor.extract_content_with_formatting(processor.modified_doc)
+                # Re-extract only the touched blocks on top of the original content / 只在原始内容上重新提取被修改的内容块
+                modified_content, _touched = processor.build_modified_content(original_content)
+                if modified_content is None:
+                    modified_content = processor.extract_content_with_formatting(processor.modified_doc)
             
-            # Save processed document / 保存处理后的文档
-            processed_filename = f"processed_{doc_filename}"
-            processed_file_path = os.path.join(upload_dir, f"{doc_id}_{processed_filename}")
-            success, save_message = processor.save_modified_document(processed_file_path)
+                # Save processed document / 保存处理后的文档
+                processed_filename = f"processed_{doc_filename}"
+                processed_file_path = os.path.join(upload_dir, f"{doc_id}_{processed_filename}")
+                success, save_message = processor.save_modified_document(processed_file_path)
             
-            if not success:
-                return jsonify({
-                    'success': False,
-                    'message': save_message
-                }), 500
+                if not success:
+                    return jsonify({
+                        'success': False,
+                        'message': save_message
+                    }), 500
             
             # Count modifications for reporting / 统计修改数量用于报告
             paragraph_count = len(modifications)
@@ -348,6 +359,7 @@ def auto_load_document_and_modifications():
                 'process_time': datetime.now().isoformat(),
                 'modified_content': modified_content  # Store modified content / 存储修改后的内容
             })
+            document_changed(uploaded_documents[doc_id])
             
             # Log completion / 记录完成
             log_info('modifications_applied', paragraphs=paragraph_count, tables=table_count)
@@ -7,13 +7,25 @@ Handles document upload, download, and processing operations
 """
 
 import os
+import json
 import tempfile
+import threading
 import uuid
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, copy_current_request_context, current_app, request, jsonify, send_file, stream_with_context
 from werkzeug.utils import secure_filename
 
-from utils.document_processor import EnhancedWordProcessor
+from utils.document_processor import EXTRACTOR_VERSION, EnhancedWordProcessor
+from utils.document_registry import DocumentRegistry
+from utils.document_store import DocumentStore
+from utils.shared_documents import SharedDocuments, release_blob, store_blob
+from utils.extraction_cache import ExtractionCache
+from utils.temp_janitor import TempFileJanitor
+from utils.content_schema import CONTENT_SCHEMA_COMPACT, FormatTable, parse_schema
+from utils.payload_cache import PayloadCache, negotiate_encoding
+from utils.image_thumbnails import get_thumbnail_service
 from utils.i18n import get_text
 from utils.logger import log_info, log_error
 from config import Config
@@ -21,8 +33,23 @@ from config import Config
 # Create document blueprint / 创建文档蓝图
 document_bp = Blueprint('document', __name__)
 
-# Global variables for storing documents / 存储文档的全局变量
-uploaded_documents = {}
+# Uploaded documents: metadata shared by all workers in the registry, parsed state kept per worker within the memory budget
+# 已上传文档：元数据保存在所有工作进程共享的登记表中，解析状态在每个工作进程内保持在内存预算之内
+uploaded_documents = DocumentStore(Config.DOCUMENT_STORE_MEMORY_BUDGET, DocumentRegistry(Config.DOCUMENT_REGISTRY_PATH))
+
+# Parsed originals shared by documents uploaded with identical bytes / 内容相同的上传文档共享的已解析原始文档
+shared_documents = SharedDocuments()
+
+# Extraction results on disk by content hash, reused by every worker and across restarts
+# 按内容哈希保存在磁盘上的提取结果，所有工作进程共用，重启后仍可复用
+extraction_cache = ExtractionCache(Config.EXTRACTION_CACHE_FOLDER, EXTRACTOR_VERSION)
+
+# Blocks extracted per lock acquisition while streaming / 流式发送时每次持有锁提取的内容块数量
+STREAM_BATCH_SIZE = 50
+
+# Background extraction pool for asynchronous uploads / 异步上传的后台提取线程池
+_extraction_pool = None
+_extraction_pool_lock = threading.Lock()
 
 def allowed_file(filename: str) -> bool:
     """
@@ -37,6 +64,555 @@ def allowed_file(filename: str) -> bool:
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
+def get_document_processor(doc_info: dict) -> EnhancedWordProcessor:
+    """
+    Get the processor kept with a document, loading it if missing / 获取文档对应的处理器，缺失时重新加载
+    
+    Args:
+        doc_info: Stored document info / 存储的文档信息
+        
+    Returns:
+        Document processor with the original document loaded / 已加载原始文档的处理器
+    """
+    # Never start a second parse while the upload is still being extracted / 上传仍在提取时不启动第二次解析
+    extraction = doc_info.get('extraction')
+    if extraction is not None:
+        extraction.result()
+    
+    processor = doc_info.get('processor')
+    if processor is None or not processor.has_original:
+        parsed = shared_documents.get(doc_info['file_path'])
+        cached = None if parsed is not None else load_cached_extraction(doc_info)
+        if parsed is not None:
+            processor = parsed.fork()
+        elif cached is not None:
+            processor = cached[0]
+        else:
+            processor = EnhancedWordProcessor()
+            processor.load_document(doc_info['file_path'])
+        doc_info['processor'] = processor
+    return processor
+
+def load_cached_extraction(doc_info: dict):
+    """
+    Load a document's original from the extraction cache without walking its XML / 从提取缓存加载文档的原始文档，不遍历其XML
+    
+    Args:
+        doc_info: Stored document info / 存储的文档信息
+        
+    Returns:
+        (processor, content), None when the upload has no usable cache entry / (处理器, 内容)，上传文件没有可用缓存时为None
+    """
+    if not doc_info.get('content_hash'):
+        return None
+    extension = os.path.splitext(doc_info['file_path'])[1]
+    extraction = extraction_cache.load(doc_info['content_hash'], extension)
+    if extraction is None:
+        return None
+    
+    processor = EnhancedWordProcessor()
+    try:
+        success, message = processor.load_document(doc_info['file_path'], extraction)
+    except Exception as e:
+        success, message = False, str(e)
+    if not success:
+        # Unusable entry, extract again and overwrite it / 缓存不可用，重新提取并覆盖
+        log_error('error_occurred', error=message)
+        return None
+    return processor, extraction['content']
+
+def cache_extraction(doc_info: dict, processor: EnhancedWordProcessor, content: list):
+    """
+    Write a fresh extraction to the extraction cache in the background / 在后台将新的提取结果写入提取缓存
+    
+    Args:
+        doc_info: Stored document info / 存储的文档信息
+        processor: Processor that extracted the document / 提取该文档的处理器
+        content: Extracted original content / 提取的原始内容
+    """
+    if not doc_info.get('content_hash'):
+        return
+    extraction = processor.export_extraction(content)
+    if extraction is None:
+        return
+    extension = os.path.splitext(doc_info['file_path'])[1]
+    get_extraction_pool().submit(extraction_cache.store, doc_info['content_hash'], extension, extraction)
+
+def share_parsed(doc_info: dict, processor: EnhancedWordProcessor, content: list):
+    """
+    Share a freshly extracted original with identical uploads / 与内容相同的上传共享新提取的原始文档
+    
+    Args:
+        doc_info: Stored document info / 存储的文档信息
+        processor: Processor that parsed the document / 解析该文档的处理器
+        content: Extracted original content / 提取的原始内容
+    """
+    parsed = shared_documents.publish(doc_info['file_path'], processor, content)
+    if parsed.content is not content:
+        # Another request parsed the same bytes first, use its parse / 其他请求已先解析了相同内容，使用其解析结果
+        processor = parsed.fork()
+    doc_info.update({'parsed': parsed, 'processor': processor, 'content': parsed.content})
+
+def load_original(doc_info: dict, progress: dict = None):
+    """
+    Load and extract a document's original, reusing the parse of an identical upload or the
+    extraction cache / 加载并提取文档的原始文档，复用内容相同上传的解析结果或提取缓存
+    Sets doc_info['processor'], doc_info['content'] and doc_info['parsed']
+    设置doc_info['processor']、doc_info['content']和doc_info['parsed']
+    
+    Args:
+        doc_info: Stored document info / 存储的文档信息
+        progress: Progress dict updated while extracting / 提取时更新的进度字典
+        
+    Raises:
+        RuntimeError: If the document cannot be loaded / 文档无法加载时
+    """
+    if progress is None:
+        progress = {}
+    
+    parsed = shared_documents.get(doc_info['file_path'])
+    if parsed is not None:
+        progress['blocks'] = len(parsed.content)
+        doc_info.update({'parsed': parsed, 'processor': parsed.fork(), 'content': parsed.content})
+        return
+    
+    progress['stage'] = 'loading'
+    cached = load_cached_extraction(doc_info)
+    if cached is not None:
+        processor, content = cached
+        progress['blocks'] = len(content)
+        share_parsed(doc_info, processor, content)
+        return
+    
+    processor = EnhancedWordProcessor()
+    success, message = processor.load_document(doc_info['file_path'])
+    if not success:
+        raise RuntimeError(message)
+    
+    progress['stage'] = 'extracting'
+    content = []
+    with processor.lock:
+        for block in processor.iter_content_with_formatting(processor.original_doc):
+            content.append(block)
+            progress['blocks'] = len(content)
+        
+        # Build the n-gram text index once at upload / 上传时构建一次N元组文本索引
+        progress['stage'] = 'indexing'
+        processor.get_text_index()
+    
+    cache_extraction(doc_info, processor, content)
+    share_parsed(doc_info, processor, content)
+
+def remove_upload(doc_info: dict):
+    """
+    Remove a document's original file, dropping its reference to a shared upload / 删除文档的原始文件，共享上传时释放其引用
+    
+    Args:
+        doc_info: Stored document info / 存储的文档信息
+    """
+    if doc_info.get('content_hash'):
+        release_blob(doc_info['file_path'], uploaded_documents.registry)
+    elif 'file_path' in doc_info and os.path.exists(doc_info['file_path']):
+        os.remove(doc_info['file_path'])
+
+def get_extraction_pool() -> ThreadPoolExecutor:
+    """
+    Get the shared background extraction pool / 获取共享的后台提取线程池
+    """
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            _extraction_pool = ThreadPoolExecutor(max_workers=max(1, Config.EXTRACTION_WORKERS),
+                                                  thread_name_prefix='extraction')
+        return _extraction_pool
+
+def extract_document(doc_info: dict):
+    """
+    Load and extract an uploaded document in the background / 在后台加载并提取上传的文档
+    Progress is published in doc_info['progress'], content and processor are set only when complete
+    进度发布在doc_info['progress']中，内容和处理器只在完成后设置
+    
+    Args:
+        doc_info: Registered document info with status 'processing' / 已登记且状态为processing的文档信息
+    """
+    progress = doc_info['progress']
+    try:
+        load_original(doc_info, progress)
+        doc_info['status'] = 'ready'
+        progress['stage'] = 'done'
+        document_changed(doc_info)
+        log_info('document_uploaded', filename=doc_info['original_filename'])
+        
+    except Exception as e:
+        doc_info['status'] = 'failed'
+        doc_info['error'] = str(e)
+        progress['stage'] = 'failed'
+        uploaded_documents.persist(doc_info['id'])
+        log_error('error_occurred', error=str(e))
+        # Clean up the file like a failed synchronous upload / 与同步上传失败时一样清理文件
+        remove_upload(doc_info)
+        raise
+
+def document_status_data(doc_info: dict) -> dict:
+    """
+    Extraction status of a document / 文档的提取状态
+    
+    Args:
+        doc_info: Stored document info / 存储的文档信息
+        
+    Returns:
+        Status dict with stage and extracted block count / 包含阶段和已提取内容块数的状态字典
+    """
+    status = doc_info.get('status', 'ready')
+    data = {
+        'success': status != 'failed',
+        'doc_id': doc_info['id'],
+        'filename': doc_info.get('original_filename'),
+        'status': status,
+        'progress': dict(doc_info.get('progress') or {'stage': 'done', 'blocks': len(doc_info.get('content') or [])})
+    }
+    if status == 'processing':
+        data['message'] = get_text('document_processing')
+    elif status == 'failed':
+        data['message'] = f"{get_text('document_processing_failed')}: {doc_info.get('error')}"
+    else:
+        data['content_total'] = len(doc_info.get('content') or [])
+    return data
+
+def wait_for_extraction(doc_info: dict):
+    """
+    Wait briefly for a document's background extraction / 短暂等待文档的后台提取
+    
+    Args:
+        doc_info: Stored document info / 存储的文档信息
+        
+    Returns:
+        None when the content is ready, otherwise a status response (202 while processing)
+        内容就绪时返回None，否则返回状态响应（处理中为202）
+    """
+    # Only the worker running the extraction can wait for it / 只有执行提取的工作进程可以等待
+    extraction = doc_info.get('extraction')
+    if extraction is not None:
+        try:
+            extraction.result(timeout=Config.EXTRACTION_WAIT_TIMEOUT)
+        except Exception:
+            pass
+    
+    status = doc_info.get('status', 'ready')
+    if status == 'processing':
+        return jsonify(document_status_data(doc_info)), 202
+    if status == 'failed':
+        return jsonify(document_status_data(doc_info))
+    return None
+
+def content_window(content: list, offset: int = 0, limit: int = None) -> dict:
+    """
+    Slice a window of content blocks / 截取一个内容块窗口
+    
+    Args:
+        content: Full list of extracted blocks / 完整的提取内容块列表
+        offset: Index of the first block / 第一个内容块的索引
+        limit: Number of blocks, window size when missing / 内容块数量，缺省为窗口大小
+        
+    Returns:
+        Window with its blocks, offset, limit and total block count / 包含内容块、偏移、数量和内容块总数的窗口
+    """
+    content = content or []
+    if limit is None:
+        limit = Config.CONTENT_WINDOW_SIZE
+    offset = max(0, offset)
+    limit = max(1, min(limit, Config.CONTENT_WINDOW_MAX))
+    return {
+        'blocks': content[offset:offset + limit],
+        'offset': offset,
+        'limit': limit,
+        'total': len(content),
+        'has_more': offset + limit < len(content)
+    }
+
+def requested_schema() -> int:
+    """
+    Content schema version asked for by the client / 客户端请求的内容结构版本
+    
+    Returns:
+        1 for full runs (default), 2 for compact runs / 1为完整run（默认），2为紧凑run
+    """
+    value = request.values.get('schema')
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get('schema')
+    return parse_schema(value)
+
+def encode_content(doc_info: dict, blocks: list, schema: int, referenced: set = None):
+    """
+    Encode blocks in the requested schema / 按请求的结构版本编码内容块
+    
+    Args:
+        doc_info: Stored document info holding the format table / 保存格式表的文档信息
+        blocks: Full schema blocks / 完整结构的内容块
+        schema: Requested schema version / 请求的结构版本
+        referenced: Optional set receiving the format ids used / 可选，接收用到的格式ID
+        
+    Returns:
+        (blocks, formats) where formats is None for the full schema / (内容块, 格式)，完整结构时格式为None
+    """
+    if schema != CONTENT_SCHEMA_COMPACT:
+        return blocks, None
+    # One table per document keeps ids stable across windows / 每个文档一张表，保证跨窗口的ID一致
+    formats = doc_info.setdefault('formats', FormatTable())
+    return formats.encode_blocks(blocks, referenced)
+
+def block_event(doc_info: dict, version: str, position: int, block: dict, schema: int, sent_formats: set) -> dict:
+    """
+    Build a stream block event, carrying formats not sent before / 构建流内容块事件，附带尚未发送过的格式
+    
+    Args:
+        doc_info: Stored document info / 存储的文档信息
+        version: 'original' or 'modified' / 原始或修改后
+        position: Block position / 内容块位置
+        block: Full schema block / 完整结构的内容块
+        schema: Requested schema version / 请求的结构版本
+        sent_formats: Format ids already sent on this stream / 本次流中已发送的格式ID
+    """
+    encoded, formats = encode_content(doc_info, [block], schema)
+    event = {'event': 'block', 'version': version, 'position': position, 'block': encoded[0]}
+    if formats:
+        new_formats = {format_id: fmt for format_id, fmt in formats.items() if format_id not in sent_formats}
+        if new_formats:
+            event['formats'] = new_formats
+            sent_formats.update(new_formats)
+    return event
+
+def cached_json_response(doc_info: dict, key, build) -> Response:
+    """
+    Serve a cached JSON payload of a document / 返回文档的缓存JSON响应
+    The payload is serialized and compressed once per document version, encoded according to
+    Accept-Encoding and answered with 304 when the client's ETag still matches
+    响应在每个文档版本只序列化和压缩一次，按Accept-Encoding编码，客户端ETag仍匹配时返回304
+    
+    Args:
+        doc_info: Stored document info holding the cache / 保存缓存的文档信息
+        key: Payload variant, e.g. the content schema / 响应变体，例如内容结构版本
+        build: Returns the response data dict / 返回响应数据字典
+        
+    Returns:
+        JSON, compressed JSON or 304 response / JSON、压缩的JSON或304响应
+    """
+    cache = doc_info.setdefault('payloads', PayloadCache(Config.PAYLOAD_GZIP_LEVEL, Config.PAYLOAD_BROTLI_QUALITY))
+    payload = cache.get(key, lambda: current_app.json.dumps(build()).encode('utf-8'))
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'),
+                                  Config.PAYLOAD_COMPRESSION_MIN_SIZE, len(payload.body))
+    
+    response = Response(payload.encoded(encoding), mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Always revalidate, the document may change between reads / 每次都重新验证，文档在两次读取之间可能变化
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(payload.etag(encoding))
+    return response.make_conditional(request)
+
+def document_changed(doc_info: dict):
+    """
+    Drop cached payloads, share the new metadata with other workers and re-account the document's size after it changed
+    文档变化后丢弃缓存的响应，与其他工作进程共享新的元数据并重新统计其内存占用
+    
+    Args:
+        doc_info: Stored document info / 存储的文档信息
+    """
+    cache = doc_info.get('payloads')
+    if cache is not None:
+        cache.invalidate()
+    uploaded_documents.persist(doc_info['id'])
+    uploaded_documents.measure(doc_info['id'])
+
+def rehydrate_document(doc_info: dict):
+    """
+    Restore an evicted document from its upload file / 从上传文件恢复已释放的文档
+    Reloads and extracts the original (or reuses the parse of an identical upload), then re-applies
+    the stored modifications so the modified preview is back
+    重新加载并提取原始文档（或复用内容相同上传的解析结果），再重新应用已保存的修改条目以恢复修改后预览
+    
+    Args:
+        doc_info: Stored document info without its parsed state / 不含解析状态的文档信息
+    """
+    load_original(doc_info)
+    processor = doc_info['processor']
+    
+    if doc_info.get('modifications_applied') and doc_info.get('modifications'):
+        with processor.lock:
+            success, message = processor.apply_modifications(doc_info['modifications'])
+            if not success:
+                raise RuntimeError(message)
+            modified_content, _touched = processor.build_modified_content(doc_info['content'])
+            if modified_content is None:
+                modified_content = processor.extract_content_with_formatting(processor.modified_doc)
+        doc_info['modified_content'] = modified_content
+
+def wants_stream() -> bool:
+    """
+    Check whether the client asked for an NDJSON stream / 检查客户端是否请求NDJSON流
+    
+    Returns:
+        True if stream=1 was passed as query or form value / 通过查询参数或表单传入stream=1时返回True
+    """
+    return request.values.get('stream', '').lower() in ('1', 'true')
+
+def ndjson_response(events) -> Response:
+    """
+    Stream events as newline-delimited JSON / 以换行分隔的JSON流式发送事件
+    
+    Args:
+        events: Generator of JSON-serializable dicts / 生成可JSON序列化字典的生成器
+        
+    Returns:
+        Streaming response / 流式响应
+    """
+    def generate():
+        try:
+            for event in events:
+                yield json.dumps(event, ensure_ascii=False) + '\n'
+        finally:
+            # Let the event generator finish its work when the client disconnects
+            # 客户端断开时让事件生成器完成收尾工作
+            events.close()
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Disable reverse proxy buffering / 关闭反向代理缓冲
+    return response
+
+def stream_document_extraction(doc_info: dict, processor: EnhancedWordProcessor, schema: int):
+    """
+    Walk a loaded document and yield its blocks as stream events / 遍历已加载的文档并以流事件生成内容块
+    Blocks are appended to doc_info['content'] as they are sent, and the walk is completed even if the client disconnects.
+    A document sharing the parse of an identical upload streams the blocks already extracted
+    内容块在发送的同时追加到doc_info['content']，客户端中途断开时仍会完成遍历。
+    与内容相同的上传共享解析结果的文档直接发送已提取的内容块
+    
+    Args:
+        doc_info: Registered document info with an empty content list, or with a shared parse
+                  已登记且内容列表为空的文档信息，或已共享解析结果的文档信息
+        processor: Processor with the original document loaded / 已加载原始文档的处理器
+        schema: Content schema version / 内容结构版本
+    """
+    content = doc_info['content']
+    sent_formats = set()
+    start = {
+        'event': 'start',
+        'success': True,
+        'message': get_text('document_uploaded'),
+        'doc_id': doc_info['id'],
+        'filename': doc_info['original_filename'],
+        'window_size': Config.CONTENT_WINDOW_SIZE,
+        'schema': schema
+    }
+    
+    if doc_info.get('parsed') is not None:
+        yield start
+        for position, block in enumerate(content):
+            yield block_event(doc_info, 'original', position, block, schema, sent_formats)
+        yield {'event': 'end', 'content_total': len(content)}
+        return
+    
+    blocks = processor.iter_content_with_formatting(processor.original_doc)
+    try:
+        yield start
+        while True:
+            # Walk a batch under the lock and send it without, so a slow client never blocks other requests
+            # 持有锁遍历一批内容块，释放锁后再发送，读取缓慢的客户端不会阻塞其他请求
+            with processor.lock:
+                first = len(content)
+                content.extend(islice(blocks, STREAM_BATCH_SIZE))
+                batch = content[first:]
+            if not batch:
+                break
+            for offset, block in enumerate(batch):
+                yield block_event(doc_info, 'original', first + offset, block, schema, sent_formats)
+    finally:
+        with processor.lock:
+            content.extend(blocks)
+            # Build the n-gram text index once the walk is done / 遍历完成后构建一次N元组文本索引
+            processor.get_text_index()
+            cache_extraction(doc_info, processor, content)
+            share_parsed(doc_info, processor, content)
+            # Payloads cached while blocks were still arriving are partial / 内容块仍在到达时缓存的响应不完整
+            document_changed(doc_info)
+    
+    yield {'event': 'end', 'content_total': len(content)}
+
+def save_processed_file_if_stale(doc_info: dict) -> bool:
+    """
+    Write the modified document to disk if it changed since the last save / 如果修改后的文档自上次保存后有变化则写入磁盘
+    
+    Args:
+        doc_info: Stored document info / 存储的文档信息
+        
+    Returns:
+        True if the processed file is up to date / 处理后的文件为最新时返回True
+    """
+    if not doc_info.get('processed_file_stale'):
+        return True
+    
+    processor = doc_info.get('processor')
+    if processor is None:
+        return False
+    
+    with processor.lock:
+        success, _message = processor.save_modified_document(doc_info['processed_file_path'])
+        if success:
+            doc_info['processed_file_stale'] = False
+            uploaded_documents.persist(doc_info['id'])
+    return success
+
+# Evicted documents are reloaded from their upload file; unsaved modified documents are written first
+# 已释放的文档从上传文件重新加载；尚未保存的修改文档在释放前先写入磁盘
+uploaded_documents.configure(rehydrate_document, save_processed_file_if_stale)
+
+def discard_document(doc_id: str):
+    """
+    Remove a document's files and registry entry / 删除文档的文件及登记信息
+    
+    Args:
+        doc_id: Document ID / 文档ID
+    """
+    # Metadata is enough, evicted documents are not reloaded / 只需要元数据，不重新加载已释放的文档
+    doc_info = uploaded_documents.peek(doc_id)
+    if doc_info is None:
+        return
+    
+    # Remove from memory; only the caller that removed it releases the files / 从内存中删除；只有执行删除的调用方释放文件
+    if not uploaded_documents.remove(doc_id):
+        return
+    
+    release_document_files(doc_info)
+
+def release_document_files(doc_info: dict):
+    """
+    Remove the files of a removed document / 删除已删除文档的文件
+    
+    Args:
+        doc_info: Stored document info / 存储的文档信息
+    """
+    # Remove original file, shared uploads only with their last document / 删除原始文件，共享的上传文件只在最后一个文档删除时删除
+    remove_upload(doc_info)
+    
+    # Remove processed file / 删除处理后的文件
+    if 'processed_file_path' in doc_info and os.path.exists(doc_info['processed_file_path']):
+        os.remove(doc_info['processed_file_path'])
+
+# Background janitor removing documents idle for TEMP_FILE_LIFETIME and orphaned temp files, started by the app
+# 后台清理器，删除超过TEMP_FILE_LIFETIME未访问的文档和孤立的临时文件，由应用启动
+janitor = TempFileJanitor(
+    uploaded_documents,
+    discard_document,
+    lifetime=Config.TEMP_FILE_LIFETIME.total_seconds(),
+    folders=(Config.UPLOAD_FOLDER, Config.TEMP_FOLDER),
+    interval=Config.JANITOR_INTERVAL,
+    batch_size=Config.JANITOR_BATCH_SIZE,
+    system_temp_folder=tempfile.gettempdir(),
+    exclude=(Config.DOCUMENT_REGISTRY_PATH,)
+)
+
 @document_bp.route('/upload_document', methods=['POST'])
 def upload_document():
     """
@@ -84,51 +660,82 @@ def upload_document():
         if not os.path.exists(upload_dir):
             os.makedirs(upload_dir)
         
-        # Save file / 保存文件
-        file_path = os.path.join(upload_dir, f"{doc_id}_{safe_filename}")
-        file.save(file_path)
-        
-        # Process document to extract content / 处理文档以提取内容
-        from utils.document_processor import EnhancedWordProcessor
-        processor = EnhancedWordProcessor()
-        
-        # Load and process the document / 加载并处理文档
-        success, message = processor.load_document(file_path)
-        if not success:
-            # If processing fails, clean up and return error / 如果处理失败，清理并返回错误
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            return jsonify({
-                'success': False,
-                'message': f"{get_text('document_processing_failed')}: {message}"
-            })
-        
-        # Extract document content with formatting / 提取带格式的文档内容
-        content = processor.extract_content_with_formatting(processor.original_doc)
+        # Save file, hashed while written; identical uploads share one file / 保存文件，写入时计算哈希，内容相同的上传共享一个文件
+        extension = os.path.splitext(safe_filename)[1] or '.docx'
+        content_hash, file_path = store_blob(file.stream, upload_dir, extension, uploaded_documents.registry)
         
         # Store document info / 存储文档信息
-        uploaded_documents[doc_id] = {
+        doc_info = {
             'id': doc_id,
             'original_filename': original_filename,
             'safe_filename': safe_filename,
             'file_path': file_path,
+            'content_hash': content_hash,
             'upload_time': datetime.now().isoformat(),
             'processed': False,
             'modifications_applied': False,
-            'content': content,  # Store extracted content / 存储提取的内容
-            'processor': processor  # Store processor instance / 存储处理器实例
+            'content': [],  # Extracted content / 提取的内容
+            'processor': None  # Processor instance, set once loaded / 处理器实例，加载后设置
         }
         
+        # Return at once and extract in a background worker / 立即返回，在后台工作线程中提取
+        if request.values.get('async', '').lower() in ('1', 'true'):
+            doc_info.update({'status': 'processing', 'progress': {'stage': 'queued', 'blocks': 0}})
+            uploaded_documents[doc_id] = doc_info
+            doc_info['extraction'] = get_extraction_pool().submit(copy_current_request_context(extract_document), doc_info)
+            response_data = document_status_data(doc_info)
+            response_data['status_url'] = f'/api/document_status/{doc_id}'
+            return jsonify(response_data), 202
+        
+        try:
+            if wants_stream() and shared_documents.get(file_path) is None and \
+                    not extraction_cache.contains(content_hash, extension):
+                # Only load here, blocks are extracted while they are streamed / 只在此加载，内容块边提取边发送
+                processor = EnhancedWordProcessor()
+                success, message = processor.load_document(file_path)
+                if not success:
+                    raise RuntimeError(message)
+                doc_info['processor'] = processor
+            else:
+                # Process document to extract content, or reuse an identical upload / 处理文档以提取内容，或复用内容相同的上传
+                load_original(doc_info)
+        except RuntimeError as e:
+            # If processing fails, clean up and return error / 如果处理失败，清理并返回错误
+            remove_upload(doc_info)
+            return jsonify({
+                'success': False,
+                'message': f"{get_text('document_processing_failed')}: {str(e)}"
+            })
+        
+        # Stream blocks while the document is walked / 边遍历文档边流式发送内容块
+        if wants_stream():
+            uploaded_documents[doc_id] = doc_info
+            log_info('document_uploaded', filename=original_filename)
+            return ndjson_response(stream_document_extraction(doc_info, doc_info['processor'], requested_schema()))
+        
+        content = doc_info['content']
+        uploaded_documents[doc_id] = doc_info
+        
         # Log successful upload / 记录成功上传
         log_info('document_uploaded', filename=original_filename)
         
-        return jsonify({
+        # Only the first window is returned, the rest is fetched on demand / 只返回第一个窗口，其余按需获取
+        window = content_window(content)
+        schema = requested_schema()
+        blocks, formats = encode_content(doc_info, window['blocks'], schema)
+        response_data = {
             'success': True,
             'message': get_text('document_uploaded'),
             'doc_id': doc_id,
             'filename': original_filename,
-            'content': content  # Return content to frontend / 返回内容给前端
-        })
+            'schema': schema,
+            'content': blocks,  # Return first window to frontend / 返回第一个窗口给前端
+            'content_total': window['total'],
+            'window_size': window['limit']
+        }
+        if formats is not None:
+            response_data['formats'] = formats
+        return jsonify(response_data)
         
     except Exception as e:
         # Log error / 记录错误
@@ -153,7 +760,9 @@ def download_document(doc_id: str):
                 'message': get_text('document_not_found')
             }), 404
         
-        doc_info = uploaded_documents[doc_id]
+        # Evicted documents were saved first, so the file can be sent without reloading
+        # 已释放的文档在释放前已保存，因此无需重新加载即可发送文件
+        doc_info = uploaded_documents.peek(doc_id)
         
         # Check if document has been processed / 检查文档是否已处理
         if not doc_info.get('processed', False):
@@ -162,6 +771,13 @@ def download_document(doc_id: str):
                 'message': get_text('document_not_processed')
             }), 400
         
+        # Write pending modifications before sending / 发送前写入尚未保存的修改
+        if not save_processed_file_if_stale(doc_info):
+            # The unsaved modified document lives in another worker, rebuild it here
+            # 尚未保存的修改文档在其他工作进程中，在此重新构建
+            doc_info = uploaded_documents[doc_id]
+            save_processed_file_if_stale(doc_info)
+        
         # Get processed file path / 获取处理后的文件路径
         processed_file_path = doc_info.get('processed_file_path')
         if not processed_file_path or not os.path.exists(processed_file_path):
@@ -209,7 +825,14 @@ def get_document_info(doc_id: str):
                 'message': get_text('document_not_found')
             }), 404
         
-        doc_info = uploaded_documents[doc_id].copy()
+        stored_info = uploaded_documents[doc_id]
+        # Wait briefly for a background extraction / 短暂等待后台提取
+        pending = wait_for_extraction(stored_info)
+        if pending is not None:
+            return pending
+        
+        doc_info = stored_info.copy()
+        schema = requested_schema()
         
         # Remove sensitive file path information / 移除敏感的文件路径信息
         if 'file_path' in doc_info:
@@ -217,18 +840,166 @@ def get_document_info(doc_id: str):
         if 'processed_file_path' in doc_info:
             del doc_info['processed_file_path']
         
-        # Return document info directly in the expected format for frontend
-        # 直接返回前端期望格式的文档信息
+        # Stream all stored blocks instead of windows / 流式发送全部已存储的内容块而不是窗口
+        if wants_stream():
+            return ndjson_response(stream_document_info(stored_info, schema))
+        
+        # Return document info directly in the expected format for frontend, content as first windows
+        # 直接返回前端期望格式的文档信息，内容只包含第一个窗口
+        def build():
+            referenced = set()
+            window = content_window(doc_info.get('content'))
+            blocks, formats = encode_content(stored_info, window['blocks'], schema, referenced)
+            response_data = {
+                'success': True,
+                'schema': schema,
+                'content': blocks,
+                'content_total': window['total'],
+                'window_size': window['limit'],
+                'filename': doc_info.get('original_filename'),
+                'doc_info': doc_info.get('processor').get_document_info() if doc_info.get('processor') else None,
+                'modifications': doc_info.get('modifications', []),
+                'modified_content': None,
+                'modifications_applied': doc_info.get('modifications_applied', False)
+            }
+            if doc_info.get('modified_content') is not None:
+                modified_window = content_window(doc_info['modified_content'])
+                response_data['modified_content'], formats = encode_content(stored_info, modified_window['blocks'], schema, referenced)
+                response_data['modified_total'] = modified_window['total']
+            if formats is not None:
+                response_data['formats'] = formats
+            return response_data
+        
+        # Serialized and compressed once per document version / 每个文档版本只序列化和压缩一次
+        return cached_json_response(stored_info, ('document_info', schema), build)
+        
+    except Exception as e:
+        # Log error / 记录错误
+        log_error('error_occurred', error=str(e))
+        return jsonify({
+            'success': False,
+            'message': f"{get_text('server_error')}: {str(e)}"
+        }), 500
+
+def stream_document_info(doc_info: dict, schema: int):
+    """
+    Yield document info followed by original and modified blocks / 依次生成文档信息、原始内容块和修改后内容块
+    
+    Args:
+        doc_info: Stored document info / 存储的文档信息
+        schema: Content schema version / 内容结构版本
+    """
+    # Snapshot the lists so concurrent applies do not shift positions / 复制列表，避免并发应用修改导致位置变化
+    content = list(doc_info.get('content') or [])
+    modified_content = doc_info.get('modified_content')
+    modified_content = list(modified_content) if modified_content is not None else None
+    
+    yield {
+        'event': 'start',
+        'success': True,
+        'filename': doc_info.get('original_filename'),
+        'doc_info': doc_info.get('processor').get_document_info() if doc_info.get('processor') else None,
+        'modifications': doc_info.get('modifications', []),
+        'modifications_applied': doc_info.get('modifications_applied', False),
+        'content_total': len(content),
+        'modified_total': len(modified_content) if modified_content is not None else None,
+        'schema': schema
+    }
+    sent_formats = set()
+    for position, block in enumerate(content):
+        yield block_event(doc_info, 'original', position, block, schema, sent_formats)
+    for position, block in enumerate(modified_content or []):
+        yield block_event(doc_info, 'modified', position, block, schema, sent_formats)
+    yield {'event': 'end'}
+
+@document_bp.route('/document_status/<doc_id>', methods=['GET'])
+def get_document_status(doc_id: str):
+    """
+    Get document extraction status / 获取文档提取状态
+    Reports the stage and extracted block count of an asynchronous upload without waiting
+    返回异步上传的处理阶段和已提取内容块数，不等待提取完成
+    """
+    try:
+        # Check if document exists / 检查文档是否存在
+        if doc_id not in uploaded_documents:
+            return jsonify({
+                'success': False,
+                'message': get_text('document_not_found')
+            }), 404
+        
+        return jsonify(document_status_data(uploaded_documents.peek(doc_id)))
+        
+    except Exception as e:
+        # Log error / 记录错误
+        log_error('error_occurred', error=str(e))
+        return jsonify({
+            'success': False,
+            'message': f"{get_text('server_error')}: {str(e)}"
+        }), 500
+
+@document_bp.route('/document_content/<doc_id>', methods=['GET'])
+def get_document_content(doc_id: str):
+    """
+    Get a window of document content / 获取文档内容窗口
+    Returns blocks [offset, offset + limit) of the original or modified content with the total count
+    返回原始或修改后内容中[offset, offset + limit)范围的内容块及总数
+    """
+    try:
+        # Check if document exists / 检查文档是否存在
+        if doc_id not in uploaded_documents:
+            return jsonify({
+                'success': False,
+                'message': get_text('document_not_found')
+            }), 404
+        
+        doc_info = uploaded_documents[doc_id]
+        
+        # Wait briefly for a background extraction / 短暂等待后台提取
+        pending = wait_for_extraction(doc_info)
+        if pending is not None:
+            return pending
+        
+        version = request.args.get('version', 'original')
+        if version not in ('original', 'modified'):
+            return jsonify({
+                'success': False,
+                'message': get_text('bad_request')
+            }), 400
+        
+        try:
+            offset = int(request.args.get('offset', 0))
+            limit = int(request.args.get('limit', Config.CONTENT_WINDOW_SIZE))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': get_text('bad_request')
+            }), 400
+        
+        if version == 'modified':
+            content = doc_info.get('modified_content')
+            if content is None:
+                return jsonify({
+                    'success': False,
+                    'message': get_text('document_not_processed')
+                }), 400
+        else:
+            content = doc_info.get('content')
+        
+        window = content_window(content, offset, limit)
+        schema = requested_schema()
+        blocks, formats = encode_content(doc_info, window['blocks'], schema)
         response_data = {
             'success': True,
-            'content': doc_info.get('content'),
-            'filename': doc_info.get('original_filename'),
-            'doc_info': doc_info.get('processor').get_document_info() if doc_info.get('processor') else None,
-            'modifications': doc_info.get('modifications', []),
-            'modified_content': doc_info.get('modified_content'),
-            'modifications_applied': doc_info.get('modifications_applied', False)
+            'version': version,
+            'schema': schema,
+            'offset': window['offset'],
+            'limit': window['limit'],
+            'total': window['total'],
+            'has_more': window['has_more'],
+            'content': blocks
         }
-        
+        if formats is not None:
+            response_data['formats'] = formats
         return jsonify(response_data)
         
     except Exception as e:
@@ -239,6 +1010,114 @@ def get_document_info(doc_id: str):
             'message': f"{get_text('server_error')}: {str(e)}"
         }), 500
 
+@document_bp.route('/search/<doc_id>', methods=['GET'])
+def search_document(doc_id: str):
+    """
+    Search document text / 搜索文档文本
+    Looks up text through the document's n-gram index and returns block locations
+    通过文档的N元组索引查找文本并返回所在内容块位置
+    """
+    try:
+        # Check if document exists / 检查文档是否存在
+        if doc_id not in uploaded_documents:
+            return jsonify({
+                'success': False,
+                'message': get_text('document_not_found')
+            }), 404
+        
+        query = request.args.get('q', '')
+        if not query:
+            return jsonify({
+                'success': False,
+                'message': get_text('bad_request')
+            }), 400
+        
+        try:
+            limit = max(1, min(int(request.args.get('limit', 100)), 1000))
+        except ValueError:
+            limit = 100
+        
+        # Wait briefly for a background extraction / 短暂等待后台提取
+        pending = wait_for_extraction(uploaded_documents[doc_id])
+        if pending is not None:
+            return pending
+        
+        processor = get_document_processor(uploaded_documents[doc_id])
+        with processor.lock:
+            hits = processor.search_text(query, limit)
+        
+        return jsonify({
+            'success': True,
+            'query': query,
+            'count': len(hits),
+            'hits': hits
+        })
+        
+    except Exception as e:
+        # Log error / 记录错误
+        log_error('error_occurred', error=str(e))
+        return jsonify({
+            'success': False,
+            'message': f"{get_text('server_error')}: {str(e)}"
+        }), 500
+
+@document_bp.route('/document_image/<doc_id>/<image_hash>', methods=['GET'])
+def document_image(doc_id: str, image_hash: str):
+    """
+    Serve a document image by content hash / 按内容哈希提供文档图片
+    The hash addresses immutable content, so responses carry a strong ETag and a long cache lifetime.
+    With ?width=N a downscaled WebP/JPEG preview is served instead (PNG for transparent images)
+    哈希对应不可变内容，因此响应携带强ETag和长缓存时间。
+    传入?width=N时返回缩小的WebP/JPEG预览图（透明图片为PNG）
+    """
+    try:
+        # Check if document exists / 检查文档是否存在
+        if doc_id not in uploaded_documents:
+            return jsonify({
+                'success': False,
+                'message': get_text('document_not_found')
+            }), 404
+        
+        # Wait briefly for a background extraction / 短暂等待后台提取
+        pending = wait_for_extraction(uploaded_documents[doc_id])
+        if pending is not None:
+            return pending
+        
+        processor = get_document_processor(uploaded_documents[doc_id])
+        image = processor.get_image(image_hash)
+        if image is None:
+            return jsonify({
+                'success': False,
+                'message': get_text('file_not_found')
+            }), 404
+        
+        data, mime_type, etag = image['data'], image['mime_type'], image_hash
+        width = request.args.get('width', type=int)
+        if width and width > 0:
+            service = get_thumbnail_service(Config.THUMBNAIL_FOLDER, Config.THUMBNAIL_WIDTHS,
+                                            Config.THUMBNAIL_WORKERS, Config.THUMBNAIL_QUALITY)
+            preview = service.get(image, width, 'image/webp' in request.headers.get('Accept', ''))
+            if preview is not None:
+                data, mime_type, etag = preview
+        
+        response = Response(data, mimetype=mime_type)
+        response.set_etag(etag)
+        if width:
+            # The chosen format depends on the client's Accept header / 输出格式取决于客户端的Accept请求头
+            response.headers['Vary'] = 'Accept'
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        # Log error / 记录错误
+        log_error('error_occurred', error=str(e))
+        return jsonify({
+            'success': False,
+            'message': f"{get_text('server_error')}: {str(e)}"
+        }), 500
+
 @document_bp.route('/cleanup/<doc_id>', methods=['DELETE'])
 def cleanup_document(doc_id: str):
     """
@@ -254,18 +1133,8 @@ def cleanup_document(doc_id: str):
                 'message': get_text('document_not_found')
             }), 404
         
-        doc_info = uploaded_documents[doc_id]
-        
-        # Remove original file / 删除原始文件
-        if 'file_path' in doc_info and os.path.exists(doc_info['file_path']):
-            os.remove(doc_info['file_path'])
-        
-        # Remove processed file / 删除处理后的文件
-        if 'processed_file_path' in doc_info and os.path.exists(doc_info['processed_file_path']):
-            os.remove(doc_info['processed_file_path'])
-        
-        # Remove from memory / 从内存中删除
-        del uploaded_documents[doc_id]
+        # Remove files and memory / 删除文件并清理内存
+        discard_document(doc_id)
         
         return jsonify({
             'success': True,
@@ -288,24 +1157,8 @@ def cleanup_all_documents():
     删除所有文档文件并清理内存
     """
     try:
-        cleanup_count = 0
-        
-        # Clean up all documents / 清理所有文档
-        for doc_id in list(uploaded_documents.keys()):
-            doc_info = uploaded_documents[doc_id]
-            
-            # Remove original file / 删除原始文件
-            if 'file_path' in doc_info and os.path.exists(doc_info['file_path']):
-                os.remove(doc_info['file_path'])
-            
-            # Remove processed file / 删除处理后的文件
-            if 'processed_file_path' in doc_info and os.path.exists(doc_info['processed_file_path']):
-                os.remove(doc_info['processed_file_path'])
-            
-            cleanup_count += 1
-        
-        # Clear memory / 清理内存
-        uploaded_documents.clear()
+        # Remove every document and release its files once / 删除所有文档并且每个文档只释放一次文件
+        cleanup_count = uploaded_documents.clear(release_document_files)
         
         return jsonify({
             'success': True,
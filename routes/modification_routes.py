@@ -11,6 +11,7 @@ import tempfile
 import json
 import csv
 import io
+import re
 from datetime import datetime
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
@@ -18,14 +19,16 @@ from werkzeug.utils import secure_filename
 from utils.document_processor import EnhancedWordProcessor
 from utils.i18n import get_text
 from utils.logger import log_info, log_error
+from utils.text_matcher import normalize_match_type, compile_rule, MATCH_LITERAL
+from utils.document_registry import ModificationSets
 from config import Config
-from .document_routes import uploaded_documents
+from .document_routes import uploaded_documents, get_document_processor, content_window, requested_schema, encode_content, document_changed
 
 # Create modification blueprint / 创建修改条目蓝图
 modification_bp = Blueprint('modification', __name__)
 
-# Global variables for storing modification items / 存储修改条目的全局变量
-modification_items = {}
+# Modification items per document, shared by all workers through the registry / 每个文档的修改条目，通过登记表在所有工作进程间共享
+modification_items = ModificationSets(uploaded_documents.registry)
 
 def decode_file_content(file_data: bytes, filename: str) -> str:
     """
@@ -54,6 +57,100 @@ def decode_file_content(file_data: bytes, filename: str) -> str:
     # 如果所有编码都失败，使用utf-8并处理错误
     return file_data.decode('utf-8', errors='replace')
 
+def normalize_match_rule(modification: dict):
+    """
+    Normalize and validate the match type of a modification in place / 就地规范化并校验修改条目的匹配方式
+    
+    Args:
+        modification: Modification dictionary / 修改条目字典
+        
+    Returns:
+        Error message, or None if the rule is valid / 错误信息，规则有效时为None
+    """
+    match_type = normalize_match_type(modification.get('match_type'))
+    if match_type is None:
+        return f"{get_text('invalid_match_rule')}: {modification.get('match_type')}"
+    
+    if match_type != MATCH_LITERAL:
+        # Compile once here so that bad patterns are rejected before processing
+        # 在这里编译一次，处理前就拒绝无效的模式
+        try:
+            compile_rule(modification['original_text'], match_type)
+        except re.error as e:
+            return f"{get_text('invalid_match_rule')}: {modification['original_text']} ({e})"
+    
+    modification['match_type'] = match_type
+    return None
+
+def normalize_match_rules(modifications: list):
+    """
+    Normalize and validate the match types of a modification list / 规范化并校验修改列表的匹配方式
+    
+    Args:
+        modifications: List of modification dictionaries / 修改字典列表
+        
+    Returns:
+        Error message for the first invalid rule, or None / 第一个无效规则的错误信息，全部有效时为None
+    """
+    for i, mod in enumerate(modifications):
+        if not isinstance(mod, dict) or 'original_text' not in mod:
+            return f"{get_text('invalid_modification_format')}: {i+1}"
+        error = normalize_match_rule(mod)
+        if error:
+            return f"{error} ({i+1})"
+    return None
+
+def diff_against_original(content: list, modified_content: list, blocks) -> list:
+    """
+    Blocks of the modified preview that differ from the original content / 修改后预览中与原始内容不同的内容块
+    
+    Args:
+        content: Original content blocks / 原始内容块
+        modified_content: Modified content blocks / 修改后的内容块
+        blocks: Touched blocks reported by the processor / 处理器报告的被修改内容块
+        
+    Returns:
+        List of {'type', 'index', 'position', 'block'}, or None when the preview cannot be
+        produced by patching the original / 内容块变化列表；无法通过修补原始内容得到预览时为None
+    """
+    if blocks is None or modified_content is None or len(modified_content) != len(content or []):
+        return None
+    
+    positions = {(item.get('type'), item.get('index')): position for position, item in enumerate(modified_content)}
+    diff = []
+    for block_type, index in blocks:
+        position = positions.get((block_type, index))
+        if position is None:
+            return None
+        diff.append({'type': block_type, 'index': index, 'position': position, 'block': modified_content[position]})
+    return diff
+
+def add_modified_blocks(response_data: dict, doc_info: dict, modified_content: list, modified_blocks, base: str):
+    """
+    Add the modified preview to a response, as changed blocks when available / 向响应添加修改后预览，可用时只包含变化的内容块
+    
+    Args:
+        response_data: Response being built / 正在构建的响应
+        doc_info: Stored document info / 存储的文档信息
+        modified_content: Full modified content / 完整的修改后内容
+        modified_blocks: Changed blocks, None to send the first window / 变化的内容块，为None时发送第一个窗口
+        base: 'original' or 'modified', the content the blocks patch / 内容块所修补的内容：原始或修改后
+    """
+    schema = requested_schema()
+    response_data['schema'] = schema
+    response_data['modified_total'] = len(modified_content)
+    if modified_blocks is not None:
+        blocks, formats = encode_content(doc_info, [change['block'] for change in modified_blocks], schema)
+        response_data['incremental'] = True
+        response_data['modified_base'] = base
+        response_data['modified_blocks'] = [dict(change, block=block) for change, block in zip(modified_blocks, blocks)]
+    else:
+        # Only the first window is returned, the rest is fetched on demand / 只返回第一个窗口，其余按需获取
+        window = content_window(modified_content)
+        response_data['modified_content'], formats = encode_content(doc_info, window['blocks'], schema)
+    if formats is not None:
+        response_data['formats'] = formats
+
 def parse_csv_modifications(csv_content: str) -> list:
     """
     Parse CSV content into modification list / 将CSV内容解析为修改列表
@@ -85,17 +182,25 @@ def parse_csv_modifications(csv_content: str) -> list:
                        row.get('modified') or row.get('新文本') or row.get('修改后文本'))
             reason = (row.get('reason') or row.get('ModificationReason') or 
                      row.get('原因') or row.get('修改原因') or '')
+            match_type = (row.get('match_type') or row.get('MatchType') or 
+                         row.get('匹配方式') or row.get('匹配类型') or '')
             
             print(f"  原文: '{original_text}'")
             print(f"  新文: '{new_text}'")
             print(f"  原因: '{reason}'")
             
             if original_text and new_text:
-                modifications.append({
+                modification = {
                     'original_text': original_text.strip(),
                     'new_text': new_text.strip(),
-                    'reason': reason.strip()
-                })
+                    'reason': reason.strip(),
+                    'match_type': match_type.strip()
+                }
+                error = normalize_match_rule(modification)
+                if error:
+                    print(f"  ❌ 跳过（{error}）")
+                    continue
+                modifications.append(modification)
                 print(f"  ✅ 添加修改条目")
             else:
                 print(f"  ❌ 跳过（缺少必要字段）")
@@ -172,6 +277,14 @@ def add_modifications():
                     'message': f"{get_text('invalid_modification_format')}: {i+1}"
                 })
         
+        # Normalize match types and reject invalid patterns / 规范化匹配方式并拒绝无效模式
+        match_error = normalize_match_rules(modifications)
+        if match_error:
+            return jsonify({
+                'success': False,
+                'message': match_error
+            })
+        
         # Store modifications / 存储修改条目
         modification_items[doc_id] = {
             'doc_id': doc_id,
@@ -182,40 +295,57 @@ def add_modifications():
         # Process document with modifications / 使用修改条目处理文档
         doc_info = uploaded_documents[doc_id]
         
+        # Clients that already hold the modified preview may ask for changed blocks only, and clients
+        # holding the original content may ask for the blocks that differ from it (diff)
+        # 已持有修改后预览的客户端可以只请求变化的内容块；持有原始内容的客户端可以请求与原始内容不同的内容块（diff）
+        request_data = request.get_json(silent=True) if request.is_json else None
+        want_incremental = bool(request_data and request_data.get('incremental'))
+        want_diff = bool(request_data and request_data.get('diff'))
+        
         # Log modification start / 记录修改开始
         log_info('document_modification_started')
         
-        # Initialize document processor / 初始化文档处理器
-        processor = EnhancedWordProcessor()
+        # Reuse the processor kept with the document / 复用与文档一起保存的处理器
+        processor = get_document_processor(doc_info)
         
-        # Load original document / 加载原始文档
-        processor.load_document(doc_info['file_path'])
-        
-        # Log document copy creation / 记录文档副本创建
-        log_info('document_copy_created')
-        
-        # Apply modifications / 应用修改
-        success, message = processor.apply_modifications(modifications)
-        
-        if not success:
-            return jsonify({
-                'success': False,
-                'message': message
-            })
+        with processor.lock:
+            # Log document copy creation / 记录文档副本创建
+            log_info('document_copy_created')
+            
+            # Re-process only paragraphs touched by changed entries when a modified copy exists
+            # 已有修改副本时，只重新处理变化条目涉及的段落
+            if doc_info.get('modified_content') is not None:
+                success, message, changed = processor.update_modifications(modifications)
+            else:
+                success, message = processor.apply_modifications(modifications)
+                changed = None
+            
+            if not success:
+                return jsonify({
+                    'success': False,
+                    'message': message
+                })
+            
+            # Patch the cached preview, otherwise re-extract only the touched blocks on top of the
+            # original content; extract everything only if blocks appeared or disappeared
+            # 增量更新缓存的预览内容，否则只在原始内容上重新提取被修改的内容块；内容块出现或消失时才完整提取
+            changed_blocks = None
+            modified_content = None
+            if changed is not None:
+                modified_content, changed_blocks = processor.refresh_content_blocks(doc_info['modified_content'], changed)
+            if modified_content is None:
+                modified_content, _touched = processor.build_modified_content(doc_info['content'])
+                changed_blocks = None
+            if modified_content is None:
+                modified_content = processor.extract_content_with_formatting(processor.modified_doc)
+            
+            original_diff = None
+            if want_diff and not (want_incremental and changed_blocks is not None):
+                original_diff = diff_against_original(doc_info['content'], modified_content, processor.get_modified_blocks())
         
-        # Save processed document / 保存处理后的文档
+        # The processed file is written lazily on download / 处理后的文件在下载时才写入
         processed_filename = f"processed_{doc_info['safe_filename']}"
         processed_file_path = os.path.join(Config.UPLOAD_FOLDER, f"{doc_id}_{processed_filename}")
-        success, save_message = processor.save_modified_document(processed_file_path)
-        
-        if not success:
-            return jsonify({
-                'success': False,
-                'message': save_message
-            })
-        
-        # Extract modified document content for preview / 提取修改后的文档内容用于预览
-        modified_content = processor.extract_content_with_formatting(processor.modified_doc)
         
         # Count modifications for reporting / 统计修改数量用于报告
         paragraph_count = len(modifications)
@@ -227,26 +357,113 @@ def add_modifications():
             'modifications_applied': True,
             'processed_file_path': processed_file_path,
             'processed_filename': processed_filename,
+            'processed_file_stale': True,
+            'modifications': modifications,
             'modification_count': len(modifications),
             'paragraph_changes': paragraph_count,
             'table_changes': table_count,
-            'process_time': datetime.now().isoformat()
+            'process_time': datetime.now().isoformat(),
+            'modified_content': modified_content
         })
+        document_changed(uploaded_documents[doc_id])
         
         # Log completion / 记录完成
         log_info('modifications_applied', paragraphs=paragraph_count, tables=table_count)
         log_info('modification_complete')
         
-        return jsonify({
+        response_data = {
             'success': True,
             'message': get_text('modifications_applied'),
             'doc_id': doc_id,
             'modification_count': len(modifications),
             'paragraph_changes': paragraph_count,
             'table_changes': table_count,
-            'download_url': f'/api/download_document/{doc_id}',
-            'modified_content': modified_content
-        })
+            'download_url': f'/api/download_document/{doc_id}'
+        }
+        if want_incremental and changed_blocks is not None:
+            add_modified_blocks(response_data, doc_info, modified_content, changed_blocks, 'modified')
+        else:
+            add_modified_blocks(response_data, doc_info, modified_content, original_diff, 'original')
+        
+        return jsonify(response_data)
+        
+    except Exception as e:
+        # Log error / 记录错误
+        log_error('error_occurred', error=str(e))
+        return jsonify({
+            'success': False,
+            'message': f"{get_text('server_error')}: {str(e)}"
+        }), 500
+
+@modification_bp.route('/match_report', methods=['POST'])
+def match_report():
+    """
+    Dry-run match report API / 试运行匹配报告API
+    Reports per-modification hits against the original document without applying anything
+    报告每个修改条目在原始文档中的命中情况，不应用任何修改
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        doc_id = data.get('doc_id')
+        
+        if not doc_id:
+            return jsonify({
+                'success': False,
+                'message': get_text('no_document_id')
+            })
+        
+        # Check if document exists / 检查文档是否存在
+        if doc_id not in uploaded_documents:
+            return jsonify({
+                'success': False,
+                'message': get_text('document_not_found')
+            })
+        
+        modifications = data.get('modifications', [])
+        if isinstance(modifications, str):
+            # JSON or CSV text / JSON或CSV文本
+            try:
+                modifications = json.loads(modifications)
+            except json.JSONDecodeError:
+                modifications = parse_csv_modifications(modifications)
+        
+        if not modifications:
+            return jsonify({
+                'success': False,
+                'message': get_text('no_modifications_provided')
+            })
+        
+        for i, mod in enumerate(modifications):
+            if not isinstance(mod, dict) or 'original_text' not in mod or 'new_text' not in mod:
+                return jsonify({
+                    'success': False,
+                    'message': f"{get_text('invalid_modification_format')}: {i+1}"
+                })
+        
+        match_error = normalize_match_rules(modifications)
+        if match_error:
+            return jsonify({
+                'success': False,
+                'message': match_error
+            })
+        
+        try:
+            limit = max(0, min(int(data.get('limit', 20)), 1000))
+            context = max(0, min(int(data.get('context', 30)), 500))
+        except (TypeError, ValueError):
+            limit, context = 20, 30
+        
+        # Only the original document and its text index are read / 只读取原始文档及其文本索引
+        processor = get_document_processor(uploaded_documents[doc_id])
+        with processor.lock:
+            report = processor.match_report(modifications, limit, context)
+        
+        response_data = {
+            'success': True,
+            'doc_id': doc_id
+        }
+        response_data.update(report)
+        return jsonify(response_data)
         
     except Exception as e:
         # Log error / 记录错误
@@ -294,34 +511,38 @@ def process_document():
         # Log processing start / 记录处理开始
         log_info('document_processed', doc_id=doc_id)
         
-        # Initialize document processor / 初始化文档处理器
-        processor = EnhancedWordProcessor()
-        
-        # Load original document / 加载原始文档
-        processor.load_document(doc_info['file_path'])
-        
-        # Apply modifications / 应用修改
-        success, message = processor.apply_modifications(mod_info['modifications'])
+        # Reuse the processor kept with the document / 复用与文档一起保存的处理器
+        processor = get_document_processor(doc_info)
         
-        if not success:
-            return jsonify({
-                'success': False,
-                'message': message
-            })
-        
-        # Save processed document / 保存处理后的文档
-        processed_filename = f"processed_{doc_info['safe_filename']}"
-        processed_file_path = os.path.join(Config.UPLOAD_FOLDER, f"{doc_id}_{processed_filename}")
-        success, save_message = processor.save_modified_document(processed_file_path)
-        
-        if not success:
-            return jsonify({
-                'success': False,
-                'message': save_message
-            })
-        
-        # Extract modified document content for preview / 提取修改后的文档内容用于预览
-        modified_content = processor.extract_content_with_formatting(processor.modified_doc)
+        with processor.lock:
+            # Apply modifications / 应用修改
+            success, message = processor.apply_modifications(mod_info['modifications'])
+            
+            if not success:
+                return jsonify({
+                    'success': False,
+                    'message': message
+                })
+            
+            # Save processed document / 保存处理后的文档
+            processed_filename = f"processed_{doc_info['safe_filename']}"
+            processed_file_path = os.path.join(Config.UPLOAD_FOLDER, f"{doc_id}_{processed_filename}")
+            success, save_message = processor.save_modified_document(processed_file_path)
+            
+            if not success:
+                return jsonify({
+                    'success': False,
+                    'message': save_message
+                })
+            
+            # Re-extract only the touched blocks on top of the original content / 只在原始内容上重新提取被修改的内容块
+            modified_content, _touched = processor.build_modified_content(doc_info['content'])
+            if modified_content is None:
+                modified_content = processor.extract_content_with_formatting(processor.modified_doc)
+            
+            original_diff = None
+            if data.get('diff'):
+                original_diff = diff_against_original(doc_info['content'], modified_content, processor.get_modified_blocks())
         
         # Count modifications for reporting / 统计修改数量用于报告
         paragraph_count = len(mod_info['modifications'])
@@ -333,25 +554,30 @@ def process_document():
             'modifications_applied': True,
             'processed_file_path': processed_file_path,
             'processed_filename': processed_filename,
+            'processed_file_stale': False,
+            'modified_content': modified_content,
+            'modifications': mod_info['modifications'],
             'modification_count': len(mod_info['modifications']),
             'paragraph_changes': paragraph_count,
             'table_changes': table_count,
             'process_time': datetime.now().isoformat()
         })
+        document_changed(uploaded_documents[doc_id])
         
         # Log completion / 记录完成
         log_info('modifications_applied', paragraphs=paragraph_count, tables=table_count)
         
-        return jsonify({
+        response_data = {
             'success': True,
             'message': get_text('document_processed'),
             'doc_id': doc_id,
             'modification_count': len(mod_info['modifications']),
             'paragraph_changes': paragraph_count,
             'table_changes': table_count,
-            'download_url': f'/api/download_document/{doc_id}',
-            'modified_content': modified_content
-        })
+            'download_url': f'/api/download_document/{doc_id}'
+        }
+        add_modified_blocks(response_data, doc_info, modified_content, original_diff, 'original')
+        return jsonify(response_data)
         
     except Exception as e:
         # Log error / 记录错误
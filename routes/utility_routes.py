@@ -12,6 +12,7 @@ from flask import Blueprint, request, jsonify, send_file
 from utils.i18n import get_text, set_language, get_current_language
 from utils.logger import log_info, log_error
 from config import Config
+from .document_routes import uploaded_documents, shared_documents, extraction_cache, janitor
 
 # Create utility blueprint / 创建工具蓝图
 utility_bp = Blueprint('utility', __name__)
@@ -155,7 +156,11 @@ def health_check():
             'success': True,
             'status': 'healthy',
             'message': get_text('service_healthy'),
-            'language': get_current_language()
+            'language': get_current_language(),
+            'documents': uploaded_documents.stats(),
+            'shared_documents': shared_documents.stats(),
+            'extraction_cache': extraction_cache.stats(),
+            'janitor': janitor.stats()
         })
         
     except Exception as e:
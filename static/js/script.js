@@ -2,6 +2,15 @@
 let currentDocId = null;
 let originalContent = null;
 let modifiedContent = null;
+let originalTotal = 0; // 原始内容块总数（originalContent只保存已加载的前缀）
+let modifiedTotal = 0; // 修改后内容块总数
+let contentWindowSize = 200; // 每次按需获取的内容块数量
+const CONTENT_SCHEMA = 2; // 请求紧凑内容结构：run编码为[文本, 格式ID]
+let contentFormats = {}; // 当前文档的run格式表：格式ID -> 格式
+const contentWindows = {
+    original: { loading: false, generation: 0, observer: null, rendered: 0, streaming: false },
+    modified: { loading: false, generation: 0, observer: null, rendered: 0, streaming: false }
+};
 let modifications = [];
 let appliedModifications = []; // 新增：追踪已应用的修改
 let selectedModificationIndex = -1;
@@ -54,6 +63,7 @@ async function loadTranslations() {
             edit: '编辑',
             upload_success: '文档上传成功',
             upload_failed: '上传失败',
+            content_load_failed: '文档内容加载失败',
             invalid_file_format: '请选择支持的文档格式文件 (.docx 或 .txt)',
             preview_prompt: '应用修改后可预览最终文档',
             unsaved_changes: '您有未保存的修改，确定要离开吗？',
@@ -94,6 +104,7 @@ async function loadTranslations() {
             edit: 'Edit',
             upload_success: 'Document uploaded successfully',
             upload_failed: 'Upload failed',
+            content_load_failed: 'Failed to load document content',
             invalid_file_format: 'Please select supported document format (.docx or .txt)',
             preview_prompt: 'Preview will be available after applying modifications',
             unsaved_changes: 'You have unsaved changes. Are you sure you want to leave?',
@@ -291,7 +302,7 @@ function initializeEventListeners() {
     });
 }
 
-// 文件上传处理
+// 文件上传处理（以NDJSON流接收内容块，第一屏内容在整个文档遍历完成前即可显示）
 async function handleFileUpload(event) {
     const file = event.target.files[0];
     if (!file) return;
@@ -305,6 +316,8 @@ async function handleFileUpload(event) {
     
     const formData = new FormData();
     formData.append('document', file);
+    formData.append('stream', '1');
+    formData.append('schema', String(CONTENT_SCHEMA));
     
     try {
         const response = await fetch('/api/upload_document', {
@@ -312,59 +325,258 @@ async function handleFileUpload(event) {
             body: formData
         });
         
-        const result = await response.json();
-        
-        if (result.success) {
-            currentDocId = result.doc_id;
-            originalContent = result.content;
-            fileName.textContent = result.filename;
-            
-            // 清空之前的修改条目
-            modifications = [];
-            appliedModifications = [];
-            modifiedContent = null;
-            
-            displayOriginalDocument(result.content);
-            enableModificationControls();
-            updateModificationsList();
-            updateModificationStats(0, 0, 0);
-            
-            // 清空预览区域
-            previewContentDiv.innerHTML = `
-                <div class="placeholder">
-                    <i class="icon-preview"></i>
-                    <p>${getText('preview_prompt')}</p>
-                </div>
-            `;
-            
-            // 禁用下载按钮
-            downloadBtn.disabled = true;
-            
-            showMessage(getText('upload_success'), 'success');
-        } else {
+        // 出错时服务器返回普通JSON
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.includes('application/x-ndjson')) {
+            const result = await response.json();
             showMessage(result.message, 'error');
+            return;
         }
+        
+        await readNdjsonStream(response, streamEvent => {
+            if (streamEvent.event === 'start') {
+                startStreamedDocument(streamEvent);
+                hideLoading();
+            } else if (streamEvent.event === 'block') {
+                mergeContentFormats(streamEvent.formats);
+                originalContent.push(streamEvent.block);
+                scheduleStreamedRender('original');
+            } else if (streamEvent.event === 'end') {
+                finishStreamedDocument(streamEvent);
+            }
+        });
     } catch (error) {
+        contentWindows.original.streaming = false;
         showMessage(getText('upload_failed') + ': ' + error.message, 'error');
     } finally {
         hideLoading();
     }
 }
 
+// 逐行读取NDJSON响应，每解析出一个事件回调一次
+async function readNdjsonStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.forEach(line => {
+            if (line.trim()) onEvent(JSON.parse(line));
+        });
+    }
+    
+    buffer += decoder.decode();
+    if (buffer.trim()) onEvent(JSON.parse(buffer));
+}
+
+// 流开始：初始化文档状态，内容块随后陆续到达
+function startStreamedDocument(streamEvent) {
+    currentDocId = streamEvent.doc_id;
+    contentFormats = {};
+    originalContent = [];
+    originalTotal = Infinity; // 遍历结束前总数未知
+    contentWindowSize = streamEvent.window_size || contentWindowSize;
+    contentWindows.original.streaming = true;
+    fileName.textContent = streamEvent.filename;
+    
+    // 清空之前的修改条目
+    modifications = [];
+    appliedModifications = [];
+    modifiedContent = null;
+    
+    displayOriginalDocument(originalContent.slice());
+    enableModificationControls();
+    updateModificationsList();
+    updateModificationStats(0, 0, 0);
+    
+    // 清空预览区域
+    previewContentDiv.innerHTML = `
+        <div class="placeholder">
+            <i class="icon-preview"></i>
+            <p>${getText('preview_prompt')}</p>
+        </div>
+    `;
+    
+    // 禁用下载按钮
+    downloadBtn.disabled = true;
+}
+
+// 流结束：记录内容块总数，剩余内容随滚动显示
+function finishStreamedDocument(streamEvent) {
+    contentWindows.original.streaming = false;
+    originalTotal = streamEvent.content_total;
+    refreshContentWindows('original');
+    showMessage(getText('upload_success'), 'success');
+}
+
+// 流式接收期间按动画帧合并渲染，哨兵可见时才追加已到达的内容块
+function scheduleStreamedRender(type) {
+    const state = contentWindows[type];
+    if (state.renderScheduled) return;
+    state.renderScheduled = true;
+    requestAnimationFrame(() => {
+        state.renderScheduled = false;
+        if (state.sentinelVisible) {
+            loadNextContentWindow(type);
+        }
+    });
+}
+
 // 显示原始文档内容
 function displayOriginalDocument(content) {
     const html = generateDocumentHTML(content, 'original');
     originalContentDiv.innerHTML = `<div class="document-content">${html}</div>`;
+    observeContentWindows('original', content ? content.length : 0);
 }
 
 // 显示修改后文档内容
 function displayModifiedDocument(content) {
     const html = generateDocumentHTML(content, 'modified');
     previewContentDiv.innerHTML = `<div class="document-content">${html}</div>`;
+    observeContentWindows('modified', content ? content.length : 0);
+}
+
+// 获取某一类型已加载的内容块、总数和所在面板
+function getContentWindowTarget(type) {
+    if (type === 'original') {
+        return { blocks: originalContent, total: originalTotal, container: originalContentDiv };
+    }
+    return { blocks: modifiedContent, total: modifiedTotal, container: previewContentDiv };
+}
+
+// 在已渲染内容末尾放置哨兵，滚动接近末尾时显示下一个内容窗口
+function observeContentWindows(type, rendered) {
+    const state = contentWindows[type];
+    if (state.observer) {
+        state.observer.disconnect();
+        state.observer = null;
+    }
+    // 重新渲染后，尚未返回的旧窗口请求将被丢弃
+    state.generation += 1;
+    state.loading = false;
+    state.rendered = rendered;
+    state.sentinelVisible = false;
+    
+    const target = getContentWindowTarget(type);
+    const documentDiv = target.container.querySelector('.document-content');
+    if (!documentDiv || !target.blocks || rendered >= target.total) {
+        return;
+    }
+    
+    const sentinel = document.createElement('div');
+    sentinel.className = 'content-window-sentinel';
+    documentDiv.appendChild(sentinel);
+    
+    state.observer = new IntersectionObserver(entries => {
+        state.sentinelVisible = entries.some(entry => entry.isIntersecting);
+        if (state.sentinelVisible) {
+            loadNextContentWindow(type);
+        }
+    }, { root: documentDiv, rootMargin: '600px 0px' });
+    state.observer.observe(sentinel);
+}
+
+// 显示下一个内容窗口：优先使用已到达的内容块，否则从服务器获取
+async function loadNextContentWindow(type) {
+    const state = contentWindows[type];
+    const target = getContentWindowTarget(type);
+    if (state.loading || !state.observer || !currentDocId || !target.blocks) {
+        return;
+    }
+    
+    const offset = state.rendered;
+    if (target.blocks.length > offset) {
+        appendContentWindow(type, target.blocks.slice(offset, offset + contentWindowSize), offset);
+        return;
+    }
+    // 流式上传仍在进行时等待后续内容块，避免与流重复
+    if (state.streaming || offset >= target.total) {
+        return;
+    }
+    
+    state.loading = true;
+    const generation = state.generation;
+    
+    try {
+        const response = await fetch(`/api/document_content/${currentDocId}?version=${type}&offset=${offset}&limit=${contentWindowSize}&schema=${CONTENT_SCHEMA}`);
+        const result = await response.json();
+        
+        // 请求期间内容已重新渲染，丢弃过期窗口
+        if (generation !== state.generation) {
+            return;
+        }
+        if (!result.success) {
+            showMessage(result.message, 'error');
+            return;
+        }
+        
+        mergeContentFormats(result.formats);
+        result.content.forEach(item => target.blocks.push(item));
+        if (type === 'original') {
+            originalTotal = result.total;
+        } else {
+            modifiedTotal = result.total;
+        }
+        if (result.content.length === 0) {
+            // 服务器端内容比预期少，停止继续获取
+            if (type === 'original') {
+                originalTotal = offset;
+            } else {
+                modifiedTotal = offset;
+            }
+            refreshContentWindows(type);
+            return;
+        }
+        appendContentWindow(type, result.content, offset);
+    } catch (error) {
+        showMessage(getText('content_load_failed') + ': ' + error.message, 'error');
+    } finally {
+        if (generation === state.generation) {
+            state.loading = false;
+        }
+    }
+}
+
+// 在哨兵之前追加一个内容窗口，全部显示后移除哨兵
+function appendContentWindow(type, blocks, offset) {
+    const state = contentWindows[type];
+    const target = getContentWindowTarget(type);
+    const sentinel = target.container.querySelector('.content-window-sentinel');
+    if (!sentinel || !state.observer) {
+        return;
+    }
+    
+    sentinel.insertAdjacentHTML('beforebegin', generateDocumentHTML(blocks, type, offset));
+    state.rendered = offset + blocks.length;
+    refreshContentWindows(type);
 }
 
-// 生成文档HTML
-function generateDocumentHTML(content, type) {
+// 全部显示后移除哨兵，否则重新观察，哨兵仍在可视范围内时继续显示
+function refreshContentWindows(type) {
+    const state = contentWindows[type];
+    const target = getContentWindowTarget(type);
+    const sentinel = target.container.querySelector('.content-window-sentinel');
+    if (!sentinel || !state.observer) {
+        return;
+    }
+    
+    if (state.rendered >= target.total) {
+        state.observer.disconnect();
+        state.observer = null;
+        sentinel.remove();
+    } else {
+        state.observer.unobserve(sentinel);
+        state.observer.observe(sentinel);
+    }
+}
+
+// 生成文档HTML（startIndex为窗口中第一个内容块在文档中的位置）
+function generateDocumentHTML(content, type, startIndex = 0) {
     let html = '';
     
     // Check if content is valid array / 检查content是否为有效数组
@@ -374,9 +586,9 @@ function generateDocumentHTML(content, type) {
     
     content.forEach((item, index) => {
         if (item.type === 'paragraph') {
-            html += generateParagraphHTML(item, index, type);
+            html += generateParagraphHTML(item, startIndex + index, type);
         } else if (item.type === 'table') {
-            html += generateTableHTML(item, index, type);
+            html += generateTableHTML(item, startIndex + index, type);
         }
     });
     
@@ -414,18 +626,7 @@ function generateParagraphHTML(item, index, type) {
     }
     
     // 添加图片
-    if (item.images && item.images.length > 0) {
-        item.images.forEach(image => {
-            paragraphHTML += `
-                <div class="word-image-container">
-                    <img src="data:${image.mime_type};base64,${image.data}" 
-                         alt="${image.filename}" 
-                         class="word-document-image" />
-                    <div class="word-image-caption">${image.filename}</div>
-                </div>
-            `;
-        });
-    }
+    paragraphHTML += generateImagesHTML(item.images);
     
     let paragraphClasses = 'word-paragraph';
     if (type === 'modified') {
@@ -443,7 +644,18 @@ function generateParagraphHTML(item, index, type) {
     return `<div class="${paragraphClasses}" id="${paragraphId}" data-text="${escapeHtml(item.text)}" data-style="${item.style || 'Normal'}"${styleAttr}>${paragraphHTML}</div>`;
 }
 
+// 合并服务器返回的run格式（格式ID在文档生命周期内不变）
+function mergeContentFormats(formats) {
+    if (formats) {
+        Object.assign(contentFormats, formats);
+    }
+}
+
 function generateRunHTML(run) {
+    // 紧凑结构的run为[文本, 格式ID]
+    if (Array.isArray(run)) {
+        run = { ...contentFormats[run[1]], text: run[0] };
+    }
     let runHTML = escapeHtml(run.text);
     let runStyles = [];
     let runClasses = ['word-run'];
@@ -522,6 +734,7 @@ function generateTableHTML(item, index, type) {
                     } else {
                         paraHTML = escapeHtml(para.text);
                     }
+                    paraHTML += generateImagesHTML(para.images);
                     
                     const paraStyleAttr = paraStyles.length > 0 ? ` style="${paraStyles.join('; ')}"` : '';
                     cellHTML += `<div class="word-cell-paragraph"${paraStyleAttr}>${paraHTML}</div>`;
@@ -540,6 +753,28 @@ function generateTableHTML(item, index, type) {
     return html;
 }
 
+// 生成段落引用的图片HTML（图片按内容哈希从图片接口加载）
+function generateImagesHTML(images) {
+    if (!images || images.length === 0) {
+        return '';
+    }
+    
+    // 按预览栏宽度请求缩小的预览图（服务器向上取整到固定宽度并缓存）
+    const width = Math.ceil(window.innerWidth / 2 * (window.devicePixelRatio || 1));
+    let html = '';
+    images.forEach(image => {
+        html += `
+            <div class="word-image-container">
+                <img src="/api/document_image/${currentDocId}/${image.hash}?width=${width}" 
+                     alt="${image.filename}" loading="lazy" 
+                     class="word-document-image" />
+                <div class="word-image-caption">${image.filename}</div>
+            </div>
+        `;
+    });
+    return html;
+}
+
 // HTML转义
 function escapeHtml(text) {
     const div = document.createElement('div');
@@ -1218,14 +1453,17 @@ async function removeModification(index, event) {
                 },
                 body: JSON.stringify({
                     doc_id: currentDocId,
-                    modifications: modifications
+                    modifications: modifications,
+                    incremental: modifiedContent !== null,
+                    diff: originalContent !== null,
+                    schema: CONTENT_SCHEMA
                 })
             });
             
             const result = await response.json();
             
             if (result.success) {
-                modifiedContent = result.modified_content;
+                updateModifiedContentFromResult(result);
                 // 更新已应用修改列表
                 appliedModifications = modifications.map(mod => ({
                     original_text: mod.original_text,
@@ -1233,7 +1471,7 @@ async function removeModification(index, event) {
                     reason: mod.reason
                 }));
                 
-                displayModifiedDocument(result.modified_content);
+                displayModifiedDocument(modifiedContent);
                 downloadBtn.disabled = false;
             } else {
                 showMessage(result.message, 'error');
@@ -1264,6 +1502,33 @@ async function removeModification(index, event) {
     showMessage(getText('modification_deleted', '修改条目已删除'), 'info');
 }
 
+// 根据服务器返回结果更新修改后内容（增量结果只替换变化的内容块）
+// modified_base为'modified'时修补当前的修改后预览，为'original'时修补原始内容；未加载的内容块在滚动时再获取
+function updateModifiedContentFromResult(result) {
+    mergeContentFormats(result.formats);
+    const base = result.modified_base === 'original' ? originalContent : modifiedContent;
+    if (result.incremental && Array.isArray(result.modified_blocks) && base) {
+        modifiedContent = base.slice();
+        modifiedTotal = result.modified_total || modifiedTotal;
+        result.modified_blocks.forEach(change => {
+            let position = change.position;
+            const current = modifiedContent[position];
+            if (!current || current.type !== change.type || current.index !== change.index) {
+                position = modifiedContent.findIndex(item =>
+                    item.type === change.type && item.index === change.index
+                );
+            }
+            if (position >= 0) {
+                modifiedContent[position] = change.block;
+            }
+        });
+    } else {
+        modifiedContent = result.modified_content;
+        modifiedTotal = result.modified_total || modifiedContent.length;
+    }
+    return modifiedContent;
+}
+
 // 应用所有修改
 async function applyModifications() {
     if (!currentDocId || modifications.length === 0) {
@@ -1281,14 +1546,17 @@ async function applyModifications() {
             },
             body: JSON.stringify({
                 doc_id: currentDocId,
-                modifications: modifications
+                modifications: modifications,
+                incremental: modifiedContent !== null,
+                diff: originalContent !== null,
+                schema: CONTENT_SCHEMA
             })
         });
         
         const result = await response.json();
         
         if (result.success) {
-            modifiedContent = result.modified_content;
+            updateModifiedContentFromResult(result);
             // 更新已应用修改列表 - 创建当前修改的深拷贝
             appliedModifications = modifications.map(mod => ({
                 original_text: mod.original_text,
@@ -1296,7 +1564,7 @@ async function applyModifications() {
                 reason: mod.reason
             }));
             
-            displayModifiedDocument(result.modified_content);
+            displayModifiedDocument(modifiedContent);
             downloadBtn.disabled = false;
             showMessage(getText('modifications_applied', '修改应用成功'), 'success');
             
@@ -2159,21 +2427,24 @@ async function reapplyModifications() {
             },
             body: JSON.stringify({
                 doc_id: currentDocId,
-                modifications: modifications
+                modifications: modifications,
+                incremental: modifiedContent !== null,
+                diff: originalContent !== null,
+                schema: CONTENT_SCHEMA
             })
         });
         
         const result = await response.json();
         
         if (result.success) {
-            modifiedContent = result.modified_content;
+            updateModifiedContentFromResult(result);
             appliedModifications = modifications.map(mod => ({
                 original_text: mod.original_text,
                 new_text: mod.new_text,
                 reason: mod.reason
             }));
             
-            displayModifiedDocument(result.modified_content);
+            displayModifiedDocument(modifiedContent);
             downloadBtn.disabled = false;
             
             // 更新修改条目列表显示
@@ -2233,9 +2504,11 @@ async function checkAutoLoadParams() {
             if (result.success) {
                 // 设置当前文档ID
                 currentDocId = result.doc_id;
+                contentFormats = {};
                 
                 // 显示原始文档
                 originalContent = result.content;
+                originalTotal = result.content_total || result.content.length;
                 displayOriginalDocument(result.content);
                 
                 // 更新文件名显示
@@ -2257,6 +2530,7 @@ async function checkAutoLoadParams() {
                     if (result.auto_applied) {
                         // 如果已自动应用，显示修改后的文档
                         modifiedContent = result.modified_content;
+                        modifiedTotal = result.modified_total || result.modified_content.length;
                         appliedModifications = [...modifications];
                         displayModifiedDocument(result.modified_content);
                         downloadBtn.disabled = false;
@@ -2301,7 +2575,7 @@ async function loadExistingDocument(docId) {
     try {
         // 获取文档信息
         console.log('Fetching document info from:', `/api/document_info/${docId}`);
-        const infoResponse = await fetch(`/api/document_info/${docId}`);
+        const infoResponse = await fetch(`/api/document_info/${docId}?schema=${CONTENT_SCHEMA}`);
         console.log('Response status:', infoResponse.status);
         const infoResult = await infoResponse.json();
         console.log('Document info result:', infoResult);
@@ -2314,9 +2588,13 @@ async function loadExistingDocument(docId) {
         
         // 设置当前文档ID
         currentDocId = docId;
+        contentFormats = {};
+        mergeContentFormats(infoResult.formats);
         
         // 显示原始文档
         originalContent = infoResult.content;
+        originalTotal = infoResult.content_total || infoResult.content.length;
+        contentWindowSize = infoResult.window_size || contentWindowSize;
         displayOriginalDocument(infoResult.content);
         
         // 更新文件名显示
@@ -2339,6 +2617,7 @@ async function loadExistingDocument(docId) {
             // 如果有修改后的内容，显示预览
             if (infoResult.modified_content) {
                 modifiedContent = infoResult.modified_content;
+                modifiedTotal = infoResult.modified_total || infoResult.modified_content.length;
                 appliedModifications = [...modifications]; // 标记为已应用
                 displayModifiedDocument(infoResult.modified_content);
                 downloadBtn.disabled = false;
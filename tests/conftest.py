@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test configuration / 测试配置
+Makes the application packages importable when pytest is run from any directory and provides shared fixtures
+从任意目录运行pytest时都可以导入应用的包，并提供共用的fixture
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def request_context():
+    """Request context for code that reads the interface language / 读取界面语言的代码所需的请求上下文"""
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    with app.test_request_context('/'):
+        yield
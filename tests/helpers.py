@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test helpers / 测试辅助函数
+Builds sample documents and summarizes saved documents so that results of the
+different modification engines can be compared
+构建示例文档并汇总保存后的文档，用于比较不同修改引擎的结果
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import zipfile
+from typing import List, Tuple
+
+from lxml import etree
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+_NS = {'w': W_NS}
+
+
+def paragraph_summary(path: str) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...]]]:
+    """
+    Text, highlighted runs and comment texts of every paragraph of a saved docx
+    保存后docx中每个段落的文本、高亮run和批注文本
+
+    Comment ids are resolved to their text, so documents that number comments
+    differently still compare equal
+    批注ID被解析为批注文本，批注编号不同的文档仍然可以比较
+
+    Returns:
+        [(paragraph text, highlighted run texts, comment texts)] in document order
+        按文档顺序排列的[(段落文本, 高亮run文本, 批注文本)]
+    """
+    with zipfile.ZipFile(path) as package:
+        body = etree.fromstring(package.read('word/document.xml')).find('w:body', _NS)
+        comments = {}
+        if 'word/comments.xml' in package.namelist():
+            for comment in etree.fromstring(package.read('word/comments.xml')).iterfind('w:comment', _NS):
+                comments[comment.get(f'{{{W_NS}}}id')] = ''.join(comment.itertext())
+
+    summary = []
+    for paragraph in body.iter(f'{{{W_NS}}}p'):
+        text = ''.join(t.text or '' for t in paragraph.iterfind('.//w:t', _NS))
+        highlighted = tuple(
+            ''.join(t.text or '' for t in run.iterfind('w:t', _NS))
+            for run in paragraph.iterfind('.//w:r', _NS)
+            if run.find('w:rPr/w:highlight', _NS) is not None
+        )
+        referenced = tuple(
+            comments.get(reference.get(f'{{{W_NS}}}id'), '')
+            for reference in paragraph.iterfind('.//w:commentReference', _NS)
+        )
+        summary.append((text, highlighted, referenced))
+    return summary
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental update tests / 增量更新测试
+update_modifications must leave the document exactly as a full apply_modifications would
+update_modifications的结果必须与完整执行apply_modifications完全一致
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import random
+
+import pytest
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+from tests.helpers import paragraph_summary
+from utils.document_processor import EnhancedWordProcessor
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', '中文', '文本', 'alpha beta', 'ta ga']
+
+
+@pytest.fixture
+def sample_path(tmp_path):
+    rng = random.Random(7)
+    doc = Document()
+    for _ in range(30):
+        paragraph = doc.add_paragraph()
+        # 多个run使匹配跨越run边界 / Several runs so that matches cross run boundaries
+        for _ in range(rng.randint(1, 4)):
+            paragraph.add_run(' '.join(rng.choice(WORDS[:6]) for _ in range(rng.randint(1, 3))) + ' ')
+    table = doc.add_table(rows=2, cols=2)
+    for row in table.rows:
+        for cell in row.cells:
+            cell.text = ' '.join(rng.choice(WORDS[:6]) for _ in range(3))
+    doc.add_paragraph('gamma delta 中文文本')
+    path = tmp_path / 'sample.docx'
+    doc.save(path)
+    return str(path)
+
+
+def random_modifications(rng):
+    modifications = []
+    for key in rng.sample(WORDS, rng.randint(0, 5)):
+        modifications.append({
+            'original_text': key,
+            'new_text': rng.choice(['X', 'YY', '', key.upper(), '替换']),
+            'reason': rng.choice(['r1', 'r2'])
+        })
+    return modifications
+
+
+def saved_summary(processor, path):
+    success, message = processor.save_modified_document(path)
+    assert success, message
+    return paragraph_summary(path)
+
+
+def test_incremental_update_matches_full_apply(sample_path, tmp_path, request_context):
+    rng = random.Random(11)
+    incremental = EnhancedWordProcessor()
+    assert incremental.load_document(sample_path)[0]
+    assert incremental.apply_modifications(random_modifications(rng))[0]
+
+    incremental_runs = 0
+    for trial in range(20):
+        modifications = random_modifications(rng)
+        success, message, blocks = incremental.update_modifications(modifications)
+        assert success, message
+        if blocks is not None:
+            incremental_runs += 1
+
+        full = EnhancedWordProcessor()
+        assert full.load_document(sample_path)[0]
+        assert full.apply_modifications(modifications)[0]
+
+        expected = saved_summary(full, str(tmp_path / f'full_{trial}.docx'))
+        actual = saved_summary(incremental, str(tmp_path / f'incremental_{trial}.docx'))
+        assert actual == expected, modifications
+
+    # 必须真正走过增量路径 / The incremental path must actually have been taken
+    assert incremental_runs == 20
+
+
+def test_incremental_update_reports_changed_blocks(sample_path, request_context):
+    processor = EnhancedWordProcessor()
+    assert processor.load_document(sample_path)[0]
+    assert processor.apply_modifications([{'original_text': 'alpha', 'new_text': 'A', 'reason': 'r'}])[0]
+
+    success, _, blocks = processor.update_modifications([
+        {'original_text': 'alpha', 'new_text': 'A', 'reason': 'r'},
+        {'original_text': '中文文本', 'new_text': 'B', 'reason': 'r'}
+    ])
+    assert success
+    assert blocks == [('paragraph', 30)]
+
+
+def test_same_text_with_different_match_types_are_separate_rules(tmp_path, request_context):
+    doc = Document()
+    doc.add_paragraph('Cat cat category')
+    path = str(tmp_path / 'cats.docx')
+    doc.save(path)
+    modifications = [
+        {'original_text': 'Cat', 'new_text': 'X', 'reason': 'r1', 'match_type': 'literal'},
+        {'original_text': 'Cat', 'new_text': 'Y', 'reason': 'r2', 'match_type': 'case_insensitive'},
+    ]
+
+    processor = EnhancedWordProcessor()
+    assert processor.load_document(path)[0]
+    report = processor.match_report(modifications)
+    assert [(rule['match_type'], rule['hit_count']) for rule in report['results']] == \
+        [('literal', 1), ('case_insensitive', 2)]
+
+    assert processor.apply_modifications(modifications)[0]
+    (text, _highlighted, comments), = saved_summary(processor, str(tmp_path / 'applied.docx'))
+    assert text == 'X Y Yegory'
+    assert comments == ('r1', 'r2', 'r2')
+
+    # 只改变其中一条的匹配方式也会增量更新 / Changing one rule's match type updates incrementally
+    modifications[1] = dict(modifications[1], match_type='whole_word')
+    success, _, blocks = processor.update_modifications(modifications)
+    assert success and blocks == [('paragraph', 0)]
+    (text, _highlighted, comments), = saved_summary(processor, str(tmp_path / 'updated.docx'))
+    assert text == 'X cat category'
+
+
+def test_offsets_line_up_with_extracted_text_around_hyperlinks(tmp_path, request_context):
+    doc = Document()
+    paragraph = doc.add_paragraph('see ')
+    hyperlink = parse_xml(f'<w:hyperlink {nsdecls("w")}><w:r><w:t>the link</w:t></w:r></w:hyperlink>')
+    paragraph._p.append(hyperlink)
+    paragraph.add_run(' then target')
+    path = str(tmp_path / 'linked.docx')
+    doc.save(path)
+
+    processor = EnhancedWordProcessor()
+    assert processor.load_document(path)[0]
+    block, = processor.extract_content_with_formatting(processor.original_doc)
+    # 提取文本和run包含超链接，与匹配使用的文本一致 / Extracted text and runs include the hyperlink, as matching does
+    assert block['text'] == 'see the link then target'
+    assert ''.join(run['text'] for run in block['runs']) == block['text']
+
+    location, = processor.match_report([{'original_text': 'target', 'new_text': 'X'}])['results'][0]['locations']
+    assert block['text'][location['offset']:].startswith('target')
+    found, = processor.search_text('target')
+    assert found['offset'] == location['offset']
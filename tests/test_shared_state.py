@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cross-process state tests / 跨进程状态测试
+Document registry, temp janitor, document store and extraction cache behave correctly
+when several worker processes share the same files
+多个工作进程共享相同文件时，文档登记表、临时文件清理器、文档存储和提取缓存的行为正确
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import io
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+from utils.document_registry import DocumentRegistry
+from utils.document_store import DocumentStore
+from utils.extraction_cache import ExtractionCache
+from utils.shared_documents import release_blob, store_blob
+from utils.temp_janitor import TempFileJanitor
+
+
+def age(path, seconds=3600):
+    """Move a file's modification time into the past / 将文件的修改时间调到过去"""
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_blob_refcount_shared_between_connections(tmp_path):
+    # 两个登记表实例模拟两个工作进程，各自持有连接 / Two registry instances stand for two workers with their own connection
+    first = DocumentRegistry(str(tmp_path / 'registry.db'))
+    second = DocumentRegistry(str(tmp_path / 'registry.db'))
+
+    content_hash, path = store_blob(io.BytesIO(b'same bytes'), str(tmp_path), '.docx', first)
+    assert store_blob(io.BytesIO(b'same bytes'), str(tmp_path), '.docx', second) == (content_hash, path)
+    assert second.blob_hashes() == [content_hash]
+
+    assert release_blob(path, first) == 1
+    assert os.path.exists(path)
+    assert release_blob(path, second) == 0
+    assert not os.path.exists(path)
+    assert first.blob_hashes() == []
+
+
+def test_clear_keeps_references_of_unregistered_uploads(tmp_path):
+    registry = DocumentRegistry(str(tmp_path / 'registry.db'))
+    other_worker = DocumentRegistry(str(tmp_path / 'registry.db'))
+
+    content_hash, path = store_blob(io.BytesIO(b'shared'), str(tmp_path), '.docx', registry)
+    registry.save('doc-a', {'file_path': path, 'content_hash': content_hash})
+    # 另一个工作进程已存储但尚未登记文档 / Another worker stored the upload but has not registered its document yet
+    store_blob(io.BytesIO(b'shared'), str(tmp_path), '.docx', other_worker)
+
+    released = []
+    assert registry.clear(lambda info: released.append(release_blob(info['file_path'], registry))) == 1
+    assert released == [1]
+    assert registry.ids() == []
+    assert other_worker.blob_hashes() == [content_hash]
+    assert os.path.exists(path)
+
+
+def test_janitor_spares_referenced_blobs_and_registry_files(tmp_path):
+    uploads = tmp_path / 'uploads'
+    registry_path = str(uploads / 'registry.db')
+    registry = DocumentRegistry(registry_path)
+    _content_hash, blob = store_blob(io.BytesIO(b'referenced'), str(uploads), '.docx', registry)
+    orphan = uploads / 'nested' / 'deadbeef_orphan.docx'
+    orphan.parent.mkdir()
+    orphan.write_bytes(b'orphan')
+
+    registry_files = [registry_path, registry_path + '-wal', registry_path + '-shm']
+    for path in [blob, str(orphan)] + registry_files:
+        assert os.path.exists(path)
+        age(path)
+
+    janitor = TempFileJanitor(DocumentStore(0, registry), lambda doc_id: None, lifetime=60,
+                              folders=(str(uploads),), exclude=(registry_path,))
+    assert janitor.run_once() == {'documents_expired': 0, 'files_removed': 1}
+    assert not orphan.exists()
+    for path in [blob] + registry_files:
+        assert os.path.exists(path)
+
+    # 最后一个引用释放但文件仍在时，该文件成为孤立文件 / A blob left behind after its last reference is an orphan
+    assert registry.release_blob(blob, lambda: None) == 0
+    assert janitor.run_once()['files_removed'] == 1
+    assert not os.path.exists(blob)
+
+
+def loaded_document(doc_id, lock):
+    """doc_info with about 2.4 KB of extracted content / 提取内容约2.4KB的doc_info"""
+    processor = SimpleNamespace(lock=lock, has_original=False, modified_doc=None)
+    return {'id': doc_id, 'processor': processor, 'content': [{'type': 'paragraph', 'text': 'x' * 1000}]}
+
+
+def test_store_eviction_skips_document_in_use(tmp_path):
+    store = DocumentStore(3000, DocumentRegistry(str(tmp_path / 'registry.db')))
+    store.configure(rehydrate=lambda doc_info: None, before_evict=lambda doc_info: True)
+    busy_lock = threading.Lock()
+    store['busy'] = loaded_document('busy', busy_lock)
+
+    # 正在使用的文档被跳过，预算仍超出 / The document in use is skipped and the budget stays exceeded
+    with busy_lock:
+        store['new'] = loaded_document('new', threading.Lock())
+    assert 'processor' in store.peek('busy')
+    assert store.loaded_size() > store.memory_budget
+    assert store.stats()['evictions'] == 0
+
+    store.enforce_budget(keep='new')
+    assert 'processor' not in store.peek('busy')
+    assert 'processor' in store.peek('new')
+    assert store.stats()['evictions'] == 1
+
+
+def test_extraction_cache_ignores_other_versions(tmp_path):
+    data = {'content': [{'type': 'paragraph', 'text': '中文'}]}
+    ExtractionCache(str(tmp_path), 1).store('abc', '.docx', data)
+
+    assert ExtractionCache(str(tmp_path), 1).load('abc', '.docx') == data
+    assert ExtractionCache(str(tmp_path), 1).load('abc', '.doc') is None
+    newer = ExtractionCache(str(tmp_path), 2)
+    assert not newer.contains('abc', '.docx')
+    assert newer.load('abc', '.docx') is None
+    assert newer.stats()['misses'] == 1
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.tmp')] == []
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming and parallel rewriter tests / 流式和并行改写测试
+The streaming and parallel engines must edit exactly the paragraphs the object-model engine edits
+流式和并行引擎必须与对象模型引擎改写完全相同的段落
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import io
+import zipfile
+
+import pytest
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from lxml import etree
+from PIL import Image
+
+from config import Config
+from tests.helpers import paragraph_summary
+from utils.document_processor import EnhancedWordProcessor
+from utils.parallel_rewriter import plan_key
+from utils.streaming_rewriter import CT_NS, PKG_REL_NS, RT_COMMENTS, StreamingDocxRewriter
+
+MODIFICATIONS = [
+    {'original_text': 'target', 'new_text': 'DONE', 'reason': 'edited'},
+    {'original_text': '目标', 'new_text': '完成', 'reason': '已修改'},
+]
+
+
+def build_sample(path):
+    """Document with a content control, a text box, an image, a nested table and a vertical merge
+    包含内容控件、文本框、图片、嵌套表格和纵向合并的文档"""
+    doc = Document()
+    doc.add_paragraph('plain target paragraph 目标')
+    image = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(image, 'PNG')
+    image.seek(0)
+    doc.add_paragraph('picture target ').add_run().add_picture(image)
+    body = doc.element.body
+    sect_pr = body[-1]
+
+    # 正文级内容控件 / Body-level content control
+    sect_pr.addprevious(parse_xml(
+        f'<w:sdt {nsdecls("w")}><w:sdtPr/><w:sdtContent>'
+        '<w:p><w:r><w:t>target inside content control</w:t></w:r></w:p>'
+        '</w:sdtContent></w:sdt>'
+    ))
+
+    # 段落中的VML文本框 / VML text box inside a paragraph
+    paragraph = doc.add_paragraph('outer target ')
+    paragraph._p.append(parse_xml(
+        f'<w:r {nsdecls("w")} xmlns:v="urn:schemas-microsoft-com:vml"><w:pict><v:shape><v:textbox><w:txbxContent>'
+        '<w:p><w:r><w:t>target in text box</w:t></w:r></w:p>'
+        '</w:txbxContent></v:textbox></v:shape></w:pict></w:r>'
+    ))
+
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = 'cell target'
+    table.cell(0, 1).merge(table.cell(1, 1))
+    table.cell(0, 1).text = 'merged target'
+    table.cell(1, 0).add_table(rows=1, cols=1).cell(0, 0).text = 'nested target'
+    doc.add_paragraph('目标 after table target')
+    doc.save(path)
+
+
+@pytest.fixture
+def sample_path(tmp_path):
+    path = tmp_path / 'sample.docx'
+    build_sample(path)
+    return str(path)
+
+
+def apply(sample_path, output_path, engine, monkeypatch):
+    monkeypatch.setattr(Config, 'STREAMING_REWRITE_THRESHOLD', 0 if engine == 'streaming' else 1 << 40)
+    monkeypatch.setattr(Config, 'PARALLEL_APPLY_WORKERS', 2 if engine == 'parallel' else 1)
+    monkeypatch.setattr(Config, 'PARALLEL_APPLY_MIN_BLOCKS', 1)
+    parallel_results = []
+    parallel_apply = EnhancedWordProcessor._parallel_apply
+
+    def record_parallel_apply(processor, modifications):
+        parallel_results.append(parallel_apply(processor, modifications))
+        return parallel_results[-1]
+
+    monkeypatch.setattr(EnhancedWordProcessor, '_parallel_apply', record_parallel_apply)
+    processor = EnhancedWordProcessor()
+    assert processor.load_document(sample_path)[0]
+    assert processor.apply_modifications(MODIFICATIONS)[0]
+    assert (processor._streamed_path is not None) == (engine == 'streaming')
+    # 并行引擎失败时会回退到串行，这里要求它确实生效 / The parallel engine falls back to serial on failure, require it ran
+    assert parallel_results == ([True] if engine == 'parallel' else [])
+    assert processor.save_modified_document(output_path)[0]
+    return processor
+
+
+@pytest.mark.parametrize('engine', ['streaming', 'parallel'])
+def test_engine_edits_same_paragraphs_as_object_model(engine, sample_path, tmp_path, monkeypatch, request_context):
+    serial = apply(sample_path, str(tmp_path / 'serial.docx'), 'serial', monkeypatch)
+    rewritten = apply(sample_path, str(tmp_path / f'{engine}.docx'), engine, monkeypatch)
+
+    expected = paragraph_summary(str(tmp_path / 'serial.docx'))
+    assert paragraph_summary(str(tmp_path / f'{engine}.docx')) == expected
+    assert rewritten.get_modified_blocks() == serial.get_modified_blocks()
+
+    original = serial.extract_content_with_formatting(serial.original_doc)
+    assert rewritten.build_modified_content(original) == serial.build_modified_content(original)
+    if engine == 'streaming':
+        # 刷新内容块不加载修改后的文档 / Refreshing the blocks does not load the modified document
+        assert rewritten._modified_doc is None
+
+    texts = [text for text, _, _ in expected]
+    # 内容控件、文本框和嵌套表格不属于修改范围 / Content controls, text boxes and nested tables are out of scope
+    assert 'target inside content control' in texts
+    assert 'target in text box' in texts
+    assert 'nested target' in texts
+    assert 'cell DONE' in texts and 'merged DONE' in texts
+
+
+def test_streaming_output_declares_namespaces_once(sample_path, tmp_path, request_context):
+    output = io.BytesIO()
+    StreamingDocxRewriter({('target', 'literal'): 'DONE'}, lambda key: 'r').rewrite(sample_path, output)
+    with zipfile.ZipFile(output) as package:
+        document_xml = package.read('word/document.xml')
+    assert document_xml.count(b'xmlns:w=') == 1
+    etree.fromstring(document_xml)
+
+
+def test_streaming_reuses_comments_relationship_without_part(sample_path, tmp_path):
+    broken = tmp_path / 'broken.docx'
+    with zipfile.ZipFile(sample_path) as zin, zipfile.ZipFile(broken, 'w') as zout:
+        for info in zin.infolist():
+            data = zin.read(info)
+            if info.filename == 'word/_rels/document.xml.rels':
+                root = etree.fromstring(data)
+                etree.SubElement(root, f'{{{PKG_REL_NS}}}Relationship',
+                                 {'Id': 'rId99', 'Type': RT_COMMENTS, 'Target': 'notes.xml'})
+                data = etree.tostring(root)
+            zout.writestr(info, data)
+
+    output = io.BytesIO()
+    stats = StreamingDocxRewriter({('target', 'literal'): 'DONE'}, lambda key: 'r').rewrite(str(broken), output)
+    assert stats['hits'] > 0
+    with zipfile.ZipFile(output) as package:
+        rels = etree.fromstring(package.read('word/_rels/document.xml.rels'))
+        comment_rels = [rel for rel in rels if rel.get('Type') == RT_COMMENTS]
+        assert [rel.get('Id') for rel in comment_rels] == ['rId99']
+        assert 'word/notes.xml' in package.namelist()
+        content_types = etree.fromstring(package.read('[Content_Types].xml'))
+        parts = [override.get('PartName') for override in content_types.iterchildren(f'{{{CT_NS}}}Override')]
+        assert parts.count('/word/notes.xml') == 1
+    # 修改后的文档仍可由python-docx打开 / The result still opens with python-docx
+    output.seek(0)
+    Document(output)
+
+
+def test_plan_key_identifies_modification_set():
+    key = plan_key({('a', 'literal'): 'b', ('c', 'regex'): 'd'})
+    assert key == plan_key({('c', 'regex'): 'd', ('a', 'literal'): 'b'})
+    assert key != plan_key({('a', 'literal'): 'b', ('c', 'literal'): 'd'})
+    assert key != plan_key({('a', 'literal'): 'b', ('c', 'regex'): 'e'})
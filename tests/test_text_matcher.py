@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Text matcher tests / 文本匹配器测试
+Aho-Corasick and mixed rule matching against a brute-force reference
+将Aho-Corasick匹配和混合规则匹配与暴力查找的参考结果进行对比
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import random
+
+import pytest
+
+from utils.text_matcher import (AhoCorasickMatcher, RuleMatcher, MATCH_CASE_INSENSITIVE, MATCH_LITERAL,
+                                MATCH_REGEX, MATCH_WHOLE_WORD, normalize_match_type)
+
+
+def brute_force(patterns, text):
+    """Leftmost, then longest, non-overlapping matches found by scanning every offset / 逐个偏移扫描得到的最左最长不重叠匹配"""
+    patterns = [p for p in patterns if p]
+    matches = []
+    position = 0
+    while position < len(text):
+        hits = [p for p in patterns if text.startswith(p, position)]
+        if hits:
+            pattern = max(hits, key=len)
+            matches.append((position, position + len(pattern), pattern))
+            position += len(pattern)
+        else:
+            position += 1
+    return matches
+
+
+def test_leftmost_match_wins_over_longer_later_match():
+    matcher = AhoCorasickMatcher(['bcd', 'ab'])
+    assert matcher.find_all('abcd') == [(0, 2, 'ab')]
+
+
+def test_longest_match_wins_at_same_start():
+    matcher = AhoCorasickMatcher(['he', 'hers', 'her'])
+    assert matcher.find_all('hers he') == [(0, 4, 'hers'), (5, 7, 'he')]
+
+
+def test_overlapping_keys_report_all_occurrences():
+    matcher = AhoCorasickMatcher(['aa', 'a', 'she', 'he', 'e'])
+    assert sorted(matcher.iter_all('aaa')) == [(0, 1, 'a'), (0, 2, 'aa'), (1, 2, 'a'), (1, 3, 'aa'), (2, 3, 'a')]
+    assert sorted(matcher.iter_all('she')) == [(0, 3, 'she'), (1, 3, 'he'), (2, 3, 'e')]
+    assert matcher.find_all('aaa') == [(0, 2, 'aa'), (2, 3, 'a')]
+
+
+def test_cjk_input():
+    matcher = AhoCorasickMatcher(['中国', '中国人', '国人民', '人民'])
+    assert matcher.find_all('我是中国人民的一员') == [(2, 5, '中国人')]
+    assert matcher.find_all('中国人民') == [(0, 3, '中国人')]
+    assert matcher.find_all('人民中国') == [(0, 2, '人民'), (2, 4, '中国')]
+
+
+def test_empty_and_duplicate_patterns_are_ignored():
+    matcher = AhoCorasickMatcher(['', 'x', 'x'])
+    assert len(matcher) == 1
+    assert matcher.find_all('') == []
+    assert not AhoCorasickMatcher([]).contains_any('anything')
+
+
+@pytest.mark.parametrize('alphabet', ['ab', 'abc', '中国人民'])
+def test_matches_brute_force(alphabet):
+    rng = random.Random(alphabet)
+    for _ in range(500):
+        patterns = [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 6))]
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        matcher = AhoCorasickMatcher(patterns)
+        assert matcher.find_all(text) == brute_force(set(patterns), text), (patterns, text)
+        assert matcher.contains_any(text) == any(p in text for p in patterns)
+
+
+def test_rule_matcher_mixes_literal_and_pattern_rules():
+    matcher = RuleMatcher([
+        ('cat', MATCH_WHOLE_WORD),
+        ('dog', MATCH_CASE_INSENSITIVE),
+        (r'\d+', MATCH_REGEX),
+        ('category', MATCH_LITERAL),
+    ])
+    text = 'category cat DOG 42'
+    assert matcher.find_all(text) == [
+        (0, 8, ('category', MATCH_LITERAL)),
+        (9, 12, ('cat', MATCH_WHOLE_WORD)),
+        (13, 16, ('dog', MATCH_CASE_INSENSITIVE)),
+        (17, 19, (r'\d+', MATCH_REGEX)),
+    ]
+
+
+def test_rule_matcher_resolves_overlaps_leftmost_longest():
+    matcher = RuleMatcher([('ab', MATCH_LITERAL), (r'a\w+', MATCH_REGEX), ('bcd', MATCH_LITERAL)])
+    assert matcher.find_all('abcd') == [(0, 4, (r'a\w+', MATCH_REGEX))]
+
+
+def test_rule_matcher_keeps_same_text_with_different_match_types():
+    matcher = RuleMatcher([('cat', MATCH_LITERAL), ('cat', MATCH_WHOLE_WORD), ('cat', MATCH_CASE_INSENSITIVE)])
+    assert len(matcher) == 3
+    assert ('cat', MATCH_WHOLE_WORD) in matcher
+    # 字面规则在平局时排在前面，其余规则仍各自命中 / Each rule still finds its own matches
+    assert matcher.find_all('CAT') == [(0, 3, ('cat', MATCH_CASE_INSENSITIVE))]
+    assert [key for _start, _end, key in matcher.find_all('cats cat')] == [('cat', MATCH_LITERAL)] * 2
+
+
+def test_rule_matcher_regex_replacement_expands_groups():
+    matcher = RuleMatcher([(r'(\d+)年', MATCH_REGEX)])
+    text = '2024年报告'
+    (start, end, key), = matcher.find_all(text)
+    assert matcher.replacement(key, r'\1 年', text, start) == '2024 年'
+    assert matcher.replacement(key, r'\9', text, start) == r'\9'
+
+
+def test_normalize_match_type():
+    assert normalize_match_type(None) == MATCH_LITERAL
+    assert normalize_match_type('Whole-Word') == MATCH_WHOLE_WORD
+    assert normalize_match_type('正则') == MATCH_REGEX
+    assert normalize_match_type('fuzzy') is None
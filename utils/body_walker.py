@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Body walker module / 正文遍历模块
+Walks the block-level children of w:body once in document order, so tables keep
+their real position, and summarizes the walked document in the same pass
+按文档顺序单次遍历w:body的块级子元素，表格保持其实际位置，并在同一次遍历中汇总文档信息
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from lxml import etree
+
+from utils.paragraph_rewriter import paragraph_text
+
+W_P = qn('w:p')
+W_TBL = qn('w:tbl')
+
+# 段落中图片引用的关系ID，直接在元素树上求值，不需要序列化XML
+# Relationship ids of images referenced by a paragraph, evaluated on the tree without serializing
+BLIP_EMBED_XPATH = etree.XPath(
+    './/a:blip/@r:embed',
+    namespaces={
+        'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+        'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    }
+)
+
+# 段落中直接run的字符样式ID / Character style ids of a paragraph's direct runs
+_RUN_STYLE_XPATH = etree.XPath(
+    './w:r/w:rPr/w:rStyle/@w:val',
+    namespaces={'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+)
+
+Block = Tuple[str, int]
+
+
+def walk_body(doc) -> Iterator[Tuple[str, int, Any]]:
+    """
+    Yield body paragraphs and tables in document order / 按文档顺序生成正文段落和表格
+
+    Indexes count paragraphs and tables separately, matching doc.paragraphs and doc.tables
+    索引分别对段落和表格计数，与doc.paragraphs和doc.tables一致
+
+    Args:
+        doc: python-docx Document / python-docx文档
+
+    Yields:
+        ('paragraph', index, Paragraph) or ('table', index, Table)
+    """
+    parent = doc._body
+    para_idx = 0
+    table_idx = 0
+    for child in doc.element.body.iterchildren(W_P, W_TBL):
+        if child.tag == W_P:
+            yield 'paragraph', para_idx, Paragraph(child, parent)
+            para_idx += 1
+        else:
+            yield 'table', table_idx, Table(child, parent)
+            table_idx += 1
+
+
+def block_paragraphs(kind: str, index: int, item) -> Iterator[Tuple[Paragraph, Block]]:
+    """
+    Paragraphs of one block that modifications apply to / 一个内容块中需要应用修改的段落
+
+    Merged cells are returned repeatedly by python-docx and are visited once
+    合并单元格会被python-docx重复返回，按元素去重只访问一次
+
+    Yields:
+        (Paragraph, (kind, index))
+    """
+    if kind == 'paragraph':
+        yield item, (kind, index)
+        return
+
+    seen_cells = set()
+    for row in item.rows:
+        for cell in row.cells:
+            if cell._tc in seen_cells:
+                continue
+            seen_cells.add(cell._tc)
+            for paragraph in cell.paragraphs:
+                yield paragraph, (kind, index)
+
+
+def element_paragraphs(kind: str, element) -> Iterator[Any]:
+    """
+    Target w:p elements of one body block given as a bare element / 以元素给出的一个正文内容块中的目标w:p元素
+
+    Same selection as block_paragraphs, for the engines that work outside a Document
+    (streaming, parallel). Tables must come from a parser using python-docx element classes
+    与block_paragraphs的选择相同，供不经过Document对象的引擎（流式、并行）使用。表格元素必须由使用python-docx元素类的解析器生成
+
+    Args:
+        kind: 'paragraph' or 'table' / 'paragraph'或'table'
+        element: w:p or w:tbl element / w:p或w:tbl元素
+
+    Yields:
+        w:p elements modifications apply to / 需要应用修改的w:p元素
+    """
+    item = Paragraph(element, None) if kind == 'paragraph' else Table(element, None)
+    for paragraph, _ in block_paragraphs(kind, 0, item):
+        yield paragraph._p
+
+
+class BodySummary:
+    """
+    Result of one body walk / 一次正文遍历的汇总结果
+    Target paragraphs with their text and block, counts, style ids and image references,
+    reused downstream instead of traversing the document again
+    目标段落及其文本和所属内容块、计数、样式ID和图片引用，供后续复用而不再重新遍历文档
+    """
+
+    def __init__(self):
+        self.paragraph_count = 0  # 正文段落数（与doc.paragraphs一致）
+        self.table_count = 0
+        self.elements: Optional[List[Any]] = []  # 按位置排列的目标段落元素，从状态恢复时为None
+        self.blocks: List[Block] = []  # 每个段落位置所属的内容块
+        self.texts: List[str] = []  # 每个段落位置的文本
+        self.image_references = 0
+        self._paragraph_style_ids = set()
+        self._character_style_ids = set()
+
+    def add_block(self, kind: str, index: int, item):
+        """Record one walked block / 记录一个遍历到的内容块"""
+        if kind == 'paragraph':
+            self.paragraph_count += 1
+        else:
+            self.table_count += 1
+
+        for paragraph, block in block_paragraphs(kind, index, item):
+            element = paragraph._p
+            self.elements.append(element)
+            self.blocks.append(block)
+            self.texts.append(paragraph_text(element))
+            self._paragraph_style_ids.add(element.style)
+            self._character_style_ids.update(_RUN_STYLE_XPATH(element))
+            self.image_references += len(BLIP_EMBED_XPATH(element))
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'BodySummary':
+        """
+        Restore a summary from export_state() / 由export_state()的结果恢复汇总
+
+        Elements are tree nodes and are not restored; they stay None until the document is walked
+        元素是文档树节点，不会恢复；在遍历文档之前保持为None
+        """
+        summary = cls()
+        summary.paragraph_count = state['paragraph_count']
+        summary.table_count = state['table_count']
+        summary.elements = None
+        summary.blocks = [tuple(block) for block in state['blocks']]
+        summary.texts = state['texts']
+        summary.image_references = state['image_references']
+        return summary
+
+    def export_state(self) -> Dict[str, Any]:
+        """
+        JSON-serializable summary without elements and style ids / 不含元素和样式ID的可JSON序列化汇总
+
+        Returns:
+            {'paragraph_count', 'table_count', 'blocks', 'texts', 'image_references'}
+        """
+        return {
+            'paragraph_count': self.paragraph_count,
+            'table_count': self.table_count,
+            'blocks': [list(block) for block in self.blocks],
+            'texts': self.texts,
+            'image_references': self.image_references
+        }
+
+    def styles(self, doc) -> Dict[str, Dict[str, str]]:
+        """
+        Resolve collected style ids to names once / 将收集到的样式ID一次性解析为名称
+
+        Returns:
+            style name -> {'type', 'name'} / 样式名到样式信息的映射
+        """
+        styles = {}
+        for style_type, style_ids, type_name in (
+            (WD_STYLE_TYPE.PARAGRAPH, self._paragraph_style_ids, 'paragraph'),
+            (WD_STYLE_TYPE.CHARACTER, self._character_style_ids, 'character'),
+        ):
+            for style_id in style_ids:
+                style = _lookup_style(doc, style_id, style_type)
+                if style is not None and style.name:
+                    styles[style.name] = {'type': type_name, 'name': style.name}
+        return styles
+
+
+def _lookup_style(doc, style_id: Optional[str], style_type):
+    """Style for an id, the default style when the id is missing or unknown / 按ID查找样式，缺失或未知时为默认样式"""
+    try:
+        return doc.part.get_style(style_id, style_type)
+    except Exception:
+        return None
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Word comments writer module / Word批注写入模块
+Keeps the comments.xml tree live for a whole apply pass and serializes it once
+在整个修改应用过程中保持comments.xml树常驻内存，只在保存时序列化一次
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import datetime
+import itertools
+from typing import Optional
+
+from lxml import etree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+# 新建批注部件的初始内容 / Initial content of a newly created comments part
+EMPTY_COMMENTS_XML = f"""<?xml version='1.0' encoding='UTF-8' standalone='yes'?>
+<w:comments xmlns:w="{W_NS}">
+</w:comments>""".encode('utf-8')
+
+
+class CommentsAccumulator:
+    """
+    Batched comments.xml writer / 批量comments.xml写入器
+    Comments are appended to a parsed tree and the part blob is rewritten only on flush
+    批注追加到已解析的树中，仅在flush时重写部件内容
+    """
+
+    def __init__(self, comments_part):
+        """
+        Initialize accumulator for a comments part / 为批注部件初始化累加器
+
+        Args:
+            comments_part: python-docx part holding word/comments.xml / 保存word/comments.xml的python-docx部件
+        """
+        self.part = comments_part
+
+        # XmlPart类型的部件自己维护元素树并在保存时序列化 / XmlPart keeps its own tree and serializes on save
+        self._live = getattr(comments_part, '_element', None) is not None
+        if self._live:
+            self.root = comments_part._element
+        else:
+            self.root = etree.fromstring(comments_part.blob)
+
+        self._dirty = False
+        self._ids = itertools.count(self._max_existing_id() + 1)
+        self._added = {}  # 本次添加的批注: id -> 元素
+
+    def _max_existing_id(self) -> int:
+        """Find the largest comment id already in the part / 查找部件中已有的最大批注ID"""
+        max_id = -1
+        for comment in self.root.iterchildren(f"{{{W_NS}}}comment"):
+            try:
+                max_id = max(max_id, int(comment.get(f"{{{W_NS}}}id")))
+            except (TypeError, ValueError):
+                continue
+        return max_id
+
+    def add(self, comment_text: str, author: str = "Document Editor") -> Optional[str]:
+        """
+        Append a comment and return its id / 追加批注并返回其ID
+
+        Args:
+            comment_text: Comment body / 批注内容
+            author: Comment author / 批注作者
+
+        Returns:
+            Allocated comment id / 分配的批注ID
+        """
+        comment_id = str(next(self._ids))
+
+        comment = etree.SubElement(self.root, f"{{{W_NS}}}comment")
+        comment.set(f"{{{W_NS}}}id", comment_id)
+        comment.set(f"{{{W_NS}}}author", author)
+        comment.set(f"{{{W_NS}}}date", datetime.datetime.now().isoformat())
+
+        para = etree.SubElement(comment, f"{{{W_NS}}}p")
+        run = etree.SubElement(para, f"{{{W_NS}}}r")
+        text = etree.SubElement(run, f"{{{W_NS}}}t")
+        text.text = comment_text
+
+        self._added[comment_id] = comment
+        self._dirty = True
+        return comment_id
+
+    def remove(self, comment_ids):
+        """
+        Remove comments added by this accumulator / 移除由本累加器添加的批注
+
+        Args:
+            comment_ids: Ids returned by add() / add()返回的批注ID
+        """
+        for comment_id in comment_ids:
+            comment = self._added.pop(comment_id, None)
+            if comment is not None:
+                self.root.remove(comment)
+                self._dirty = True
+
+    def flush(self):
+        """Serialize the tree back into the part once / 将元素树一次性序列化回部件"""
+        if self._live or not self._dirty:
+            return
+        self.part._blob = etree.tostring(self.root, encoding='utf-8', xml_declaration=True, standalone=True)
+        self._dirty = False
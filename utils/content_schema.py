@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Content schema module / 内容结构模块
+Versioned encodings of extracted content blocks. Schema 1 is the full form where
+every run repeats its formatting; schema 2 interns distinct run formats into a
+per-document table and encodes runs as [text, format_id] pairs
+提取内容块的版本化编码。结构1为完整形式，每个run重复携带格式；结构2将不同的run格式
+登记到每个文档的格式表中，run编码为[文本, 格式ID]
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+CONTENT_SCHEMA_FULL = 1
+CONTENT_SCHEMA_COMPACT = 2
+SUPPORTED_SCHEMAS = (CONTENT_SCHEMA_FULL, CONTENT_SCHEMA_COMPACT)
+
+
+def parse_schema(value: Any) -> int:
+    """
+    Parse a requested schema version / 解析请求的结构版本
+
+    Args:
+        value: Raw value such as '2' or 'compact' / 原始值，例如'2'或'compact'
+
+    Returns:
+        Supported schema version, full schema when missing or unknown / 支持的结构版本，缺失或未知时为完整结构
+    """
+    if isinstance(value, str) and value.strip().lower() == 'compact':
+        return CONTENT_SCHEMA_COMPACT
+    try:
+        version = int(value)
+    except (TypeError, ValueError):
+        return CONTENT_SCHEMA_FULL
+    return version if version in SUPPORTED_SCHEMAS else CONTENT_SCHEMA_FULL
+
+
+# 格式ID取格式内容摘要的前缀长度 / Length of the digest prefix used as format id
+FORMAT_ID_LENGTH = 12
+
+
+def format_id_for(fmt: Dict[str, Any]) -> str:
+    """
+    Content-derived id of a run format / 由内容得出的run格式ID
+
+    The same format gets the same id in every process, so windows served by
+    different workers share one client-side table
+    同一格式在任何进程中ID都相同，不同工作进程返回的窗口可以共用客户端的同一张表
+    """
+    canonical = json.dumps(fmt, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:FORMAT_ID_LENGTH]
+
+
+class FormatTable:
+    """
+    Per-document run format table / 每个文档的run格式表
+    Ids are stable for the lifetime of the document, so windows fetched at
+    different times can share one client-side table
+    ID在文档生命周期内保持不变，不同时间获取的窗口可以共用客户端的同一张表
+    """
+
+    def __init__(self):
+        self.formats: Dict[str, Dict[str, Any]] = {}
+        self._ids: Dict[Tuple, str] = {}
+
+    def intern(self, run: Dict[str, Any]) -> str:
+        """
+        Get the id of a run's format, registering it when new / 获取run格式的ID，新格式时登记
+
+        Args:
+            run: Full run dict / 完整的run字典
+
+        Returns:
+            Format id / 格式ID
+        """
+        fmt = {key: value for key, value in run.items() if key != 'text'}
+        key = tuple(sorted(fmt.items()))
+        format_id = self._ids.get(key)
+        if format_id is None:
+            # 相同格式总是得到相同ID，并发登记也不会冲突 / Same format, same id, so concurrent interning is safe
+            format_id = format_id_for(fmt)
+            self.formats[format_id] = fmt
+            self._ids[key] = format_id
+        return format_id
+
+    def encode_blocks(self, blocks: List[Dict[str, Any]],
+                      referenced: Optional[Set[str]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """
+        Encode blocks with compact runs / 将内容块编码为紧凑run形式
+
+        The stored full blocks are left untouched / 不修改存储的完整内容块
+
+        Args:
+            blocks: Full schema blocks / 完整结构的内容块
+            referenced: Optional set receiving the format ids used / 可选，接收用到的格式ID
+
+        Returns:
+            (encoded blocks, {format_id: format} for the formats they use)
+            (编码后的内容块, 用到的格式 {格式ID: 格式})
+        """
+        used = set() if referenced is None else referenced
+        encoded = [self.encode_block(block, used) for block in blocks]
+        return encoded, {format_id: self.formats[format_id] for format_id in sorted(used)}
+
+    def encode_block(self, block: Dict[str, Any], used: Set[str]) -> Dict[str, Any]:
+        """Encode one paragraph or table block / 编码一个段落或表格内容块"""
+        if block.get('type') == 'table':
+            encoded = dict(block)
+            encoded['rows'] = [
+                [self._encode_cell(cell, used) for cell in row]
+                for row in block.get('rows', [])
+            ]
+            return encoded
+        return self._encode_paragraph(block, used)
+
+    def _encode_cell(self, cell: Dict[str, Any], used: Set[str]) -> Dict[str, Any]:
+        encoded = dict(cell)
+        encoded['paragraphs'] = [self._encode_paragraph(para, used) for para in cell.get('paragraphs', [])]
+        return encoded
+
+    def _encode_paragraph(self, paragraph: Dict[str, Any], used: Set[str]) -> Dict[str, Any]:
+        encoded = dict(paragraph)
+        runs = []
+        for run in paragraph.get('runs', []):
+            format_id = self.intern(run)
+            used.add(format_id)
+            runs.append([run.get('text', ''), format_id])
+        encoded['runs'] = runs
+        return encoded
@@ -24,20 +24,33 @@ https://github.com/sawyer-shi
 
 import os
 import io
-import base64
+import hashlib
 import tempfile
 import zipfile
 import subprocess
 import shutil
-from typing import List, Dict, Any, Tuple, Optional
+import threading
+import weakref
+from copy import deepcopy
+from typing import List, Dict, Any, Iterator, Tuple, Optional
 from docx import Document
 from docx.shared import RGBColor, Inches, Pt
 from docx.enum.text import WD_COLOR_INDEX, WD_ALIGN_PARAGRAPH
 from docx.oxml.ns import nsdecls, qn
 from docx.oxml import parse_xml
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from lxml import etree
 import xml.etree.ElementTree as ET
 from PIL import Image
 from utils.i18n import get_text
+from utils.text_matcher import RuleKey, RuleMatcher, normalize_match_type, MATCH_LITERAL
+from utils.comments_writer import CommentsAccumulator, EMPTY_COMMENTS_XML
+from utils.paragraph_rewriter import ParagraphRewriter, iter_runs, paragraph_text, run_text
+from utils.text_index import NGramIndex
+from utils.streaming_rewriter import StreamingDocxRewriter
+from utils.parallel_rewriter import ParallelBodyRewriter
+from utils.body_walker import BodySummary, BLIP_EMBED_XPATH, block_paragraphs, walk_body
+from config import Config
 import docx2txt
 from datetime import datetime
 
@@ -52,20 +65,127 @@ try:
 except ImportError:
     WINDOWS_COM_AVAILABLE = False
 
+# 预览中显示的图片类型（TIFF、EMF、WMF通过缩略图接口转换为浏览器可显示的格式）
+IMAGE_MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.bmp': 'image/bmp',
+    '.webp': 'image/webp',
+    '.tif': 'image/tiff',
+    '.tiff': 'image/tiff',
+    '.emf': 'image/x-emf',
+    '.wmf': 'image/x-wmf',
+}
+
+# 提取结果格式版本，提取逻辑或输出格式变化时递增，使磁盘上的提取缓存失效
+EXTRACTOR_VERSION = 2
+
 class EnhancedWordProcessor:
     """增强的Word文档处理器"""
     
     def __init__(self):
-        self.original_doc = None
-        self.modified_doc = None
+        self._original_doc = None
+        self._original_source = None  # fork自尚未解析原始文档的处理器时，从其获取解析结果
+        self._original_parse_lock = threading.Lock()
+        self._modified_doc = None
+        self._streamed_path = None  # 流式引擎输出的docx文件路径
+        self._streamed_elements = {}  # 流式引擎保留的被修改内容块元素：('paragraph'|'table', 索引) -> 元素
         self.modifications = []
-        self.images = {}  # 存储文档中的图片
+        self.images = {}  # 存储文档中的图片：内容哈希 -> 图片信息（相同内容只存一份）
+        self._media_hashes = {}  # 媒体部件名 -> 内容哈希
+        self._image_rel_indexes = weakref.WeakKeyDictionary()  # 部件 -> {图片关系ID: 内容哈希}
         self.tables = []  # 存储表格数据
         self.styles = {}  # 存储样式信息
         self.modification_reasons = {}  # 存储修改原因映射
+        self._original_bytes = None  # 缓存原始文档字节，用于内存克隆
+        self._comments = None  # 当前修改文档的批注累加器
+        self.lock = threading.RLock()  # 同一文档的修改请求串行执行
+        self._body_summary = None  # 原始文档正文单次遍历的汇总：段落元素、文本、内容块、计数、样式
+        self._text_index = None  # 原始文档的N元组倒排索引
+        self._engine_modified_blocks = None  # 流式/并行引擎记录的被修改内容块
+        self._reset_dependency_index()
+    
+    @property
+    def original_doc(self):
+        """原始文档；从提取缓存加载时只在首次访问时才由缓存的字节解析"""
+        if self._original_doc is None:
+            if self._original_source is not None:
+                self._original_doc = self._original_source.original_doc
+            elif self._original_bytes is not None:
+                with self._original_parse_lock:
+                    if self._original_doc is None:
+                        self._original_doc = Document(io.BytesIO(self._original_bytes))
+        return self._original_doc
+    
+    @original_doc.setter
+    def original_doc(self, value):
+        self._original_doc = value
+        self._original_source = None
+    
+    @property
+    def has_original(self) -> bool:
+        """是否已加载原始文档（不触发解析）"""
+        return self._original_doc is not None or self._original_bytes is not None or self._original_source is not None
+    
+    @property
+    def original_parsed(self) -> bool:
+        """原始文档是否已解析为python-docx对象（不触发解析）"""
+        if self._original_doc is not None:
+            return True
+        return self._original_source is not None and self._original_source.original_parsed
+    
+    @property
+    def modified_doc(self):
+        """修改后的文档；流式引擎的结果只在首次访问时才加载为python-docx对象"""
+        if self._modified_doc is None and self._streamed_path:
+            self._modified_doc = Document(self._streamed_path)
+        return self._modified_doc
+    
+    @modified_doc.setter
+    def modified_doc(self, value):
+        self._modified_doc = value
+        self._discard_streamed_output()
     
-    def load_document(self, file_path: str) -> Tuple[bool, str]:
-        """加载文档，支持.docx和.txt格式"""
+    def _discard_streamed_output(self):
+        """删除上一次流式引擎的输出文件"""
+        if self._streamed_path:
+            try:
+                os.remove(self._streamed_path)
+            except OSError:
+                pass
+            self._streamed_path = None
+            self._streamed_elements = {}
+    
+    def fork(self) -> 'EnhancedWordProcessor':
+        """创建共享原始文档解析结果的新处理器
+        
+        原始文档、图片、样式、正文汇总和文本索引只读共享，修改状态（修改文档、修改条目、批注、锁）各自独立
+        """
+        # 共享前完成惰性构建，避免多个处理器并发构建同一份汇总
+        self.get_text_index()
+        
+        processor = EnhancedWordProcessor()
+        processor._original_doc = self._original_doc
+        if self._original_doc is None:
+            # 原始文档尚未解析时，由共享的源处理器解析一次
+            processor._original_source = self._original_source or self
+        processor._original_bytes = self._original_bytes
+        processor.images = self.images
+        processor._media_hashes = self._media_hashes
+        processor.tables = self.tables
+        processor.styles = self.styles
+        processor._body_summary = self._body_summary
+        processor._text_index = self._text_index
+        return processor
+    
+    def load_document(self, file_path: str, extraction: Optional[Dict[str, Any]] = None) -> Tuple[bool, str]:
+        """加载文档，支持.docx和.txt格式
+        
+        extraction为export_extraction()保存的提取结果时，直接恢复样式、图片索引、正文汇总和文本索引，
+        不解析也不遍历文档XML，原始文档在首次访问时才解析
+        """
         try:
             # 检查文件格式
             file_ext = os.path.splitext(file_path)[1].lower()
@@ -81,15 +201,26 @@ class EnhancedWordProcessor:
                 if not processed_file_path:
                     return False, f"{get_text('upload_failed')}: 无法处理.txt文件"
             
+            # 读取一次文档字节并缓存，后续克隆直接在内存中进行
+            with open(processed_file_path, 'rb') as f:
+                self._original_bytes = f.read()
+            
+            if extraction is not None:
+                self.original_doc = None
+                self._restore_extraction(extraction)
+                return True, get_text('upload_success')
+            
             # 加载文档
-            self.original_doc = Document(processed_file_path)
+            self.original_doc = Document(io.BytesIO(self._original_bytes))
+            self._body_summary = None
+            self._text_index = None
+            self.styles = {}
             
             # 提取文档中的图片（仅对docx格式）
             if file_ext in ['.docx', '.txt']:  # txt转换后也是docx格式
-                self._extract_images(processed_file_path)
+                self._extract_images(io.BytesIO(self._original_bytes))
             
-            # 提取样式信息
-            self._extract_styles()
+            # 样式信息在遍历正文时收集
             
             return True, get_text('upload_success')
             
@@ -97,34 +228,16 @@ class EnhancedWordProcessor:
             return False, f"{get_text('upload_failed')}: {str(e)}"
     
     def _add_comment_to_run(self, run, comment_text: str, author: str = "Document Editor"):
-        """为文本运行添加真正的Word批注"""
+        """为文本运行添加真正的Word批注，成功时返回批注ID"""
         try:
-            # 生成唯一的批注ID
-            import time
-            comment_id = str(int(time.time() * 1000000) % 1000000)
-            
-            # 获取文档对象和批注部分
-            doc = self.modified_doc
-            if not hasattr(doc, '_part'):
-                print("文档对象无效，无法添加批注")
-                return False
-            
-            # 确保文档有批注部分
-            comments_part = self._ensure_comments_part(doc)
-            if not comments_part:
+            # 获取批注累加器（整个应用过程共用一棵批注树）
+            comments = self._get_comments_accumulator()
+            if comments is None:
                 print("无法创建或获取批注部分")
                 return False
             
-            # 创建批注内容
-            comment_element = self._create_comment_element(comment_id, comment_text, author)
-            if not comment_element:
-                print("无法创建批注元素")
-                return False
-            
-            # 将批注添加到批注部分
-            if not self._add_comment_to_comments_part(comments_part, comment_element):
-                print("无法将批注添加到批注部分")
-                return False
+            # 将批注添加到批注部分，ID由单调计数器分配
+            comment_id = comments.add(comment_text, author)
             
             # 在文本中添加批注引用
             if not self._add_comment_reference_to_run(run, comment_id):
@@ -132,7 +245,7 @@ class EnhancedWordProcessor:
                 return False
             
             print(f"成功添加Word批注: {comment_text}")
-            return True
+            return comment_id
             
         except Exception as e:
             print(f"添加Word批注失败: {str(e)}")
@@ -140,6 +253,28 @@ class EnhancedWordProcessor:
             traceback.print_exc()
             return False
     
+    def _get_comments_accumulator(self) -> Optional[CommentsAccumulator]:
+        """获取当前修改文档的批注累加器，首次使用时创建"""
+        if self._comments is None:
+            doc = self.modified_doc
+            if not hasattr(doc, '_part'):
+                print("文档对象无效，无法添加批注")
+                return None
+            
+            # 确保文档有批注部分
+            comments_part = self._ensure_comments_part(doc)
+            if not comments_part:
+                return None
+            
+            self._comments = CommentsAccumulator(comments_part)
+        
+        return self._comments
+    
+    def _flush_comments(self):
+        """将累积的批注一次性写回comments.xml"""
+        if self._comments is not None:
+            self._comments.flush()
+    
     def _ensure_comments_part(self, doc):
         """确保文档有批注部分"""
         try:
@@ -156,15 +291,12 @@ class EnhancedWordProcessor:
             
             # 创建新的批注部分
             comments_part_uri = PackURI('/word/comments.xml')
-            comments_content = '''<?xml version='1.0' encoding='UTF-8' standalone='yes'?>
-<w:comments xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">
-</w:comments>'''
             
             # 创建批注部分对象
             comments_part = Part(
                 comments_part_uri,
                 'application/vnd.openxmlformats-officedocument.wordprocessingml.comments+xml',
-                comments_content.encode('utf-8'),
+                EMPTY_COMMENTS_XML,
                 doc._part.package
             )
             
@@ -177,57 +309,6 @@ class EnhancedWordProcessor:
             print(f"创建批注部分失败: {str(e)}")
             return None
     
-    def _create_comment_element(self, comment_id: str, comment_text: str, author: str):
-        """创建批注XML元素"""
-        try:
-            from lxml import etree
-            import datetime
-            
-            # 创建批注元素
-            w_ns = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
-            comment = etree.Element(f"{{{w_ns}}}comment")
-            comment.set(f"{{{w_ns}}}id", comment_id)
-            comment.set(f"{{{w_ns}}}author", author)
-            comment.set(f"{{{w_ns}}}date", datetime.datetime.now().isoformat())
-            
-            # 创建段落
-            para = etree.SubElement(comment, f"{{{w_ns}}}p")
-            
-            # 创建run
-            run = etree.SubElement(para, f"{{{w_ns}}}r")
-            
-            # 创建文本
-            text = etree.SubElement(run, f"{{{w_ns}}}t")
-            text.text = comment_text
-            
-            return comment
-            
-        except Exception as e:
-            print(f"创建批注元素失败: {str(e)}")
-            return None
-    
-    def _add_comment_to_comments_part(self, comments_part, comment_element):
-        """将批注添加到批注部分"""
-        try:
-            from lxml import etree
-            
-            # 解析批注部分的XML
-            comments_xml = comments_part.blob
-            comments_root = etree.fromstring(comments_xml)
-            
-            # 添加批注元素
-            comments_root.append(comment_element)
-            
-            # 更新批注部分内容
-            updated_xml = etree.tostring(comments_root, encoding='utf-8', xml_declaration=True)
-            comments_part._blob = updated_xml
-            
-            return True
-            
-        except Exception as e:
-            print(f"添加批注到批注部分失败: {str(e)}")
-            return False
-    
     def _add_comment_reference_to_run(self, run, comment_id: str):
         """在文本运行中添加批注引用"""
         try:
@@ -269,9 +350,11 @@ class EnhancedWordProcessor:
     
 
     
-    def _get_modification_reason(self, original_text: str) -> str:
-        """获取修改原因"""
-        reason = self.modification_reasons.get(original_text, "")
+    def _get_modification_reason(self, key) -> str:
+        """获取修改原因；key为(原文, 匹配方式)规则键，标准方法传入的原文按字面匹配规则查找"""
+        if isinstance(key, str):
+            key = (key, MATCH_LITERAL)
+        reason = self.modification_reasons.get(key, "")
         if not reason.strip():
             return "未注明修改原因"
         return reason.strip()
@@ -1093,8 +1176,11 @@ class EnhancedWordProcessor:
             print(f"创建DOCX文档失败: {str(e)}")
             return None
     
-    def _extract_images(self, docx_path: str):
-        """提取文档中的图片"""
+    def _extract_images(self, docx_path):
+        """提取文档中的图片，按内容哈希只存储一份（docx_path可以是文件路径或类文件对象）"""
+        self.images = {}
+        self._media_hashes = {}
+        self._image_rel_indexes = weakref.WeakKeyDictionary()
         try:
             with zipfile.ZipFile(docx_path, 'r') as docx_zip:
                 # 查找media文件夹中的图片
@@ -1102,25 +1188,24 @@ class EnhancedWordProcessor:
                 
                 for media_file in media_files:
                     try:
-                        # 读取图片数据
-                        img_data = docx_zip.read(media_file)
-                        
-                        # 转换为base64编码
-                        img_base64 = base64.b64encode(img_data).decode('utf-8')
-                        
                         # 确定图片类型
                         img_ext = os.path.splitext(media_file)[1].lower()
-                        if img_ext in ['.png', '.jpg', '.jpeg', '.gif', '.bmp']:
-                            mime_type = f"image/{img_ext[1:]}"
-                            if img_ext == '.jpg':
-                                mime_type = "image/jpeg"
-                            
-                            # 存储图片信息
-                            filename = os.path.basename(media_file)
-                            self.images[filename] = {
-                                'data': img_base64,
+                        mime_type = IMAGE_MIME_TYPES.get(img_ext)
+                        if not mime_type:
+                            continue
+                        
+                        # 读取图片数据，以内容哈希作为地址
+                        img_data = docx_zip.read(media_file)
+                        image_hash = hashlib.sha256(img_data).hexdigest()
+                        self._media_hashes['/' + media_file] = image_hash
+                        
+                        # 相同内容的图片只存储一份
+                        if image_hash not in self.images:
+                            self.images[image_hash] = {
+                                'data': img_data,
                                 'mime_type': mime_type,
-                                'filename': filename
+                                'filename': os.path.basename(media_file),
+                                'hash': image_hash
                             }
                     except Exception as e:
                         print(f"提取图片失败 {media_file}: {str(e)}")
@@ -1128,130 +1213,250 @@ class EnhancedWordProcessor:
         except Exception as e:
             print(f"提取图片时出错: {str(e)}")
     
-    def _extract_styles(self):
-        """提取文档样式信息"""
-        try:
-            if not self.original_doc:
-                return
-            
-            # 提取段落样式
-            for paragraph in self.original_doc.paragraphs:
-                if paragraph.style:
-                    style_name = paragraph.style.name
-                    self.styles[style_name] = {
-                        'type': 'paragraph',
-                        'name': style_name
+    def export_extraction(self, content: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """导出可JSON序列化的提取结果：内容块、样式表、图片索引、正文汇总和文本索引，供提取缓存保存
+        
+        正文汇总只在完整遍历后保存，遍历未完成（内容不完整）时返回None
+        """
+        summary = self._body_summary
+        if summary is None:
+            return None
+        return {
+            'content': content,
+            'styles': self.styles,
+            'images': [
+                {
+                    'part': part_name,
+                    'hash': image_hash,
+                    'mime_type': self.images[image_hash]['mime_type'],
+                    'filename': self.images[image_hash]['filename']
+                }
+                for part_name, image_hash in self._media_hashes.items() if image_hash in self.images
+            ],
+            'summary': summary.export_state(),
+            'text_index': self.get_text_index().export_state()
+        }
+    
+    def _restore_extraction(self, extraction: Dict[str, Any]):
+        """由提取结果恢复样式表、图片、正文汇总和文本索引；图片数据按索引从压缩包读取，不重新计算哈希"""
+        self.styles = dict(extraction['styles'])
+        self.images = {}
+        self._media_hashes = {}
+        self._image_rel_indexes = weakref.WeakKeyDictionary()
+        with zipfile.ZipFile(io.BytesIO(self._original_bytes), 'r') as docx_zip:
+            for image in extraction['images']:
+                image_hash = image['hash']
+                self._media_hashes[image['part']] = image_hash
+                if image_hash not in self.images:
+                    self.images[image_hash] = {
+                        'data': docx_zip.read(image['part'].lstrip('/')),
+                        'mime_type': image['mime_type'],
+                        'filename': image['filename'],
+                        'hash': image_hash
                     }
-            
-            # 提取字符样式
-            for paragraph in self.original_doc.paragraphs:
-                for run in paragraph.runs:
-                    if run.style:
-                        style_name = run.style.name
-                        self.styles[style_name] = {
-                            'type': 'character',
-                            'name': style_name
-                        }
-                        
+        self._body_summary = BodySummary.from_state(extraction['summary'])
+        self._text_index = NGramIndex.from_state(self._body_summary.texts, extraction['text_index'])
+    
+    def _get_body_summary(self) -> BodySummary:
+        """原始文档正文的遍历汇总；提取内容时已顺带生成，否则单独遍历一次"""
+        if self._body_summary is None:
+            summary = BodySummary()
+            for kind, index, item in walk_body(self.original_doc):
+                summary.add_block(kind, index, item)
+            self._set_body_summary(summary)
+        return self._body_summary
+    
+    def _set_body_summary(self, summary: BodySummary):
+        """保存遍历汇总，并一次性解析收集到的样式"""
+        self._body_summary = summary
+        try:
+            self.styles.update(summary.styles(self.original_doc))
         except Exception as e:
             print(f"提取样式时出错: {str(e)}")
     
     def extract_content_with_formatting(self, doc: Document) -> List[Dict[str, Any]]:
         """提取文档内容，保持复杂格式，实现Word编辑器样式"""
-        content = []
+        return list(self.iter_content_with_formatting(doc))
+    
+    def iter_content_with_formatting(self, doc: Document) -> Iterator[Dict[str, Any]]:
+        """按文档顺序逐个生成内容块（表格保持实际位置），流式响应可以边遍历文档边发送
         
+        遍历原始文档时在同一次遍历中生成正文汇总，后续的索引、搜索和文档信息直接复用
+        """
+        summary = BodySummary() if doc is self.original_doc and self._body_summary is None else None
         try:
-            # 处理段落
-            for para_idx, paragraph in enumerate(doc.paragraphs):
-                if paragraph.text.strip() or self._has_images(paragraph):
-                    para_data = {
-                        'type': 'paragraph',
-                        'index': para_idx,
-                        'text': paragraph.text,
-                        'style': paragraph.style.name if paragraph.style else 'Normal',
-                        'alignment': self._get_alignment_style(paragraph.alignment),
-                        'paragraph_format': self._get_paragraph_format(paragraph),
-                        'runs': [],
-                        'images': []
-                    }
-                    
-                    # 处理段落中的runs（保持字体格式）
-                    for run in paragraph.runs:
-                        run_data = {
-                            'text': run.text,
-                            'bold': run.bold,
-                            'italic': run.italic,
-                            'underline': run.underline,
-                            'font_name': run.font.name or 'Times New Roman',
-                            'font_size': run.font.size.pt if run.font.size else 12,
-                            'font_color': self._get_font_color(run),
-                            'highlight_color': self._get_highlight_color(run),
-                            'subscript': run.font.subscript,
-                            'superscript': run.font.superscript,
-                        }
-                        para_data['runs'].append(run_data)
-                    
-                    # 检查段落中的图片
-                    images = self._extract_paragraph_images(paragraph)
-                    if images:
-                        para_data['images'] = images
-                    
-                    content.append(para_data)
-            
-            # 处理表格
-            for table_idx, table in enumerate(doc.tables):
-                table_data = {
-                    'type': 'table',
-                    'index': table_idx,
-                    'rows': [],
-                    'style': table.style.name if table.style else 'Table Grid',
-                    'table_format': self._get_table_format(table)
+            for kind, index, item in walk_body(doc):
+                if summary is not None:
+                    summary.add_block(kind, index, item)
+                
+                if kind == 'paragraph':
+                    para_data = self._extract_paragraph_block(item, index)
+                    if para_data:
+                        yield para_data
+                else:
+                    yield self._extract_table_block(item, index)
+            
+            # 只保存完整遍历的汇总
+            if summary is not None:
+                self._set_body_summary(summary)
+                
+        except Exception as e:
+            print(f"提取文档内容时出错: {str(e)}")
+    
+    def refresh_content_blocks(self, content: List[Dict[str, Any]], blocks: List[Tuple[str, int]]) -> Tuple[Optional[List[Dict[str, Any]]], Optional[List[Dict[str, Any]]]]:
+        """重新提取修改文档中指定的内容块并就地更新content
+        
+        返回 (更新后的content, 变化的内容块列表)；如果内容块出现或消失（结构变化），返回 (None, None)
+        """
+        if not blocks:
+            return content, []
+        
+        try:
+            positions = {(item.get('type'), item.get('index')): pos for pos, item in enumerate(content)}
+            if self._modified_doc is None and self._streamed_path:
+                # 流式结果不加载修改文档，直接使用流式引擎保留的被修改内容块元素
+                items = self._streamed_block_items()
+            else:
+                items = {'paragraph': self.modified_doc.paragraphs, 'table': self.modified_doc.tables}
+            
+            changed = []
+            for block_type, index in blocks:
+                if block_type == 'paragraph':
+                    block = self._extract_paragraph_block(items['paragraph'][index], index)
+                else:
+                    block = self._extract_table_block(items['table'][index], index)
+                
+                position = positions.get((block_type, index))
+                if position is None or block is None:
+                    return None, None
+                changed.append({'type': block_type, 'index': index, 'position': position, 'block': block})
+            
+            for change in changed:
+                content[positions[(change['type'], change['index'])]] = change['block']
+            return content, changed
+            
+        except Exception as e:
+            print(f"更新内容块时出错: {str(e)}")
+            return None, None
+    
+    def _streamed_block_items(self) -> Dict[str, Dict[int, Any]]:
+        """将流式引擎保留的被修改内容块元素包装为python-docx段落和表格，按类型和索引查找
+        
+        流式改写只新增批注关系，样式和图片关系与原始文档相同，因此以原始文档正文作为父对象
+        """
+        from docx.table import Table
+        from docx.text.paragraph import Paragraph
+        
+        body = self.original_doc._body
+        items = {'paragraph': {}, 'table': {}}
+        for (block_type, index), element in self._streamed_elements.items():
+            items[block_type][index] = Paragraph(element, body) if block_type == 'paragraph' else Table(element, body)
+        return items
+    
+    @staticmethod
+    def _paragraph_runs(paragraph) -> List[Any]:
+        """段落中参与匹配的run（包括超链接中的run），与段落文本一一对应"""
+        from docx.text.run import Run
+        
+        return [Run(run, paragraph) for run in iter_runs(paragraph._p)]
+    
+    def _extract_paragraph_block(self, paragraph, para_idx: int) -> Optional[Dict[str, Any]]:
+        """提取单个正文段落的内容块，空段落返回None"""
+        # 与匹配和文本索引使用相同的文本（包含超链接），保证返回的偏移与显示一致
+        text = paragraph_text(paragraph._p)
+        embed_ids = self._paragraph_embed_ids(paragraph)
+        if not (text.strip() or embed_ids):
+            return None
+        
+        para_data = {
+            'type': 'paragraph',
+            'index': para_idx,
+            'text': text,
+            'style': paragraph.style.name if paragraph.style else 'Normal',
+            'alignment': self._get_alignment_style(paragraph.alignment),
+            'paragraph_format': self._get_paragraph_format(paragraph),
+            'runs': [],
+            'images': []
+        }
+        
+        # 处理段落中的runs（保持字体格式）
+        for run in self._paragraph_runs(paragraph):
+            run_data = {
+                'text': run_text(run._r),
+                'bold': run.bold,
+                'italic': run.italic,
+                'underline': run.underline,
+                'font_name': run.font.name or 'Times New Roman',
+                'font_size': run.font.size.pt if run.font.size else 12,
+                'font_color': self._get_font_color(run),
+                'highlight_color': self._get_highlight_color(run),
+                'subscript': run.font.subscript,
+                'superscript': run.font.superscript,
+            }
+            para_data['runs'].append(run_data)
+        
+        # 段落实际引用的图片
+        images = self._extract_paragraph_images(paragraph, embed_ids)
+        if images:
+            para_data['images'] = images
+        
+        return para_data
+    
+    def _extract_table_block(self, table, table_idx: int) -> Dict[str, Any]:
+        """提取单个表格的内容块"""
+        table_data = {
+            'type': 'table',
+            'index': table_idx,
+            'rows': [],
+            'style': table.style.name if table.style else 'Table Grid',
+            'table_format': self._get_table_format(table)
+        }
+        
+        for row_idx, row in enumerate(table.rows):
+            row_data = []
+            for cell_idx, cell in enumerate(row.cells):
+                cell_data = {
+                    'text': '\n'.join(paragraph_text(para._p) for para in cell.paragraphs),
+                    'paragraphs': [],
+                    'cell_format': self._get_cell_format(cell)
                 }
                 
-                for row_idx, row in enumerate(table.rows):
-                    row_data = []
-                    for cell_idx, cell in enumerate(row.cells):
-                        cell_data = {
-                            'text': cell.text,
-                            'paragraphs': [],
-                            'cell_format': self._get_cell_format(cell)
+                # 处理单元格中的段落
+                for para in cell.paragraphs:
+                    para_text = paragraph_text(para._p)
+                    embed_ids = self._paragraph_embed_ids(para)
+                    if para_text.strip() or embed_ids:
+                        para_data = {
+                            'text': para_text,
+                            'style': para.style.name if para.style else 'Normal',
+                            'alignment': self._get_alignment_style(para.alignment),
+                            'runs': []
                         }
                         
-                        # 处理单元格中的段落
-                        for para in cell.paragraphs:
-                            if para.text.strip() or self._has_images(para):
-                                para_data = {
-                                    'text': para.text,
-                                    'style': para.style.name if para.style else 'Normal',
-                                    'alignment': self._get_alignment_style(para.alignment),
-                                    'runs': []
-                                }
-                                
-                                for run in para.runs:
-                                    run_data = {
-                                        'text': run.text,
-                                        'bold': run.bold,
-                                        'italic': run.italic,
-                                        'underline': run.underline,
-                                        'font_name': run.font.name or 'Times New Roman',
-                                        'font_size': run.font.size.pt if run.font.size else 12,
-                                        'font_color': self._get_font_color(run),
-                                        'highlight_color': self._get_highlight_color(run),
-                                    }
-                                    para_data['runs'].append(run_data)
-                                
-                                cell_data['paragraphs'].append(para_data)
+                        for run in self._paragraph_runs(para):
+                            run_data = {
+                                'text': run_text(run._r),
+                                'bold': run.bold,
+                                'italic': run.italic,
+                                'underline': run.underline,
+                                'font_name': run.font.name or 'Times New Roman',
+                                'font_size': run.font.size.pt if run.font.size else 12,
+                                'font_color': self._get_font_color(run),
+                                'highlight_color': self._get_highlight_color(run),
+                            }
+                            para_data['runs'].append(run_data)
                         
-                        row_data.append(cell_data)
-                    
-                    table_data['rows'].append(row_data)
-                
-                content.append(table_data)
+                        images = self._extract_paragraph_images(para, embed_ids)
+                        if images:
+                            para_data['images'] = images
+                        
+                        cell_data['paragraphs'].append(para_data)
                 
-        except Exception as e:
-            print(f"提取文档内容时出错: {str(e)}")
+                row_data.append(cell_data)
+            
+            table_data['rows'].append(row_data)
         
-        return content
+        return table_data
     
     def _get_alignment_style(self, alignment) -> str:
         """获取段落对齐方式的CSS样式"""
@@ -1345,39 +1550,59 @@ class EnhancedWordProcessor:
         
         return format_info
     
+    def _paragraph_embed_ids(self, paragraph) -> List[str]:
+        """段落中图片引用的关系ID（按出现顺序）"""
+        return BLIP_EMBED_XPATH(paragraph._element)
+    
     def _has_images(self, paragraph) -> bool:
         """检查段落是否包含图片"""
-        try:
-            # 简化的图片检测方法
-            paragraph_xml = paragraph._element.xml
-            return 'blip' in paragraph_xml or 'pic:pic' in paragraph_xml
-        except Exception as e:
-            print(f"检查图片时出错: {str(e)}")
-            return False
+        return bool(self._paragraph_embed_ids(paragraph))
     
-    def _extract_paragraph_images(self, paragraph) -> List[Dict[str, Any]]:
-        """提取段落中的图片"""
+    def _get_image_rel_index(self, part) -> Dict[str, str]:
+        """部件的图片关系索引：关系ID -> 内容哈希，每个部件只根据part.rels构建一次"""
+        index = self._image_rel_indexes.get(part)
+        if index is None:
+            index = {}
+            for r_id, rel in part.rels.items():
+                if rel.is_external or rel.reltype != RT.IMAGE:
+                    continue
+                image_hash = self._media_hashes.get(str(rel.target_part.partname))
+                if image_hash in self.images:
+                    index[r_id] = image_hash
+            self._image_rel_indexes[part] = index
+        return index
+    
+    def _extract_paragraph_images(self, paragraph, embed_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """提取段落实际引用的图片，只返回按内容哈希的引用，图片数据通过图片接口单独获取"""
         images = []
         try:
-            # 如果段落包含图片，返回所有可用的图片
-            if self._has_images(paragraph):
-                # 简化处理：返回文档中的所有图片
-                for filename, img_data in self.images.items():
-                    images.append({
-                        'filename': filename,
-                        'data': img_data['data'],
-                        'mime_type': img_data['mime_type'],
-                        'embed_id': f'img_{len(images)}'
-                    })
-                    # 限制每个段落最多显示3张图片，避免重复
-                    if len(images) >= 3:
-                        break
+            if embed_ids is None:
+                embed_ids = self._paragraph_embed_ids(paragraph)
+            if not embed_ids:
+                return images
+            
+            index = self._get_image_rel_index(paragraph.part)
+            for embed_id in embed_ids:
+                image_hash = index.get(embed_id)
+                if image_hash is None:
+                    continue
+                image = self.images[image_hash]
+                images.append({
+                    'hash': image_hash,
+                    'filename': image['filename'],
+                    'mime_type': image['mime_type'],
+                    'embed_id': embed_id
+                })
                         
         except Exception as e:
             print(f"提取段落图片时出错: {str(e)}")
         
         return images
     
+    def get_image(self, image_hash: str) -> Optional[Dict[str, Any]]:
+        """按内容哈希获取图片"""
+        return self.images.get(image_hash)
+    
     def _get_font_color(self, run) -> Optional[str]:
         """获取字体颜色"""
         try:
@@ -1395,23 +1620,31 @@ class EnhancedWordProcessor:
                 return False, get_text('file_not_found')
             
             # 构建修改原因映射
-            self.modification_reasons = {}
-            for mod in modifications:
-                original_text = mod.get('original_text', '')
-                reason = mod.get('reason', '')
-                if original_text:
-                    self.modification_reasons[original_text] = reason
+            self.modification_reasons = self._compile_reasons(modifications)
             
             from utils.i18n import get_text
             print(get_text('document_applying_modifications'))
             
+            # 新的修改文档需要新的批注累加器
+            self._comments = None
+            self._engine_modified_blocks = None
+            
+            # 超大文档使用流式引擎，不构建修改文档的python-docx对象模型
+            success = self._should_stream() and self._streaming_apply(modifications)
+            
+            # 块数很多的文档在进程池中分片并行应用
+            if not success and self._should_parallelize():
+                success = self._parallel_apply(modifications)
+            
             # 方法1：尝试使用高级复制方法（完整保持所有内容）
-            success = self._advanced_copy_with_modifications(modifications)
+            if not success:
+                success = self._advanced_copy_with_modifications(modifications)
             
             if not success:
                 print(get_text('doc_extraction_failed'))
                 # 方法2：使用标准方法
                 self.modified_doc = Document()
+                self._reset_dependency_index()
                 self._copy_styles()
                 self._copy_and_modify_content(modifications)
             
@@ -1425,132 +1658,410 @@ class EnhancedWordProcessor:
             traceback.print_exc()
             return False, f"{get_text('processing_failed')}: {str(e)}"
     
+    def _should_stream(self) -> bool:
+        """word/document.xml超过配置阈值时使用流式引擎"""
+        if self._original_bytes is None:
+            return False
+        try:
+            with zipfile.ZipFile(io.BytesIO(self._original_bytes)) as package:
+                size = package.getinfo('word/document.xml').file_size
+        except (KeyError, zipfile.BadZipFile):
+            return False
+        return size >= Config.STREAMING_REWRITE_THRESHOLD
+    
+    def _streaming_apply(self, modifications: List[Dict[str, str]]) -> bool:
+        """流式改写document.xml并直接写入输出docx，不保留完整元素树"""
+        fd, output_path = tempfile.mkstemp(prefix='streamed_', suffix='.docx')
+        os.close(fd)
+        try:
+            modification_map = self._compile_modifications(modifications)
+            
+            rewriter = StreamingDocxRewriter(modification_map, self._get_modification_reason)
+            stats = rewriter.rewrite(io.BytesIO(self._original_bytes), output_path)
+            
+            # 流式结果没有段落依赖索引，后续更新走完整应用
+            self.modified_doc = None
+            self._reset_dependency_index()
+            self._streamed_path = output_path
+            self._streamed_elements = stats['elements']
+            self._engine_modified_blocks = stats['blocks']
+            
+            print(f"{get_text('text_modification_complete')} - 流式引擎 段落: {stats['paragraphs']}, 替换: {stats['hits']}")
+            return True
+            
+        except Exception as e:
+            print(f"流式改写失败: {str(e)}")
+            try:
+                os.remove(output_path)
+            except OSError:
+                pass
+            return False
+    
+    def _should_parallelize(self) -> bool:
+        """正文块级元素数量达到配置阈值且允许多个工作进程时并行应用"""
+        if Config.PARALLEL_APPLY_WORKERS <= 1:
+            return False
+        return len(self.original_doc.element.body) >= Config.PARALLEL_APPLY_MIN_BLOCKS
+    
+    def _parallel_apply(self, modifications: List[Dict[str, str]]) -> bool:
+        """将正文分片交给进程池应用修改，按文档顺序拼接并确定性地合并批注"""
+        try:
+            modification_map = self._compile_modifications(modifications)
+            
+            self.modified_doc = self._clone_original_document()
+            self._comments = None
+            # 分片结果没有段落依赖索引，后续更新走完整应用
+            self._reset_dependency_index()
+            
+            comments = self._get_comments_accumulator()
+            if comments is None:
+                return False
+            
+            rewriter = ParallelBodyRewriter(modification_map, self._get_modification_reason,
+                                            Config.PARALLEL_APPLY_WORKERS)
+            stats = rewriter.rewrite(self.modified_doc.element.body, comments)
+            self._engine_modified_blocks = stats['blocks']
+            
+            print(f"{get_text('text_modification_complete')} - 并行引擎 分片: {stats['chunks']}, 段落: {stats['paragraphs']}, 替换: {stats['hits']}")
+            return True
+            
+        except Exception as e:
+            print(f"并行改写失败: {str(e)}")
+            self._comments = None
+            return False
+    
+    @staticmethod
+    def _rule_key(mod: Dict[str, str]) -> RuleKey:
+        """修改条目的规则键 (原文, 匹配方式)，未注明匹配方式时按字面匹配；原文相同但匹配方式不同的条目互不覆盖"""
+        return mod['original_text'], normalize_match_type(mod.get('match_type')) or MATCH_LITERAL
+    
+    @classmethod
+    def _compile_modifications(cls, modifications: List[Dict[str, str]]) -> Dict[RuleKey, str]:
+        """构建 规则键->新文本 映射"""
+        return {cls._rule_key(mod): mod['new_text'] for mod in modifications}
+    
+    @classmethod
+    def _compile_reasons(cls, modifications: List[Dict[str, str]]) -> Dict[RuleKey, str]:
+        """构建 规则键->修改原因 映射"""
+        return {cls._rule_key(mod): mod.get('reason', '') for mod in modifications if mod.get('original_text')}
+    
+    def _candidate_positions(self, matcher: RuleMatcher, keys) -> set:
+        """通过文本索引定位候选段落；正则和忽略大小写规则无法索引，需要检查全部段落"""
+        indexable = set(matcher.indexable_keys)
+        keys = [key for key in keys if key in matcher]
+        if any(key not in indexable for key in keys):
+            return set(range(len(self._get_original_texts())))
+        return self.get_text_index().candidates_for_any([pattern for pattern, _match_type in keys])
+    
     def _advanced_copy_with_modifications(self, modifications: List[Dict[str, str]]) -> bool:
         """高级文档复制方法，完全保持所有内容"""
         try:
-            from docx import Document
-            import tempfile
-            import os
-            from copy import deepcopy
-            
             # 创建修改映射
-            modification_map = {}
-            for mod in modifications:
-                modification_map[mod['original_text']] = mod['new_text']
+            modification_map = self._compile_modifications(modifications)
             
-            # 保存原文档到临时文件
-            temp_path = os.path.join(tempfile.gettempdir(), f"temp_original_{id(self)}.docx")
-            self.original_doc.save(temp_path)
-            
-            # 重新加载文档以创建完整副本
-            self.modified_doc = Document(temp_path)
+            # 在内存中创建完整副本（不经过临时文件）
+            self.modified_doc = self._clone_original_document()
+            self._comments = None
+            self._reset_dependency_index()
             
             from utils.i18n import get_text
             print(get_text('document_copy_created'))
             
+            # 编译规则匹配器：字面规则共用一个自动机，其余规则各编译一次（每个修改集合只构建一次）
+            matcher = RuleMatcher(modification_map)
+            
             # 在副本上应用文本修改
             modified_paragraphs = 0
             modified_tables = 0
             
-            # 修改段落中的文本
-            for paragraph in self.modified_doc.paragraphs:
-                for original_text, new_text in modification_map.items():
-                    if original_text in paragraph.text:
-                        # 查找并替换文本，保持格式
-                        self._replace_text_in_paragraph(paragraph, original_text, new_text)
-                        modified_paragraphs += 1
-            
-            # 修改表格中的文本
-            for table in self.modified_doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        for paragraph in cell.paragraphs:
-                            for original_text, new_text in modification_map.items():
-                                if original_text in paragraph.text:
-                                    self._replace_text_in_paragraph(paragraph, original_text, new_text)
-                                    modified_tables += 1
+            targets = list(self._iter_target_paragraphs(self.modified_doc))
+            self._target_elements = [paragraph._p for paragraph, _block in targets]
+            self._target_blocks = [block for _paragraph, block in targets]
             
-            print(f"{get_text('text_modification_complete')} - {get_text('paragraph_replacement')}: {modified_paragraphs}, {get_text('table_replacement')}: {modified_tables}")
+            # 通过文本索引直接定位候选段落，跳过不可能命中的段落
+            candidates = self._candidate_positions(matcher, modification_map.keys())
             
-            # 清理临时文件
-            try:
-                os.remove(temp_path)
-            except:
-                pass
+            for position in sorted(candidates):
+                paragraph, block = targets[position]
+                matched_count = len(self._rewrite_paragraph(position, paragraph, matcher, modification_map))
+                if block[0] == 'table':
+                    modified_tables += matched_count
+                else:
+                    modified_paragraphs += matched_count
+            
+            self._modification_map = modification_map
+            
+            print(f"{get_text('text_modification_complete')} - {get_text('paragraph_replacement')}: {modified_paragraphs}, {get_text('table_replacement')}: {modified_tables}")
             
             return True
             
         except Exception as e:
             print(f"高级复制方法失败: {str(e)}")
+            self._reset_dependency_index()
             return False
     
-    def _replace_text_in_paragraph(self, paragraph, original_text: str, new_text: str):
-        """在段落中替换文本，保持格式并添加批注"""
+    def update_modifications(self, modifications: List[Dict[str, str]]) -> Tuple[bool, str, Optional[List[Tuple[str, int]]]]:
+        """增量更新修改：只重新处理新增、编辑或删除的修改条目所涉及的段落
+        
+        返回 (是否成功, 消息, 变化的内容块列表)；内容块为 ('paragraph'|'table', 索引)，
+        无法增量处理时回退为完整应用，此时内容块列表为None
+        """
+        if self._target_elements is None or self.modified_doc is None:
+            success, message = self.apply_modifications(modifications)
+            return success, message, None
+        
         try:
-            # 检查段落是否包含目标文本
-            if original_text not in paragraph.text:
-                return
-            
-            # 获取修改原因
-            reason = self._get_modification_reason(original_text)
-            
-            # 遍历段落中的所有runs
-            for run in paragraph.runs:
-                if original_text in run.text:
-                    # 替换文本内容
-                    run.text = run.text.replace(original_text, new_text)
-                    
-                    # 添加高亮标记（如果是修改后的文本）
-                    try:
-                        from docx.enum.text import WD_COLOR_INDEX
-                        run.font.highlight_color = WD_COLOR_INDEX.YELLOW
-                    except:
-                        pass
-                    
-                    # 添加批注
-                    self._add_comment_to_run(run, reason)
-                    
-                    from utils.i18n import get_text
-                    print(f"{get_text('paragraph_replacement')}: '{original_text}' -> '{new_text}' (批注: {reason})")
-                    return
-            
-            # 如果单个run中没有完整的文本，可能文本跨越多个runs
-            full_text = paragraph.text
-            if original_text in full_text:
-                new_full_text = full_text.replace(original_text, new_text)
+            from docx.text.paragraph import Paragraph
+            
+            new_map = self._compile_modifications(modifications)
+            new_reasons = self._compile_reasons(modifications)
+            
+            # 找出新增、删除或内容/原因有变化的修改条目（匹配方式属于规则键，变化时视为删除加新增）
+            old_map = self._modification_map
+            old_reasons = self.modification_reasons
+            changed_keys = {
+                key for key in set(old_map) | set(new_map)
+                if old_map.get(key) != new_map.get(key) or old_reasons.get(key, '') != new_reasons.get(key, '')
+            }
+            self.modification_reasons = new_reasons
+            
+            # 依赖索引给出旧条目涉及的段落，新条目在原文中查找候选段落
+            affected = set()
+            for key in changed_keys:
+                affected.update(self._modification_paragraphs.get(key, ()))
+            
+            matcher = RuleMatcher(new_map)
+            added_keys = [key for key in changed_keys if key in new_map]
+            if added_keys:
+                affected.update(self._candidate_positions(matcher, added_keys))
+
+            original_elements = self._get_original_elements()
+            body = self.modified_doc._body
+            
+            for position in sorted(affected):
+                self._restore_paragraph(position, original_elements[position])
+                paragraph = Paragraph(self._target_elements[position], body)
+                self._rewrite_paragraph(position, paragraph, matcher, new_map)
+            
+            self._modification_map = new_map
+            self.modifications = modifications
+            
+            changed_blocks = []
+            for position in sorted(affected):
+                block = self._target_blocks[position]
+                if block not in changed_blocks:
+                    changed_blocks.append(block)
+            
+            print(f"增量更新修改: 变化条目 {len(changed_keys)}, 重新处理段落 {len(affected)}")
+            return True, get_text('modifications_applied'), changed_blocks
+            
+        except Exception as e:
+            print(f"增量更新修改失败，改为完整应用: {str(e)}")
+            success, message = self.apply_modifications(modifications)
+            return success, message, None
+    
+    def get_modified_blocks(self) -> Optional[List[Tuple[str, int]]]:
+        """修改文档中与原始文档不同的内容块 ('paragraph'|'table', 索引)，按文档顺序排列
+        
+        高级复制方法由依赖索引得出（增量更新后仍然准确），流式和并行引擎使用改写时记录的结果；
+        标准方法无法确定改动位置，返回None
+        """
+        if self._target_elements is not None:
+            blocks = []
+            for position in sorted(self._paragraph_dependencies):
+                block = self._target_blocks[position]
+                if not blocks or blocks[-1] != block:
+                    blocks.append(block)
+            return blocks
+        return self._engine_modified_blocks
+    
+    def build_modified_content(self, content: List[Dict[str, Any]]) -> Tuple[Optional[List[Dict[str, Any]]], Optional[List[Dict[str, Any]]]]:
+        """以原始文档的内容为基础，只重新提取被修改的内容块，不再提取整个修改文档
+        
+        返回 (修改后的content, 变化的内容块列表)；无法确定改动位置或结构变化时返回 (None, None)
+        """
+        blocks = self.get_modified_blocks()
+        if blocks is None:
+            return None, None
+        return self.refresh_content_blocks(list(content), blocks)
+    
+    def _reset_dependency_index(self):
+        """重置段落与修改条目之间的依赖索引"""
+        self._modification_map = {}
+        self._target_elements = None  # 修改文档中按位置排列的段落元素
+        self._target_blocks = []  # 每个段落位置所属的内容块 ('paragraph'|'table', 索引)
+        self._paragraph_dependencies = {}  # 段落位置 -> 命中的规则键集合
+        self._modification_paragraphs = {}  # 规则键 -> 段落位置集合
+        self._paragraph_comment_ids = {}  # 段落位置 -> 该段落中添加的批注ID
+    
+    def _get_original_elements(self) -> List[Any]:
+        """原始文档中按位置排列的段落元素（与修改文档一一对应）"""
+        summary = self._get_body_summary()
+        if summary.elements is None:
+            # 从提取缓存恢复的汇总不含元素，首次需要时遍历一次原始文档
+            summary.elements = [
+                paragraph._p
+                for kind, index, item in walk_body(self.original_doc)
+                for paragraph, block in block_paragraphs(kind, index, item)
+            ]
+        return summary.elements
+    
+    def _get_original_texts(self) -> List[str]:
+        """原始文档中按位置排列的段落文本"""
+        return self._get_body_summary().texts
+    
+    def get_text_index(self) -> NGramIndex:
+        """获取原始文档的N元组倒排索引，首次调用时构建"""
+        if self._text_index is None:
+            self._text_index = NGramIndex(self._get_original_texts())
+        return self._text_index
+    
+    def search_text(self, query: str, limit: int = 100, context: int = 30) -> List[Dict[str, Any]]:
+        """在原始文档中查找文本，返回命中的内容块、偏移和上下文"""
+        index = self.get_text_index()
+        results = []
+        for position, offset in index.find(query, limit):
+            text = index.texts[position]
+            block_type, block_index = self._get_body_summary().blocks[position]
+            results.append({
+                'type': block_type,
+                'index': block_index,
+                'position': position,
+                'offset': offset,
+                'context': text[max(0, offset - context):offset + len(query) + context]
+            })
+        return results
+    
+    def match_report(self, modifications: List[Dict[str, str]], limit: int = 20, context: int = 30) -> Dict[str, Any]:
+        """只运行匹配阶段：统计每个修改条目在原始文档中的命中，不创建修改文档
+        
+        命中按与应用修改相同的规则（最左最长、不重叠）计算；每个条目最多返回limit个位置
+        """
+        modification_map = self._compile_modifications(modifications)
+        matcher = RuleMatcher(modification_map)
+        texts = self._get_original_texts()
+        
+        rules = {}
+        for key in modification_map:
+            rules[key] = {
+                'original_text': key[0],
+                'new_text': modification_map[key],
+                'match_type': key[1],
+                'hit_count': 0,
+                'locations': []
+            }
+        
+        for position in sorted(self._candidate_positions(matcher, modification_map.keys())):
+            text = texts[position]
+            for start, end, key in matcher.find_all(text):
+                rule = rules[key]
+                rule['hit_count'] += 1
+                if len(rule['locations']) < limit:
+                    block_type, block_index = self._get_body_summary().blocks[position]
+                    rule['locations'].append({
+                        'type': block_type,
+                        'index': block_index,
+                        'position': position,
+                        'offset': start,
+                        'matched_text': text[start:end],
+                        'replacement': matcher.replacement(key, modification_map[key], text, start),
+                        'context': text[max(0, start - context):end + context]
+                    })
+        
+        results = list(rules.values())
+        return {
+            'modification_count': len(results),
+            'matched_count': sum(1 for rule in results if rule['hit_count']),
+            'total_hits': sum(rule['hit_count'] for rule in results),
+            'results': results,
+            'unmatched': [rule['original_text'] for rule in results if not rule['hit_count']]
+        }
+    
+    def _rewrite_paragraph(self, position: int, paragraph, matcher: RuleMatcher, modification_map) -> set:
+        """在一个段落上应用所有命中，并记录依赖索引"""
+        # 每个段落只建立一次偏移映射，一次遍历找到所有命中
+        rewriter = ParagraphRewriter(paragraph._p)
+        hits = matcher.find_all(rewriter.text)
+        if not hits:
+            return set()
+        
+        # 一次性应用该段落的所有命中，只改动重叠的run
+        comment_ids = self._apply_hits_to_paragraph(paragraph, rewriter, hits, matcher, modification_map)
+        
+        matched = {key for _start, _end, key in hits}
+        self._paragraph_dependencies[position] = matched
+        for key in matched:
+            self._modification_paragraphs.setdefault(key, set()).add(position)
+        if comment_ids:
+            self._paragraph_comment_ids[position] = comment_ids
+        
+        return matched
+    
+    def _restore_paragraph(self, position: int, original_element):
+        """用原始段落替换修改文档中的段落，并移除其旧批注和依赖记录"""
+        old_element = self._target_elements[position]
+        new_element = deepcopy(original_element)
+        old_element.getparent().replace(old_element, new_element)
+        self._target_elements[position] = new_element
+        
+        for key in self._paragraph_dependencies.pop(position, ()):
+            self._modification_paragraphs.get(key, set()).discard(position)
+        
+        comment_ids = self._paragraph_comment_ids.pop(position, None)
+        if comment_ids and self._comments is not None:
+            self._comments.remove(comment_ids)
+    
+    def _clone_original_document(self) -> Document:
+        """在内存中克隆原始文档，避免保存到临时文件再重新加载"""
+        if self._original_bytes is None:
+            # 原始文档不是通过load_document加载的，序列化到内存一次并缓存
+            buffer = io.BytesIO()
+            self.original_doc.save(buffer)
+            self._original_bytes = buffer.getvalue()
+        
+        return Document(io.BytesIO(self._original_bytes))
+    
+    def _iter_target_paragraphs(self, doc):
+        """按文档顺序遍历需要应用修改的段落（正文段落和表格单元格段落按实际位置交错）
+        
+        同时给出段落所属的内容块 ('paragraph'|'table', 索引)
+        """
+        for kind, index, item in walk_body(doc):
+            yield from block_paragraphs(kind, index, item)
+
+    def _apply_hits_to_paragraph(self, paragraph, rewriter: ParagraphRewriter, hits, matcher: RuleMatcher, modification_map):
+        """在段落中应用所有命中（从右向左），保持格式并添加高亮和批注，返回添加的批注ID"""
+        from docx.text.run import Run
+        from utils.i18n import get_text
+        
+        comment_ids = []
+        for start, end, key in reversed(hits):
+            try:
+                # 正则规则的替换模板可以引用分组
+                new_text = matcher.replacement(key, modification_map[key], rewriter.text, start)
+                run_element = rewriter.replace(start, end, new_text)
+                if run_element is None:
+                    continue
                 
-                # 清除现有runs的文本
-                for run in paragraph.runs:
-                    run.text = ""
+                # 只高亮替换后的文本
+                run = Run(run_element, paragraph)
+                try:
+                    run.font.highlight_color = WD_COLOR_INDEX.YELLOW
+                except:
+                    pass
                 
-                # 在第一个run中设置新文本
-                if paragraph.runs:
-                    paragraph.runs[0].text = new_full_text
-                    try:
-                        from docx.enum.text import WD_COLOR_INDEX
-                        paragraph.runs[0].font.highlight_color = WD_COLOR_INDEX.YELLOW
-                    except:
-                        pass
-                    
-                    # 添加批注
-                    self._add_comment_to_run(paragraph.runs[0], reason)
-                else:
-                    # 如果没有runs，创建一个新的
-                    new_run = paragraph.add_run(new_full_text)
-                    try:
-                        from docx.enum.text import WD_COLOR_INDEX
-                        new_run.font.highlight_color = WD_COLOR_INDEX.YELLOW
-                    except:
-                        pass
-                    
-                    # 添加批注
-                    self._add_comment_to_run(new_run, reason)
+                # 添加批注
+                reason = self._get_modification_reason(key)
+                comment_id = self._add_comment_to_run(run, reason)
+                if comment_id:
+                    comment_ids.append(comment_id)
                 
-                from utils.i18n import get_text
-                print(f"{get_text('text_replacement')}: '{original_text}' -> '{new_text}' (批注: {reason})")
-                    
-        except Exception as e:
-            print(f"替换段落文本时出错: {str(e)}")
+                print(f"{get_text('text_replacement')}: '{key[0]}' -> '{new_text}' (批注: {reason})")
+                
+            except Exception as e:
+                print(f"替换段落文本时出错: {str(e)}")
+        
+        return comment_ids
     
     def _copy_styles(self):
         """复制原文档的样式到新文档"""
@@ -1897,9 +2408,16 @@ class EnhancedWordProcessor:
     def save_modified_document(self, output_path: str) -> Tuple[bool, str]:
         """保存修改后的文档"""
         try:
+            if self._modified_doc is None and self._streamed_path:
+                # 流式引擎的输出已是完整的docx包，直接复制
+                shutil.copyfile(self._streamed_path, output_path)
+                return True, get_text('download_started')
+            
             if not self.modified_doc:
                 return False, get_text('no_document')
             
+            # 批注树只在保存时序列化一次
+            self._flush_comments()
             self.modified_doc.save(output_path)
             return True, get_text('download_started')
             
@@ -1908,13 +2426,15 @@ class EnhancedWordProcessor:
     
     def get_document_info(self) -> Dict[str, Any]:
         """获取文档信息"""
-        if not self.original_doc:
+        if not self.has_original:
             return {}
         
+        summary = self._get_body_summary()
         return {
-            'paragraph_count': len(self.original_doc.paragraphs),
-            'table_count': len(self.original_doc.tables),
+            'paragraph_count': summary.paragraph_count,
+            'table_count': summary.table_count,
             'image_count': len(self.images),
+            'image_reference_count': summary.image_references,
             'style_count': len(self.styles),
             'modifications_count': len(self.modifications)
         }
@@ -1922,12 +2442,14 @@ class EnhancedWordProcessor:
     def cleanup_temp_files(self):
         """清理临时文件"""
         try:
-            # 清理图片缓存
-            self.images.clear()
+            # 清理图片缓存（重新绑定而不是清空，fork出的处理器可能共享这些数据）
+            self.images = {}
             
             # 清理其他临时数据
-            self.tables.clear()
-            self.styles.clear()
+            self.tables = []
+            self.styles = {}
+            self._original_bytes = None
+            self._discard_streamed_output()
             
         except Exception as e:
             print(f"清理临时文件时出错: {str(e)}") 
\ No newline at end of file
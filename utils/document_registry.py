@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Document registry module / 文档登记模块
+Shared registry of document metadata, file paths, modification sets, processing
+state and upload blob reference counts in a local SQLite file (WAL mode), so every
+worker process on the host can serve every doc_id. Parsed documents stay in each
+worker's own DocumentStore
+在本地SQLite文件（WAL模式）中共享文档元数据、文件路径、修改条目集合、处理状态和上传文件的引用计数，
+主机上的任一工作进程都可以处理任一doc_id。解析后的文档保留在各工作进程自己的DocumentStore中
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    info TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS modification_sets (
+    doc_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    path TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    refs INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class DocumentRegistry:
+    """
+    SQLite-backed document registry / 基于SQLite的文档登记表
+    Each thread uses its own connection; every change bumps the document's version
+    so other workers know their parsed copy is stale
+    每个线程使用自己的连接；每次修改都会增加文档版本号，其他工作进程据此得知其解析副本已过期
+    """
+
+    def __init__(self, path: str):
+        """
+        Set up the registry / 设置登记表
+        The file is opened or created on first use, so importing a module that holds a
+        registry (e.g. in a spawned worker process) does not touch it
+        文件在首次使用时才打开或创建，导入持有登记表的模块（例如在spawn的工作进程中）不会访问该文件
+
+        Args:
+            path: SQLite file path / SQLite文件路径
+        """
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connection of the current thread / 当前线程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            # WAL允许读写并发，多个工作进程读取时不互相阻塞 / WAL lets readers and a writer run concurrently
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def load(self, doc_id: str) -> Optional[Tuple[Dict[str, Any], int]]:
+        """
+        Load a document's metadata / 加载文档元数据
+
+        Returns:
+            (info, version), None if unknown / (元数据, 版本号)，不存在时为None
+        """
+        row = self._connect().execute(
+            'SELECT info, version FROM documents WHERE doc_id = ?', (doc_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def version(self, doc_id: str) -> Optional[int]:
+        """Current version of a document, None if unknown / 文档的当前版本号，不存在时为None"""
+        row = self._connect().execute('SELECT version FROM documents WHERE doc_id = ?', (doc_id,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, doc_id: str, info: Dict[str, Any]) -> int:
+        """
+        Insert or update a document's metadata / 插入或更新文档元数据
+
+        Returns:
+            New version / 新的版本号
+        """
+        data = json.dumps(info, ensure_ascii=False, default=str)
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            updated = conn.execute(
+                'UPDATE documents SET info = ?, version = version + 1, updated_at = ?, accessed_at = ? WHERE doc_id = ?',
+                (data, now, now, doc_id)
+            ).rowcount
+            if not updated:
+                conn.execute(
+                    'INSERT INTO documents (doc_id, info, version, updated_at, accessed_at) VALUES (?, ?, 1, ?, ?)',
+                    (doc_id, data, now, now)
+                )
+            version = conn.execute('SELECT version FROM documents WHERE doc_id = ?', (doc_id,)).fetchone()[0]
+            conn.execute('COMMIT')
+            return version
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def touch(self, doc_id: str):
+        """Record an access without changing the version / 记录一次访问，不改变版本号"""
+        self._connect().execute('UPDATE documents SET accessed_at = ? WHERE doc_id = ?', (time.time(), doc_id))
+
+    def delete(self, doc_id: str) -> bool:
+        """
+        Remove a document and its modification set / 删除文档及其修改条目集合
+
+        Returns:
+            True if this call removed the document / 本次调用删除了该文档时返回True
+        """
+        conn = self._connect()
+        deleted = conn.execute('DELETE FROM documents WHERE doc_id = ?', (doc_id,)).rowcount
+        conn.execute('DELETE FROM modification_sets WHERE doc_id = ?', (doc_id,))
+        return deleted > 0
+
+    def ids(self) -> List[str]:
+        """All registered document ids / 所有已登记的文档ID"""
+        return [row[0] for row in self._connect().execute('SELECT doc_id FROM documents')]
+
+    def expired(self, cutoff: float, limit: int) -> List[str]:
+        """
+        Documents not accessed since cutoff, least recently accessed first / 自cutoff以来未被访问的文档，最久未访问的在前
+
+        Args:
+            cutoff: Unix timestamp / Unix时间戳
+            limit: Maximum number of ids / 最多返回的ID数量
+        """
+        rows = self._connect().execute(
+            'SELECT doc_id FROM documents WHERE accessed_at < ? ORDER BY accessed_at LIMIT ?', (cutoff, limit)
+        )
+        return [row[0] for row in rows]
+
+    def clear(self, release: Callable[[Dict[str, Any]], None]) -> int:
+        """
+        Remove every document one by one / 逐个删除所有文档
+        Upload reference counts are only dropped through release for the documents this call
+        removed, so blobs still referenced by documents registered meanwhile stay intact
+        只通过release释放本次调用删除的文档的上传文件引用，期间新登记的文档仍引用的文件不受影响
+
+        Args:
+            release: Releases the files of a removed document's info / 释放已删除文档的文件
+
+        Returns:
+            Number of documents this call removed / 本次调用删除的文档数量
+        """
+        cleared = 0
+        for doc_id in self.ids():
+            loaded = self.load(doc_id)
+            # 其他调用方已删除的文档由其释放文件 / Documents removed by another caller are released there
+            if loaded is None or not self.delete(doc_id):
+                continue
+            release(loaded[0])
+            cleared += 1
+        return cleared
+
+    def get_modification_set(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Stored modification set of a document / 文档保存的修改条目集合"""
+        row = self._connect().execute('SELECT data FROM modification_sets WHERE doc_id = ?', (doc_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_modification_set(self, doc_id: str, data: Dict[str, Any]):
+        """Store the modification set of a document / 保存文档的修改条目集合"""
+        self._connect().execute(
+            'INSERT OR REPLACE INTO modification_sets (doc_id, data, updated_at) VALUES (?, ?, ?)',
+            (doc_id, json.dumps(data, ensure_ascii=False, default=str), time.time())
+        )
+
+    def delete_modification_set(self, doc_id: str):
+        """Remove the modification set of a document / 删除文档的修改条目集合"""
+        self._connect().execute('DELETE FROM modification_sets WHERE doc_id = ?', (doc_id,))
+
+    def acquire_blob(self, path: str, content_hash: str, place: Callable[[], None]) -> int:
+        """
+        Add a reference to a stored upload / 增加已存储上传文件的引用
+
+        Args:
+            path: Blob file path / 文件路径
+            content_hash: SHA-256 of the content / 内容的SHA-256
+            place: Puts the file at path; runs inside the write transaction so a concurrent
+                   release cannot remove the file in between
+                   将文件放到path；在写事务内执行，并发的释放不会在期间删除该文件
+
+        Returns:
+            Reference count after adding / 增加后的引用计数
+        """
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            place()
+            now = time.time()
+            updated = conn.execute(
+                'UPDATE blobs SET refs = refs + 1, updated_at = ? WHERE path = ?', (now, path)
+            ).rowcount
+            if not updated:
+                conn.execute(
+                    'INSERT INTO blobs (path, content_hash, refs, updated_at) VALUES (?, ?, 1, ?)',
+                    (path, content_hash, now)
+                )
+            refs = conn.execute('SELECT refs FROM blobs WHERE path = ?', (path,)).fetchone()[0]
+            conn.execute('COMMIT')
+            return refs
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def release_blob(self, path: str, remove: Callable[[], None]) -> int:
+        """
+        Drop a reference to a stored upload, removing it with the last one / 释放已存储上传文件的引用，最后一个引用释放时删除文件
+
+        Args:
+            path: Blob file path / 文件路径
+            remove: Deletes the file, called inside the write transaction / 删除文件，在写事务内调用
+
+        Returns:
+            Remaining reference count / 剩余的引用计数
+        """
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT refs FROM blobs WHERE path = ?', (path,)).fetchone()
+            refs = row[0] - 1 if row else 0
+            if refs > 0:
+                conn.execute('UPDATE blobs SET refs = ?, updated_at = ? WHERE path = ?', (refs, time.time(), path))
+            else:
+                conn.execute('DELETE FROM blobs WHERE path = ?', (path,))
+                remove()
+            conn.execute('COMMIT')
+            return refs
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def blob_hashes(self) -> List[str]:
+        """Content hashes of all referenced uploads / 所有被引用的上传文件的内容哈希"""
+        return [row[0] for row in self._connect().execute('SELECT DISTINCT content_hash FROM blobs')]
+
+
+class ModificationSets:
+    """
+    Dict-like view of the registry's modification sets / 登记表中修改条目集合的类字典视图
+    Replaces the process-local modification_items dict / 替代进程内的modification_items字典
+    """
+
+    def __init__(self, registry: DocumentRegistry):
+        self.registry = registry
+
+    def __contains__(self, doc_id: object) -> bool:
+        return isinstance(doc_id, str) and self.registry.get_modification_set(doc_id) is not None
+
+    def __getitem__(self, doc_id: str) -> Dict[str, Any]:
+        data = self.registry.get_modification_set(doc_id)
+        if data is None:
+            raise KeyError(doc_id)
+        return data
+
+    def __setitem__(self, doc_id: str, data: Dict[str, Any]):
+        self.registry.set_modification_set(doc_id, data)
+
+    def __delitem__(self, doc_id: str):
+        self.registry.delete_modification_set(doc_id)
+
+    def get(self, doc_id: str, default=None):
+        data = self.registry.get_modification_set(doc_id)
+        return default if data is None else data
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.registry.ids())
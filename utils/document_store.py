@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Document store module / 文档存储模块
+Per-worker cache of uploaded documents on top of the shared DocumentRegistry, with
+per-entry size accounting. When the loaded documents exceed the memory budget, the
+least recently used ones release their parsed state (processor, extracted content,
+cached payloads) and keep only their metadata; the next access rehydrates them from
+the upload file. Documents changed by another worker are rehydrated the same way
+基于共享DocumentRegistry的每个工作进程的文档缓存，按条目统计内存占用。已加载文档超出内存预算时，
+最近最少使用的文档释放解析状态（处理器、提取内容、缓存响应），只保留元数据；下次访问时从上传文件
+重新加载。被其他工作进程修改的文档也以同样方式重新加载
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from utils.document_registry import DocumentRegistry
+
+# 释放时丢弃的字段 / Fields dropped on eviction
+HEAVY_FIELDS = ('processor', 'parsed', 'content', 'modified_content', 'payloads')
+
+# 只存在于本工作进程、不写入登记表的字段，其余字段为共享元数据
+# Fields that only live in this worker and are not written to the registry; the rest is shared metadata
+LOCAL_FIELDS = HEAVY_FIELDS + ('formats', 'extraction')
+
+# 两次记录访问时间之间的最短间隔（秒）/ Minimum seconds between two recorded accesses
+_TOUCH_INTERVAL = 60
+
+# 解析后的XML树相对压缩包中非图片部分的大致膨胀倍数 / Rough growth of parsed XML over its zipped size
+PARSED_XML_FACTOR = 8
+
+# 内容块中每个段落、run的大致固定开销（字节）/ Rough fixed cost per paragraph and run dict
+_BLOCK_OVERHEAD = 400
+_RUN_OVERHEAD = 250
+
+
+def estimate_content_size(blocks: Optional[List[Dict[str, Any]]]) -> int:
+    """
+    Rough memory size of extracted content blocks / 提取内容块的大致内存占用
+
+    Args:
+        blocks: Full schema content blocks / 完整结构的内容块
+
+    Returns:
+        Estimated bytes / 估算的字节数
+    """
+    size = 0
+    for block in blocks or []:
+        if block.get('type') == 'table':
+            for row in block.get('rows', []):
+                for cell in row:
+                    size += _BLOCK_OVERHEAD + estimate_content_size(cell.get('paragraphs'))
+        else:
+            size += _BLOCK_OVERHEAD + 2 * len(block.get('text', ''))
+            for run in block.get('runs', []):
+                size += _RUN_OVERHEAD + 2 * len(run.get('text', ''))
+    return size
+
+
+def _parsed_tree_size(processor) -> int:
+    """Rough size of one parsed document tree / 一棵解析后文档树的大致内存占用"""
+    original_bytes = len(getattr(processor, '_original_bytes', None) or b'')
+    image_bytes = sum(len(image.get('data') or b'') for image in (processor.images or {}).values())
+    return max(0, original_bytes - image_bytes) * PARSED_XML_FACTOR
+
+
+def estimate_original_size(processor) -> int:
+    """
+    Rough memory size of a processor's original side / 处理器原始文档部分的大致内存占用
+
+    Counts the original bytes, image data and the parsed original tree, which is only
+    there once parsed when the processor was loaded from the extraction cache
+    统计原始字节、图片数据和解析后的原始文档树（从提取缓存加载的处理器在解析之后才有文档树）
+    """
+    if processor is None or not processor.has_original:
+        return 0
+    original_bytes = len(getattr(processor, '_original_bytes', None) or b'')
+    image_bytes = sum(len(image.get('data') or b'') for image in (processor.images or {}).values())
+    size = original_bytes + image_bytes
+    if processor.original_parsed:
+        size += _parsed_tree_size(processor)
+    return size
+
+
+def estimate_document_size(doc_info: Dict[str, Any]) -> int:
+    """
+    Rough memory size of a loaded document / 已加载文档的大致内存占用
+
+    Counts the original side and original content, or this document's share of them when
+    the parsed original is shared, plus the modified tree and modified content
+    统计原始文档部分和原始内容（共享已解析原始文档时只计本文档分摊的部分），以及修改文档树和修改后内容
+    """
+    size = estimate_content_size(doc_info.get('modified_content'))
+    processor = doc_info.get('processor')
+    parsed = doc_info.get('parsed')
+    if parsed is not None:
+        size += parsed.share_size()
+    else:
+        size += estimate_content_size(doc_info.get('content')) + estimate_original_size(processor)
+    if processor is not None and processor.modified_doc is not None:
+        size += _parsed_tree_size(processor)
+    return size
+
+
+class DocumentStore:
+    """
+    Memory-budgeted LRU document store / 有内存预算的LRU文档存储
+    Used like the dict it replaces: ``store[doc_id]`` rehydrates an evicted or stale document,
+    ``peek`` returns the metadata without loading anything. Changed metadata is shared with
+    other workers through ``persist``
+    用法与原来的字典相同：``store[doc_id]``会重新加载已释放或已过期的文档，``peek``只返回元数据而不加载。
+    修改后的元数据通过``persist``与其他工作进程共享
+    """
+
+    def __init__(self, memory_budget: int, registry: DocumentRegistry):
+        """
+        Initialize store / 初始化存储
+
+        Args:
+            memory_budget: Bytes of parsed state kept loaded, 0 for unlimited / 保持加载的解析状态字节数，0为不限制
+            registry: Shared document registry / 共享的文档登记表
+        """
+        self.memory_budget = memory_budget
+        self.registry = registry
+        self.rehydrate: Optional[Callable[[Dict[str, Any]], None]] = None
+        self.before_evict: Optional[Callable[[Dict[str, Any]], Any]] = None
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()  # 按最近访问排序
+        self._sizes: Dict[str, int] = {}
+        self._versions: Dict[str, int] = {}  # 本地副本对应的登记表版本号
+        self._touched: Dict[str, float] = {}
+        self._evicted = set()
+        self._entry_locks: Dict[str, threading.RLock] = {}
+        self._lock = threading.RLock()
+        self.evictions = 0
+        self.rehydrations = 0
+
+    def configure(self, rehydrate: Callable[[Dict[str, Any]], None],
+                  before_evict: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        """
+        Set the load and save hooks / 设置加载与保存回调
+
+        Args:
+            rehydrate: Restores the heavy fields of an evicted doc_info / 恢复已释放文档的重量级字段
+            before_evict: Persists state that would be lost, e.g. an unsaved modified document
+                          保存释放后会丢失的状态，例如尚未保存的修改文档
+        """
+        self.rehydrate = rehydrate
+        self.before_evict = before_evict
+
+    def __contains__(self, doc_id: object) -> bool:
+        return isinstance(doc_id, str) and self.registry.version(doc_id) is not None
+
+    def __len__(self) -> int:
+        return len(self.registry.ids())
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.registry.ids())
+
+    def keys(self) -> List[str]:
+        return self.registry.ids()
+
+    def __getitem__(self, doc_id: str) -> Dict[str, Any]:
+        """Get a document, rehydrating it if evicted or changed elsewhere / 获取文档，已释放或在其他进程中被修改时重新加载"""
+        doc_info = self._sync(doc_id)
+        if doc_info is None:
+            raise KeyError(doc_id)
+        with self._lock:
+            self._entries.move_to_end(doc_id)
+            entry_lock = self._entry_locks[doc_id]
+        
+        # 其他工作进程仍在提取的文档不在本进程解析 / Documents another worker is still extracting are not parsed here
+        if doc_id in self._evicted and doc_info.get('status') != 'processing':
+            with entry_lock:
+                # 并发访问只重新加载一次 / Concurrent readers rehydrate once
+                if doc_id in self._evicted:
+                    self.rehydrate(doc_info)
+                    self._evicted.discard(doc_id)
+                    self.rehydrations += 1
+            self.measure(doc_id)
+        
+        now = time.time()
+        if now - self._touched.get(doc_id, 0) > _TOUCH_INTERVAL:
+            self._touched[doc_id] = now
+            self.registry.touch(doc_id)
+        return doc_info
+
+    def __setitem__(self, doc_id: str, doc_info: Dict[str, Any]):
+        with self._lock:
+            self._entries[doc_id] = doc_info
+            self._entries.move_to_end(doc_id)
+            self._entry_locks.setdefault(doc_id, threading.RLock())
+            self._evicted.discard(doc_id)
+        self.persist(doc_id)
+        self.measure(doc_id)
+
+    def __delitem__(self, doc_id: str):
+        if not self.remove(doc_id):
+            raise KeyError(doc_id)
+
+    def remove(self, doc_id: str) -> bool:
+        """
+        Remove a document from every worker / 从所有工作进程中删除文档
+
+        Returns:
+            True if this call removed it, so concurrent removals release its files once
+            本次调用删除了该文档时返回True，并发删除时只释放一次其文件
+        """
+        removed = self.registry.delete(doc_id)
+        self._forget(doc_id)
+        return removed
+
+    def _forget(self, doc_id: str):
+        """Drop the local copy of a document / 丢弃文档的本地副本"""
+        with self._lock:
+            self._entries.pop(doc_id, None)
+            self._sizes.pop(doc_id, None)
+            self._versions.pop(doc_id, None)
+            self._touched.pop(doc_id, None)
+            self._evicted.discard(doc_id)
+            self._entry_locks.pop(doc_id, None)
+
+    def _sync(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Local copy of a document, refreshed from the registry when another worker changed it
+        文档的本地副本，其他工作进程修改过时从登记表刷新
+        
+        The refreshed copy keeps only metadata and is marked evicted, so it is rehydrated on use
+        刷新后的副本只有元数据并标记为已释放，使用时重新加载
+        """
+        version = self.registry.version(doc_id)
+        if version is None:
+            self._forget(doc_id)
+            return None
+        
+        with self._lock:
+            doc_info = self._entries.get(doc_id)
+            if doc_info is not None and self._versions.get(doc_id) == version:
+                return doc_info
+            entry_lock = self._entry_locks.setdefault(doc_id, threading.RLock())
+        
+        with entry_lock:
+            loaded = self.registry.load(doc_id)
+            if loaded is None:
+                self._forget(doc_id)
+                return None
+            info, version = loaded
+            with self._lock:
+                doc_info = self._entries.get(doc_id)
+                if doc_info is not None and self._versions.get(doc_id) == version:
+                    return doc_info
+                if doc_info is None:
+                    doc_info = {}
+                    self._entries[doc_id] = doc_info
+                # 原地更新，持有该字典的请求看到的是同一份元数据 / Update in place so requests holding the dict see it
+                formats = doc_info.get('formats')
+                doc_info.clear()
+                doc_info.update(info)
+                if formats is not None:
+                    doc_info['formats'] = formats
+                self._versions[doc_id] = version
+                self._evicted.add(doc_id)
+                self._sizes[doc_id] = 0
+        return doc_info
+
+    def persist(self, doc_id: str):
+        """
+        Write a document's metadata to the registry after it changed / 文档变化后将元数据写入登记表
+        """
+        doc_info = self._entries.get(doc_id)
+        if doc_info is None:
+            return
+        info = {key: value for key, value in doc_info.items() if key not in LOCAL_FIELDS}
+        version = self.registry.save(doc_id, info)
+        with self._lock:
+            self._versions[doc_id] = version
+
+    def get(self, doc_id: str, default=None):
+        try:
+            return self[doc_id]
+        except KeyError:
+            return default
+
+    def peek(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Get a document's info without rehydrating or touching its recency / 获取文档信息，不重新加载也不更新访问顺序"""
+        return self._sync(doc_id)
+
+    def clear(self, release: Callable[[Dict[str, Any]], None]) -> int:
+        """
+        Remove every document from every worker / 从所有工作进程中删除所有文档
+
+        Args:
+            release: Releases the files of each removed document / 释放每个已删除文档的文件
+
+        Returns:
+            Number of documents this call removed / 本次调用删除的文档数量
+        """
+        cleared = self.registry.clear(release)
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._versions.clear()
+            self._touched.clear()
+            self._evicted.clear()
+            self._entry_locks.clear()
+        return cleared
+
+    def measure(self, doc_id: str):
+        """
+        Re-account a document's size after it changed and enforce the budget / 文档变化后重新统计大小并执行预算
+        """
+        doc_info = self._entries.get(doc_id)
+        if doc_info is None:
+            return
+        size = 0 if doc_id in self._evicted else estimate_document_size(doc_info)
+        with self._lock:
+            if doc_id in self._entries:
+                self._sizes[doc_id] = size
+        self.enforce_budget(keep=doc_id)
+
+    def loaded_size(self) -> int:
+        """Bytes of parsed state currently loaded / 当前加载的解析状态字节数"""
+        return sum(self._sizes.values())
+
+    def enforce_budget(self, keep: Optional[str] = None):
+        """
+        Evict least recently used documents until the budget is met / 释放最近最少使用的文档直到满足预算
+
+        Args:
+            keep: Document that must stay loaded, usually the one being accessed / 必须保持加载的文档，通常为正在访问的文档
+        """
+        if not self.memory_budget:
+            return
+        with self._lock:
+            excess = self.loaded_size() - self.memory_budget
+            if excess <= 0:
+                return
+            candidates = []
+            for doc_id in self._entries:
+                if excess <= 0:
+                    break
+                if doc_id == keep or doc_id in self._evicted or not self._sizes.get(doc_id):
+                    continue
+                candidates.append(doc_id)
+                excess -= self._sizes[doc_id]
+
+        # 在存储锁之外释放，保存修改文档时不阻塞其他请求 / Evict outside the store lock so saving does not block others
+        for doc_id in candidates:
+            self.evict(doc_id)
+
+    def evict(self, doc_id: str) -> bool:
+        """
+        Release a document's parsed state, keeping its metadata / 释放文档的解析状态，保留元数据
+
+        Documents still being extracted or whose processor is in use are skipped
+        仍在提取或处理器正在使用中的文档会被跳过
+
+        Returns:
+            True if the document was evicted / 已释放时返回True
+        """
+        doc_info = self._entries.get(doc_id)
+        entry_lock = self._entry_locks.get(doc_id)
+        if doc_info is None or entry_lock is None or doc_info.get('status') == 'processing':
+            return False
+
+        with entry_lock:
+            if doc_id in self._evicted:
+                return False
+            processor = doc_info.get('processor')
+            lock = getattr(processor, 'lock', None)
+            if lock is not None and not lock.acquire(blocking=False):
+                return False
+            try:
+                if self.before_evict is not None and not self.before_evict(doc_info):
+                    return False
+                for field in HEAVY_FIELDS:
+                    doc_info.pop(field, None)
+                with self._lock:
+                    self._evicted.add(doc_id)
+                    self._sizes[doc_id] = 0
+                self.evictions += 1
+                return True
+            finally:
+                if lock is not None:
+                    lock.release()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Store statistics / 存储统计信息
+
+        Returns:
+            Document counts, loaded bytes, budget and eviction/rehydration counters
+            文档数量、已加载字节数、预算以及释放/重新加载次数
+        """
+        with self._lock:
+            return {
+                'documents': len(self.registry.ids()),
+                'loaded': len(self._entries) - len(self._evicted),
+                'evicted': len(self._evicted),
+                'loaded_bytes': self.loaded_size(),
+                'memory_budget': self.memory_budget,
+                'evictions': self.evictions,
+                'rehydrations': self.rehydrations
+            }
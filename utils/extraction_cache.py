@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extraction cache module / 提取结果缓存模块
+Extracted content blocks, style table, image index, body summary and text index of an
+upload, stored gzip-compressed on disk by content hash and extractor version. A later
+load of the same bytes, in any worker or after a restart, reads the cache instead of
+walking the document XML again
+按内容哈希和提取器版本将上传文件的提取内容块、样式表、图片索引、正文汇总和文本索引以gzip压缩保存到磁盘。
+之后在任一工作进程中或重启后加载相同内容时直接读取缓存，不再重新遍历文档XML
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import gzip
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+# 缓存文件的压缩级别，写入只发生在首次提取时 / Compression level, files are only written on the first extraction
+GZIP_LEVEL = 6
+
+
+class ExtractionCache:
+    """
+    On-disk cache of extraction results / 提取结果的磁盘缓存
+    File names start with the content hash, so the temp janitor keeps an entry while its
+    upload is referenced and ages it out afterwards
+    文件名以内容哈希开头，临时文件清理器在上传文件被引用期间保留缓存，之后按期限清理
+    """
+
+    def __init__(self, folder: str, version: int):
+        """
+        Initialize cache / 初始化缓存
+
+        Args:
+            folder: Cache folder / 缓存目录
+            version: Extractor version, entries of other versions are ignored / 提取器版本，其他版本的缓存被忽略
+        """
+        self.folder = folder
+        self.version = version
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'errors': 0}
+
+    def path(self, content_hash: str, suffix: str) -> str:
+        """
+        Cache file of an upload / 上传文件对应的缓存文件
+
+        Args:
+            content_hash: SHA-256 of the upload / 上传文件的SHA-256
+            suffix: Upload extension including the dot, the same bytes extract differently per format
+                    包含点号的上传文件扩展名，相同内容按不同格式提取的结果不同
+        """
+        return os.path.join(self.folder, f"{content_hash}_{suffix.lstrip('.').lower()}_v{self.version}.json.gz")
+
+    def load(self, content_hash: str, suffix: str) -> Optional[Dict[str, Any]]:
+        """
+        Read a cached extraction / 读取缓存的提取结果
+
+        Returns:
+            Cached data, None if missing or unreadable / 缓存数据，不存在或无法读取时为None
+        """
+        path = self.path(content_hash, suffix)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+            # 刷新修改时间，仍在使用的缓存不会被清理 / Keep the entry fresh for the janitor while it is used
+            os.utime(path)
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        except Exception as e:
+            self._count('errors')
+            print(f"读取提取缓存失败 {path}: {str(e)}")
+            return None
+        self._count('hits')
+        return data
+
+    def contains(self, content_hash: str, suffix: str) -> bool:
+        """Whether an upload has a cached extraction / 上传文件是否有缓存的提取结果"""
+        return os.path.exists(self.path(content_hash, suffix))
+
+    def store(self, content_hash: str, suffix: str, data: Dict[str, Any]):
+        """Write atomically so readers never see a partial file / 原子写入，读取方不会看到不完整的文件"""
+        path = self.path(content_hash, suffix)
+        tmp_path = None
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=GZIP_LEVEL) as f:
+                f.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            os.replace(tmp_path, path)
+            tmp_path = None
+            self._count('writes')
+        except Exception as e:
+            self._count('errors')
+            print(f"写入提取缓存失败 {path}: {str(e)}")
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Cache statistics / 缓存统计信息
+
+        Returns:
+            Hits, misses, writes, errors and the extractor version / 命中、未命中、写入、错误次数以及提取器版本
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['version'] = self.version
+        return stats
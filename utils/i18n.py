@@ -131,6 +131,7 @@ TRANSLATIONS = {
         'modifications_processing_error': '修改条目处理错误',
         'no_valid_modifications': '没有有效的修改条目',
         'invalid_modification_format': '修改条目格式不正确',
+        'invalid_match_rule': '匹配规则无效',
         'no_modifications_applied': '未应用任何修改',
         'document_processed_successfully': '文档处理成功',
         'invalid_json_format': '修改条目JSON格式错误',
@@ -141,6 +142,7 @@ TRANSLATIONS = {
         'invalid_language': '无效的语言设置',
         'language_change_failed': '语言切换失败',
         'document_processing_failed': '文档处理失败',
+        'document_processing': '文档正在处理中',
         'auto_load_and_process_complete': '自动加载和处理完成',
         'auto_load_complete': '自动加载完成',
         'scroll_to_view_more': '滚动查看更多',
@@ -291,6 +293,7 @@ TRANSLATIONS = {
         'modifications_processing_error': 'Modifications processing error',
         'no_valid_modifications': 'No valid modifications',
         'invalid_modification_format': 'Invalid modification format',
+        'invalid_match_rule': 'Invalid match rule',
         'no_modifications_applied': 'No modifications applied',
         'document_processed_successfully': 'Document processed successfully',
         'invalid_json_format': 'Invalid JSON format for modifications',
@@ -301,6 +304,7 @@ TRANSLATIONS = {
         'invalid_language': 'Invalid language setting',
         'language_change_failed': 'Language change failed',
         'document_processing_failed': 'Document processing failed',
+        'document_processing': 'Document is still being processed',
         'auto_load_and_process_complete': 'Auto load and processing complete',
         'auto_load_complete': 'Auto load complete',
         'scroll_to_view_more': 'Scroll to view more',
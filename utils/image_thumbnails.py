@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Image thumbnails module / 图片缩略图模块
+Width-bounded WebP/JPEG/PNG previews of document images, generated on first access
+in a worker pool and cached on disk by content hash and width. Formats browsers
+cannot show (TIFF, EMF, WMF) are converted where Pillow can read them
+文档图片的限宽WebP/JPEG/PNG预览图，首次访问时在工作线程池中生成，并按内容哈希和宽度缓存到磁盘。
+浏览器无法显示的格式（TIFF、EMF、WMF）在Pillow能读取时进行转换
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Sequence, Tuple
+
+from PIL import Image, ImageOps, features
+
+# 浏览器可以直接显示的图片类型 / Image types browsers display as they are
+BROWSER_MIME_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/webp'}
+
+WEBP_AVAILABLE = features.check('webp')
+
+# 输出格式 -> MIME类型 / Output format -> mime type
+_FORMATS = {
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+}
+
+# EMF/WMF等矢量图按该宽度光栅化 / Width vector images are rasterized at
+_VECTOR_RENDER_WIDTH = 1920
+
+
+def snap_width(width: int, widths: Sequence[int]) -> int:
+    """
+    Round a requested width up to the nearest configured width / 将请求的宽度向上取整到最近的配置宽度
+
+    Keeps the number of cached variants per image bounded / 限制每张图片缓存的变体数量
+    """
+    for candidate in sorted(widths):
+        if width <= candidate:
+            return candidate
+    return max(widths)
+
+
+class ThumbnailService:
+    """
+    Thumbnail generator with a disk cache / 带磁盘缓存的缩略图生成器
+    Concurrent requests for the same variant share one job / 同一变体的并发请求共享一个任务
+    """
+
+    def __init__(self, cache_folder: str, widths: Sequence[int], workers: int = 2, quality: int = 80):
+        """
+        Initialize service / 初始化服务
+
+        Args:
+            cache_folder: Directory holding generated thumbnails / 保存生成缩略图的目录
+            widths: Allowed output widths / 允许的输出宽度
+            workers: Worker pool size / 工作线程池大小
+            quality: WebP/JPEG quality / WebP/JPEG质量
+        """
+        self.cache_folder = cache_folder
+        self.widths = tuple(widths)
+        self.quality = quality
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='thumbnail')
+        self._jobs: Dict[str, Future] = {}
+        self._originals = set()  # 应直接返回原图的变体 / Variants for which the original is served
+        self._lock = threading.Lock()
+
+    def get(self, image: Dict, width: int, accept_webp: bool) -> Optional[Tuple[bytes, str, str]]:
+        """
+        Get a preview of an image no wider than width / 获取宽度不超过width的图片预览
+
+        Args:
+            image: Stored image with data, mime_type and hash / 存储的图片，包含data、mime_type和hash
+            width: Requested width in pixels / 请求的宽度（像素）
+            accept_webp: Whether the client accepts WebP / 客户端是否接受WebP
+
+        Returns:
+            (data, mime type, variant tag), or None when the original should be served
+            (数据, MIME类型, 变体标记)，应返回原图时为None
+        """
+        width = snap_width(width, self.widths)
+        fmt = 'webp' if accept_webp and WEBP_AVAILABLE else None
+        key = f"{image['hash']}_{width}_{fmt or 'auto'}"
+
+        if key in self._originals:
+            return None
+        cached = self._read_cached(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                job = self._pool.submit(self._generate, key, image, width, fmt)
+                self._jobs[key] = job
+                job.add_done_callback(lambda _job, key=key: self._forget(key))
+        return job.result()
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._jobs.pop(key, None)
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_folder, key)
+
+    def _read_cached(self, key: str) -> Optional[Tuple[bytes, str, str]]:
+        """Read a generated variant, stored as '<key>.<format>' / 读取已生成的变体，文件名为'<key>.<格式>'"""
+        for fmt, mime_type in _FORMATS.items():
+            path = f"{self._cache_path(key)}.{fmt}"
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    return f.read(), mime_type, f"{key}.{fmt}"
+        return None
+
+    def _generate(self, key: str, image: Dict, width: int, fmt: Optional[str]) -> Optional[Tuple[bytes, str, str]]:
+        """Worker: decode, downscale and encode one variant / 工作线程：解码、缩小并编码一个变体"""
+        cached = self._read_cached(key)
+        if cached is not None:
+            return cached
+
+        try:
+            result = self._render(image, width, fmt)
+        except Exception as e:
+            print(f"生成图片预览失败 {image.get('filename')}: {str(e)}")
+            result = None
+
+        if result is None:
+            self._originals.add(key)
+            return None
+        data, fmt = result
+        self._write_cached(f"{key}.{fmt}", data)
+        return data, _FORMATS[fmt], f"{key}.{fmt}"
+
+    def _render(self, image: Dict, width: int, fmt: Optional[str]) -> Optional[Tuple[bytes, str]]:
+        """Decode, downscale and encode, None when the original is better / 解码、缩小并编码，原图更合适时返回None"""
+        source = Image.open(io.BytesIO(image['data']))
+        if source.format in ('WMF', 'EMF'):
+            # 仅在Pillow支持矢量图渲染的平台上可用，否则抛出异常并返回原图
+            # Only works where Pillow can render metafiles, otherwise raises and the original is served
+            source.load(dpi=self._vector_dpi(source))
+        elif getattr(source, 'is_animated', False):
+            # 动画保持原样 / Animations are served unchanged
+            return None
+
+        needs_conversion = image['mime_type'] not in BROWSER_MIME_TYPES
+        if source.width <= width and not needs_conversion:
+            # 已足够小且浏览器可以显示 / Already small enough and displayable
+            return None
+
+        source = ImageOps.exif_transpose(source)
+        if source.width > width:
+            height = max(1, round(source.height * width / source.width))
+            source = source.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+
+        has_alpha = source.mode in ('RGBA', 'LA', 'PA') or (source.mode == 'P' and 'transparency' in source.info)
+        if fmt is None:
+            fmt = 'png' if has_alpha else 'jpeg'
+        source = source.convert('RGBA' if has_alpha and fmt != 'jpeg' else 'RGB')
+
+        buffer = io.BytesIO()
+        if fmt == 'png':
+            source.save(buffer, 'PNG', optimize=True)
+        elif fmt == 'webp':
+            source.save(buffer, 'WEBP', quality=self.quality, method=4)
+        else:
+            source.save(buffer, 'JPEG', quality=self.quality, optimize=True, progressive=True)
+        data = buffer.getvalue()
+
+        if len(data) >= len(image['data']) and not needs_conversion:
+            # 预览不比原图小时直接使用原图 / Keep the original when the preview is not smaller
+            return None
+        return data, fmt
+
+    def _write_cached(self, name: str, data: bytes):
+        """Write atomically so readers never see a partial file / 原子写入，读取方不会看到不完整的文件"""
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_folder, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_folder, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.cache_folder, name))
+            tmp_path = None
+        except Exception as e:
+            print(f"写入缩略图缓存失败 {name}: {str(e)}")
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _vector_dpi(source) -> int:
+        """DPI that renders a metafile about _VECTOR_RENDER_WIDTH wide / 使矢量图渲染宽度约为_VECTOR_RENDER_WIDTH的DPI"""
+        dpi = source.info.get('dpi', 72)
+        if isinstance(dpi, tuple):
+            dpi = dpi[0]
+        if not source.width:
+            return int(dpi)
+        return max(1, int(dpi * _VECTOR_RENDER_WIDTH / source.width))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_thumbnail_service(cache_folder: str, widths: Sequence[int], workers: int, quality: int) -> ThumbnailService:
+    """Get the shared thumbnail service / 获取共享的缩略图服务"""
+    global _service
+    with _service_lock:
+        if _service is None or _service.cache_folder != cache_folder:
+            _service = ThumbnailService(cache_folder, widths, workers, quality)
+        return _service
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modification plan module / 修改计划模块
+Compiled modification set applied to raw w:p elements by the engines that
+work outside the python-docx object model (streaming and parallel)
+编译后的修改集合，供不经过python-docx对象模型的引擎（流式、并行）直接作用于w:p元素
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+from typing import Callable, Dict
+
+from lxml import etree
+
+from utils.comments_writer import W_NS
+from utils.paragraph_rewriter import ParagraphRewriter
+from utils.text_matcher import RuleKey, RuleMatcher
+
+W_P = f"{{{W_NS}}}p"
+_W_R = f"{{{W_NS}}}r"
+_W_RPR = f"{{{W_NS}}}rPr"
+_W_HIGHLIGHT = f"{{{W_NS}}}highlight"
+_W_VAL = f"{{{W_NS}}}val"
+W_ID = f"{{{W_NS}}}id"
+
+# 携带批注ID的标记元素 / Markup elements carrying a comment id
+COMMENT_MARKERS = {
+    f"{{{W_NS}}}{name}" for name in ('commentRangeStart', 'commentRangeEnd', 'commentReference')
+}
+
+# rPr中必须排在w:highlight之后的元素 / rPr children that must follow w:highlight
+_AFTER_HIGHLIGHT = {
+    f"{{{W_NS}}}{name}" for name in (
+        'u', 'effect', 'bdr', 'shd', 'fitText', 'vertAlign', 'rtl', 'cs', 'em',
+        'lang', 'eastAsianLayout', 'specVanish', 'oMath'
+    )
+}
+
+
+class ModificationPlan:
+    """
+    Compiled modification plan / 编译后的修改计划
+    The matcher is built once per modification set and reused for every paragraph
+    匹配器对每个修改集合只构建一次，并在所有段落间复用
+    """
+
+    def __init__(self, modification_map: Dict[RuleKey, str]):
+        """
+        Compile plan / 编译计划
+
+        Args:
+            modification_map: (original_text, match_type) rule key -> new_text / (原文, 匹配方式)规则键到新文本的映射
+        """
+        self.modification_map = modification_map
+        self.matcher = RuleMatcher(modification_map)
+
+    def rewrite_paragraph(self, paragraph, allocate_comment: Callable[[RuleKey], str]) -> int:
+        """
+        Apply all hits to one w:p right to left / 从右向左在一个w:p上应用所有命中
+
+        Args:
+            paragraph: w:p element / w:p元素
+            allocate_comment: Returns a comment id for a rule key / 为规则键分配批注ID
+
+        Returns:
+            Number of replacements made / 替换次数
+        """
+        rewriter = ParagraphRewriter(paragraph)
+        if not rewriter.text:
+            return 0
+        hits = self.matcher.find_all(rewriter.text)
+
+        replaced = 0
+        for start, end, key in reversed(hits):
+            new_text = self.matcher.replacement(key, self.modification_map[key], rewriter.text, start)
+            run = rewriter.replace(start, end, new_text)
+            if run is None:
+                continue
+            replaced += 1
+            set_highlight(run)
+            add_comment_reference(run, allocate_comment(key))
+        return replaced
+
+
+def set_highlight(run):
+    """Set yellow highlight on a run keeping rPr child order / 设置黄色高亮并保持rPr子元素顺序"""
+    rpr = run.find(_W_RPR)
+    if rpr is None:
+        rpr = run.makeelement(_W_RPR, {})
+        run.insert(0, rpr)
+
+    highlight = rpr.find(_W_HIGHLIGHT)
+    if highlight is None:
+        highlight = rpr.makeelement(_W_HIGHLIGHT, {})
+        for child in rpr:
+            if child.tag in _AFTER_HIGHLIGHT:
+                child.addprevious(highlight)
+                break
+        else:
+            rpr.append(highlight)
+    highlight.set(_W_VAL, 'yellow')
+
+
+def add_comment_reference(run, comment_id: str):
+    """Wrap a run in a comment range and append the reference run / 用批注范围包裹run并追加引用run"""
+    start = run.makeelement(f"{{{W_NS}}}commentRangeStart", {W_ID: comment_id})
+    end = run.makeelement(f"{{{W_NS}}}commentRangeEnd", {W_ID: comment_id})
+    reference_run = run.makeelement(_W_R, {})
+    etree.SubElement(reference_run, f"{{{W_NS}}}commentReference", {W_ID: comment_id})
+
+    run.addprevious(start)
+    run.addnext(end)
+    end.addnext(reference_run)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Paragraph rewriter module / 段落改写模块
+Maps paragraph character offsets to (run, text element, offset) once and
+replaces matched ranges while touching only the runs that overlap them
+一次性建立段落字符偏移到(run, 文本元素, 偏移)的映射，替换命中区间时只改动与之重叠的run
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+from copy import deepcopy
+from typing import List, Optional
+
+from docx.oxml.ns import qn
+
+# Run children that contribute characters to paragraph text / 贡献段落文本字符的run子元素
+_SPECIAL_CHARS = {
+    qn('w:tab'): '\t',
+    qn('w:br'): '\n',
+    qn('w:cr'): '\n',
+    qn('w:noBreakHyphen'): '-',
+}
+
+_W_T = qn('w:t')
+_W_R = qn('w:r')
+_W_RPR = qn('w:rPr')
+_W_HYPERLINK = qn('w:hyperlink')
+_XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+
+def _child_text(child) -> str:
+    """Characters a run child contributes / run子元素贡献的字符"""
+    if child.tag == _W_T:
+        return child.text or ''
+    return _SPECIAL_CHARS.get(child.tag, '')
+
+
+def iter_runs(paragraph_element):
+    """Yield runs directly under the paragraph or its hyperlinks / 遍历段落及其超链接下的run"""
+    for child in paragraph_element:
+        if child.tag == _W_R:
+            yield child
+        elif child.tag == _W_HYPERLINK:
+            for run in child.iterchildren(_W_R):
+                yield run
+
+
+def run_text(run_element) -> str:
+    """Text of one run as seen by the rewriter / 改写器视角下单个run的文本"""
+    return ''.join(_child_text(child) for child in run_element)
+
+
+def paragraph_text(paragraph_element) -> str:
+    """
+    Paragraph text matched, indexed and displayed alike / 匹配、索引和显示共用的段落文本
+
+    Unlike paragraph.text on python-docx 0.8.11 it includes hyperlink runs, so
+    offsets reported against it line up with ParagraphRewriter
+    与python-docx 0.8.11的paragraph.text不同，它包含超链接中的run，因此基于它的偏移与ParagraphRewriter一致
+    """
+    return ''.join(run_text(run) for run in iter_runs(paragraph_element))
+
+
+class _Segment:
+    """Text-bearing run child with its paragraph offsets / 带段落偏移的文本型run子元素"""
+
+    __slots__ = ('start', 'end', 'run', 'child')
+
+    def __init__(self, start: int, end: int, run, child):
+        self.start = start
+        self.end = end
+        self.run = run
+        self.child = child
+
+
+class ParagraphRewriter:
+    """
+    Offset-mapped paragraph rewriter / 基于偏移映射的段落改写器
+    Replacements must be applied right to left so offsets on the left stay valid
+    替换必须从右向左进行，以保证左侧偏移保持有效
+    """
+
+    def __init__(self, paragraph_element):
+        """
+        Build the offset map for a paragraph / 为段落建立偏移映射
+
+        Args:
+            paragraph_element: w:p element / w:p元素
+        """
+        self.element = paragraph_element
+        self.segments: List[_Segment] = []
+
+        parts = []
+        offset = 0
+        for run in iter_runs(paragraph_element):
+            for child in run:
+                text = _child_text(child)
+                if not text:
+                    continue
+                self.segments.append(_Segment(offset, offset + len(text), run, child))
+                parts.append(text)
+                offset += len(text)
+
+        self.text = ''.join(parts)
+
+    def replace(self, start: int, end: int, new_text: str):
+        """
+        Replace paragraph text in [start, end) with new_text / 将段落[start, end)区间的文本替换为new_text
+
+        The replacement lands in its own run that inherits the formatting of the
+        first overlapped run; runs outside the range are left untouched
+        替换文本放入独立的run，继承第一个重叠run的格式；区间外的run保持不变
+
+        Args:
+            start: Start offset / 起始偏移
+            end: End offset (exclusive) / 结束偏移（不含）
+            new_text: Replacement text / 替换文本
+
+        Returns:
+            The run element holding new_text, or None / 包含新文本的run元素，失败时为None
+        """
+        if start >= end or not self.segments or end > self.segments[-1].end:
+            return None
+
+        self._ensure_boundary(end)
+        self._ensure_boundary(start)
+
+        first_index = self._segment_index(start)
+        inner = self.segments[first_index:]
+        inner = [segment for segment in inner if segment.end <= end]
+        if not inner:
+            return None
+
+        target_run = inner[0].run
+        new_t = target_run.makeelement(_W_T, {})
+        new_t.text = new_text
+        new_t.set(_XML_SPACE, 'preserve')
+        inner[0].child.addprevious(new_t)
+
+        touched_runs = []
+        for segment in inner:
+            segment.run.remove(segment.child)
+            if segment.run not in touched_runs:
+                touched_runs.append(segment.run)
+
+        # 清空后只剩格式属性的run直接移除
+        for run in touched_runs[1:]:
+            if all(child.tag == _W_RPR for child in run):
+                run.getparent().remove(run)
+
+        # 区间右侧的映射已失效，只保留左侧部分
+        del self.segments[first_index:]
+        return target_run
+
+    def _segment_index(self, offset: int) -> int:
+        """Index of the segment containing offset, scanning from the right / 从右侧查找包含偏移的片段索引"""
+        index = len(self.segments) - 1
+        while index > 0 and self.segments[index].start > offset:
+            index -= 1
+        return index
+
+    def _ensure_boundary(self, offset: int) -> Optional[object]:
+        """Make sure a run starts exactly at offset / 确保恰好有一个run从该偏移开始"""
+        if offset >= self.segments[-1].end:
+            return None
+
+        index = self._segment_index(offset)
+        segment = self.segments[index]
+
+        if segment.start < offset:
+            # 偏移落在w:t内部，先拆分文本元素
+            segment = self._split_text(index, offset)
+            index += 1
+
+        previous = self.segments[index - 1] if index > 0 else None
+        if previous is not None and previous.run is segment.run:
+            self._split_run_before(segment.run, segment.child, index)
+
+        return segment.run
+
+    def _split_text(self, index: int, offset: int) -> _Segment:
+        """Split a w:t at a paragraph offset / 在段落偏移处拆分w:t元素"""
+        segment = self.segments[index]
+        cut = offset - segment.start
+        text = segment.child.text or ''
+
+        tail = segment.child.makeelement(_W_T, {})
+        tail.text = text[cut:]
+        tail.set(_XML_SPACE, 'preserve')
+        segment.child.text = text[:cut]
+        segment.child.set(_XML_SPACE, 'preserve')
+        segment.child.addnext(tail)
+
+        new_segment = _Segment(offset, segment.end, segment.run, tail)
+        segment.end = offset
+        self.segments.insert(index + 1, new_segment)
+        return new_segment
+
+    def _split_run_before(self, run, child, index: int):
+        """Move child and its following siblings into a new run / 将子元素及其后续兄弟元素移入新run"""
+        new_run = run.makeelement(_W_R, {})
+        rpr = run.find(_W_RPR)
+        if rpr is not None:
+            new_run.append(deepcopy(rpr))
+
+        moving = [child] + list(child.itersiblings())
+        run.addnext(new_run)
+        for element in moving:
+            new_run.append(element)
+
+        for segment in self.segments[index:]:
+            if segment.run is run:
+                segment.run = new_run
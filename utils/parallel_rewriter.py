@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallel body rewriter module / 并行正文改写模块
+Splits the body's paragraphs and tables into contiguous chunks, applies the
+compiled modification plan to each chunk in a process pool and puts the
+results back in place
+将正文段落和表格切分为连续的分片，在进程池中对每个分片应用编译好的修改计划，再放回原来的位置
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import hashlib
+import json
+import multiprocessing
+import threading
+from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+from docx.oxml import parse_xml
+try:
+    from docx.oxml import element_class_lookup
+except ImportError:
+    # python-docx 1.x moved the lookup into docx.oxml.parser / python-docx 1.x将其移到docx.oxml.parser中
+    from docx.oxml.parser import element_class_lookup
+from lxml import etree
+
+from utils.body_walker import W_P, W_TBL, element_paragraphs
+from utils.comments_writer import CommentsAccumulator
+from utils.modification_plan import COMMENT_MARKERS, ModificationPlan, W_ID
+from utils.streaming_rewriter import BLOCK_KINDS
+from utils.text_matcher import RuleKey
+
+# 工作进程内的临时批注ID前缀，合并时替换为全局ID / Worker-local comment id prefix, remapped on merge
+_PENDING_PREFIX = 'pending:'
+
+# 每个工作进程分配的分片数，用于平衡大小不均的块 / Chunks per worker to even out uneven blocks
+CHUNKS_PER_WORKER = 4
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+# 工作进程内缓存的修改计划，同一修改集合只编译一次 / Worker-side plan cache
+_worker_plan_key = None
+_worker_plan = None
+
+# 工作进程解析分片的解析器，生成python-docx元素类以便按python-docx读取表格
+# Worker chunk parser producing python-docx element classes so tables read like python-docx tables
+_chunk_parser = etree.XMLParser(huge_tree=True)
+_chunk_parser.set_element_class_lookup(element_class_lookup)
+
+
+def _initialize_worker():
+    """
+    Pool worker start-up / 工作进程启动
+    Unpickling this function imports only this module and its dependencies, so a worker
+    never needs the web application; the plan cache starts empty
+    反序列化此函数只会导入本模块及其依赖，工作进程不需要Web应用；修改计划缓存从空开始
+    """
+    global _worker_plan_key, _worker_plan
+    _worker_plan_key = None
+    _worker_plan = None
+
+
+def plan_key(modification_map: Dict[RuleKey, str]) -> str:
+    """
+    Digest identifying a modification set in the worker plan cache / 在工作进程修改计划缓存中标识修改集合的摘要
+
+    Returns:
+        SHA-256 of the canonical JSON of the sorted rules / 排序后规则的规范JSON的SHA-256
+    """
+    rules = sorted([pattern, match_type, new_text] for (pattern, match_type), new_text in modification_map.items())
+    canonical = json.dumps(rules, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Get the shared process pool / 获取共享进程池
+
+    Workers are started with spawn so that forking a threaded web server is avoided
+    工作进程使用spawn方式启动，避免对多线程Web服务进行fork
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_initialize_worker)
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    """Shut the shared pool down, e.g. after a worker crashed / 关闭共享进程池（例如工作进程崩溃后）"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+        _pool_workers = 0
+
+
+def _rewrite_chunk(key: str, modification_map: Dict[RuleKey, str],
+                   chunk_xml: bytes) -> Tuple[bytes, List[RuleKey], int, int, List[int]]:
+    """
+    Worker entry point: apply the plan to one serialized chunk / 工作进程入口：对一个序列化分片应用修改计划
+
+    Returns:
+        (rewritten chunk, rule key per pending comment, paragraphs, hits, indexes of touched blocks in the chunk)
+        (改写后的分片, 每个待分配批注对应的规则键, 段落数, 命中数, 分片内有替换的块序号)
+    """
+    global _worker_plan_key, _worker_plan
+    if _worker_plan_key != key:
+        _worker_plan = ModificationPlan(modification_map)
+        _worker_plan_key = key
+
+    root = etree.fromstring(chunk_xml, _chunk_parser)
+    pending = []
+
+    def allocate(rule: RuleKey) -> str:
+        pending.append(rule)
+        return f"{_PENDING_PREFIX}{len(pending) - 1}"
+
+    paragraphs = 0
+    hits = 0
+    touched = []
+    for block_index, block in enumerate(list(root)):
+        # 与对象模型引擎相同的段落 / Same paragraphs as the object-model engine
+        for paragraph in list(element_paragraphs(BLOCK_KINDS[block.tag], block)):
+            replaced = _worker_plan.rewrite_paragraph(paragraph, allocate)
+            if replaced:
+                paragraphs += 1
+                hits += replaced
+                if not touched or touched[-1] != block_index:
+                    touched.append(block_index)
+
+    return etree.tostring(root, encoding='utf-8'), pending, paragraphs, hits, touched
+
+
+class ParallelBodyRewriter:
+    """
+    Process-pool modification engine / 进程池修改引擎
+    Comment ids are assigned in document order after all chunks return, so the
+    result does not depend on which worker finishes first
+    批注ID在所有分片返回后按文档顺序分配，结果与工作进程完成的先后无关
+    """
+
+    def __init__(self, modification_map: Dict[RuleKey, str], reason_for: Callable[[RuleKey], str],
+                 workers: int, author: str = "Document Editor"):
+        """
+        Initialize rewriter / 初始化改写器
+
+        Args:
+            modification_map: (original_text, match_type) rule key -> new_text / (原文, 匹配方式)规则键到新文本的映射
+            reason_for: Returns the comment text for a rule key / 返回规则键对应的批注内容
+            workers: Process pool size / 进程池大小
+            author: Comment author / 批注作者
+        """
+        self.modification_map = modification_map
+        self.reason_for = reason_for
+        self.workers = workers
+        self.author = author
+        self.plan_key = plan_key(modification_map)
+
+    def rewrite(self, body, comments: CommentsAccumulator) -> Dict[str, int]:
+        """
+        Rewrite the paragraphs and tables of a w:body in place / 原地改写w:body的段落和表格
+
+        Other body children, such as content controls and the section properties, are left
+        as they are, like in the object-model engine
+        其他正文子元素（例如内容控件和节属性）与对象模型引擎一样保持不变
+
+        Args:
+            body: w:body element of the modified document / 修改文档的w:body元素
+            comments: Accumulator receiving the merged comments / 接收合并批注的累加器
+
+        Returns:
+            Statistics with modified paragraph and hit counts / 包含修改段落数和命中数的统计
+        """
+        blocks = list(body.iterchildren(W_P, W_TBL))
+        block_keys = self._block_keys(blocks)
+        chunks = self._partition(blocks)
+        payloads = [self._serialize_chunk(body, chunk) for chunk in chunks]
+
+        pool = get_pool(self.workers)
+        try:
+            futures = [pool.submit(_rewrite_chunk, self.plan_key, self.modification_map, payload)
+                       for payload in payloads]
+            results = [future.result() for future in futures]
+        except Exception:
+            shutdown_pool()
+            raise
+
+        # 全部成功后才替换正文，失败时文档保持原样 / Body is only touched once every chunk succeeded
+        paragraphs = 0
+        hits = 0
+        modified_blocks = []
+        chunk_start = 0
+        for (chunk_xml, pending, chunk_paragraphs, chunk_hits, touched), chunk in zip(results, chunks):
+            root = parse_xml(chunk_xml)
+            self._merge_comments(root, pending, comments)
+            for original, block in zip(chunk, list(root)):
+                body.replace(original, block)
+            paragraphs += chunk_paragraphs
+            hits += chunk_hits
+            modified_blocks.extend(block_keys[chunk_start + index] for index in touched)
+            chunk_start += len(chunk)
+
+        return {'paragraphs': paragraphs, 'hits': hits, 'chunks': len(chunks), 'blocks': modified_blocks}
+
+    @staticmethod
+    def _block_keys(blocks: List) -> List[Tuple[str, int]]:
+        """Content block key of each body paragraph and table / 每个正文段落和表格对应的内容块"""
+        counters = {'paragraph': 0, 'table': 0}
+        keys = []
+        for block in blocks:
+            kind = BLOCK_KINDS[block.tag]
+            keys.append((kind, counters[kind]))
+            counters[kind] += 1
+        return keys
+
+    def _partition(self, blocks: List) -> List[List]:
+        """Split blocks into contiguous, evenly sized chunks / 将块切分为连续且数量均衡的分片"""
+        count = min(len(blocks), max(1, self.workers * CHUNKS_PER_WORKER))
+        if count == 0:
+            return []
+        size, extra = divmod(len(blocks), count)
+        chunks = []
+        start = 0
+        for index in range(count):
+            end = start + size + (1 if index < extra else 0)
+            chunks.append(blocks[start:end])
+            start = end
+        return chunks
+
+    @staticmethod
+    def _serialize_chunk(body, chunk: List) -> bytes:
+        """Serialize a chunk under a body-like wrapper declaring namespaces once / 在声明一次命名空间的包装元素下序列化分片"""
+        wrapper = etree.Element(body.tag, nsmap=body.nsmap)
+        for block in chunk:
+            # 复制而不是移动，失败时原文档不受影响 / Copy rather than move so failures leave the body intact
+            wrapper.append(deepcopy(block))
+        etree.cleanup_namespaces(wrapper)
+        return etree.tostring(wrapper, encoding='utf-8')
+
+    def _merge_comments(self, root, pending: List[RuleKey], comments: CommentsAccumulator):
+        """Allocate global comment ids for a chunk and rewrite its markers / 为分片分配全局批注ID并改写标记"""
+        if not pending:
+            return
+        global_ids = [comments.add(self.reason_for(rule), self.author) for rule in pending]
+        for element in root.iter(*COMMENT_MARKERS):
+            local_id = element.get(W_ID, '')
+            if local_id.startswith(_PENDING_PREFIX):
+                element.set(W_ID, global_ids[int(local_id[len(_PENDING_PREFIX):])])
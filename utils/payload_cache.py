@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Payload cache module / 响应缓存模块
+Serialized JSON payloads cached per document version together with their gzip and
+brotli encodings and a strong ETag, so repeated reads neither re-serialize nor
+re-compress the stored content
+按文档版本缓存序列化后的JSON响应及其gzip、brotli编码和强ETag，重复读取时不再重新序列化或压缩已存储的内容
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import gzip
+import hashlib
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available / brotli为可选依赖，gzip始终可用
+    brotli = None
+
+# 按优先级排列的可用编码 / Available encodings in order of preference
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encoding: Optional[str], min_size: int = 0, size: int = 0) -> Optional[str]:
+    """
+    Pick the content encoding for an Accept-Encoding header / 根据Accept-Encoding请求头选择内容编码
+
+    Args:
+        accept_encoding: Raw Accept-Encoding header / 原始Accept-Encoding请求头
+        min_size: Smaller payloads are sent uncompressed / 小于该大小的响应不压缩
+        size: Uncompressed payload size / 未压缩的响应大小
+
+    Returns:
+        'br', 'gzip' or None for identity / 'br'、'gzip'，不压缩时为None
+    """
+    if not accept_encoding or size < min_size:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best = None
+    best_weight = 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class CachedPayload:
+    """
+    One serialized payload and its encodings / 一个序列化后的响应及其编码
+    Encodings are produced on first request and kept / 编码在首次请求时生成并保留
+    """
+
+    def __init__(self, body: bytes, gzip_level: int = 9, brotli_quality: int = 9):
+        self.body = body
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        # 强ETag由内容摘要得出，内容相同则ETag相同 / Strong ETag derived from the bytes themselves
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        """ETag of one representation, unquoted / 某一表示形式的ETag（不含引号）"""
+        return f"{self.digest}-{encoding}" if encoding else self.digest
+
+    def encoded(self, encoding: Optional[str] = None) -> bytes:
+        """
+        Payload bytes in an encoding / 指定编码的响应内容
+
+        Args:
+            encoding: 'br', 'gzip' or None / 'br'、'gzip'或None
+
+        Returns:
+            Encoded bytes, compressed once per payload / 编码后的内容，每个响应只压缩一次
+        """
+        if encoding is None:
+            return self.body
+        data = self._encoded.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._encoded.get(encoding)
+                if data is None:
+                    if encoding == 'br':
+                        data = brotli.compress(self.body, quality=self.brotli_quality)
+                    else:
+                        # mtime固定为0，同一内容的压缩结果逐字节相同 / Fixed mtime keeps the output byte-identical
+                        data = gzip.compress(self.body, compresslevel=self.gzip_level, mtime=0)
+                    self._encoded[encoding] = data
+        return data
+
+
+class PayloadCache:
+    """
+    Per-document payload cache / 每个文档的响应缓存
+    Invalidated as a whole when the document changes; payloads built while an
+    invalidation happened are not stored
+    文档变化时整体失效；构建期间发生失效的响应不会被缓存
+    """
+
+    def __init__(self, gzip_level: int = 9, brotli_quality: int = 9):
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.generation = 0
+        self._payloads: Dict[Hashable, CachedPayload] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build: Callable[[], bytes]) -> CachedPayload:
+        """
+        Get a cached payload, building it when missing / 获取缓存的响应，缺失时构建
+
+        Args:
+            key: Payload variant, e.g. the content schema / 响应变体，例如内容结构版本
+            build: Returns the serialized payload / 返回序列化后的响应
+
+        Returns:
+            Cached payload / 缓存的响应
+        """
+        payload = self._payloads.get(key)
+        if payload is not None:
+            return payload
+
+        generation = self.generation
+        payload = CachedPayload(build(), self.gzip_level, self.brotli_quality)
+        with self._lock:
+            if generation == self.generation:
+                payload = self._payloads.setdefault(key, payload)
+        return payload
+
+    def invalidate(self):
+        """Drop every cached payload of the document / 丢弃文档的所有缓存响应"""
+        with self._lock:
+            self.generation += 1
+            self._payloads.clear()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared documents module / 共享文档模块
+Content-addressed uploads: files are hashed (SHA-256) while they are written to disk,
+identical uploads share one reference-counted blob and, within a worker, one parsed
+original with its extracted content. Each doc_id gets its own forked processor, so
+modification state stays per document
+按内容寻址的上传：文件在写入磁盘的同时计算SHA-256，内容相同的上传共享一个带引用计数的文件，
+并在工作进程内共享一份解析后的原始文档及其提取内容。每个doc_id使用自己fork出的处理器，
+修改状态按文档独立保存
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import weakref
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from utils.document_registry import DocumentRegistry
+from utils.document_store import estimate_content_size, estimate_original_size
+
+# 读取上传内容的块大小 / Chunk size used when reading uploads
+CHUNK_SIZE = 1024 * 1024
+
+
+def blob_path(folder: str, content_hash: str, suffix: str) -> str:
+    """
+    Path of the stored upload for a content hash / 内容哈希对应的上传文件路径
+
+    The hash prefix marks the file as owned by the blob for the temp janitor
+    哈希前缀使临时文件清理器将该文件识别为属于该上传文件
+    """
+    return os.path.join(folder, f"{content_hash}_blob{suffix.lower()}")
+
+
+def store_blob(stream: BinaryIO, folder: str, suffix: str, registry: DocumentRegistry) -> Tuple[str, str]:
+    """
+    Write an upload to disk while hashing it, keeping one copy per content / 边写入磁盘边计算哈希，相同内容只保留一份
+
+    Args:
+        stream: Readable upload stream / 可读取的上传流
+        folder: Upload folder / 上传目录
+        suffix: File extension including the dot / 包含点号的文件扩展名
+        registry: Registry holding the blob reference counts / 保存引用计数的登记表
+
+    Returns:
+        (content hash, blob path) / (内容哈希, 文件路径)
+    """
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+
+        content_hash = digest.hexdigest()
+        path = blob_path(folder, content_hash, suffix)
+
+        def place():
+            if os.path.exists(path):
+                # 已有相同内容，丢弃新副本并刷新修改时间 / Same content already stored, keep it fresh for the janitor
+                os.remove(tmp_path)
+                os.utime(path)
+            else:
+                os.replace(tmp_path, path)
+
+        registry.acquire_blob(path, content_hash, place)
+        return content_hash, path
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def release_blob(path: str, registry: DocumentRegistry) -> int:
+    """
+    Drop a document's reference to its blob, deleting the file with the last one / 释放文档对上传文件的引用，最后一个引用释放时删除文件
+
+    Returns:
+        Remaining reference count / 剩余的引用计数
+    """
+    def remove():
+        if os.path.exists(path):
+            os.remove(path)
+
+    return registry.release_blob(path, remove)
+
+
+class ParsedDocument:
+    """
+    Parsed original document shared by the documents uploaded with the same bytes / 相同内容的上传共享的已解析原始文档
+    The extracted content list is shared read-only; modified content is built per document
+    提取的内容列表只读共享；修改后内容按文档各自构建
+    """
+
+    def __init__(self, processor, content: List[Dict[str, Any]]):
+        """
+        Args:
+            processor: Processor that parsed the original, keeps being used by its document
+                       解析原始文档的处理器，其文档继续使用它
+            content: Extracted original content / 提取的原始内容
+        """
+        # 模板不带任何修改状态，第一个文档释放后不会保留其修改文档 / The template carries no modification state
+        self.processor = processor.fork()
+        self.content = content
+        self.size = estimate_original_size(processor) + estimate_content_size(content)
+        self._users = weakref.WeakSet([processor])
+        self._lock = threading.Lock()
+
+    def fork(self):
+        """New processor for one document, sharing the parsed original / 为一个文档创建共享已解析原始文档的新处理器"""
+        with self._lock:
+            processor = self.processor.fork()
+            self._users.add(processor)
+        return processor
+
+    def share_size(self) -> int:
+        """This document's share of the parsed original / 本文档分摊的已解析原始文档大小"""
+        return self.size // max(1, len(self._users))
+
+
+class SharedDocuments:
+    """
+    Per-worker cache of parsed originals by blob path / 按文件路径缓存已解析原始文档（每个工作进程一份）
+    Entries live as long as a document holds them and vanish with the last one
+    条目在有文档持有时保留，最后一个文档释放后自动消失
+    """
+
+    def __init__(self):
+        self._parsed: 'weakref.WeakValueDictionary[str, ParsedDocument]' = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, path: str) -> Optional[ParsedDocument]:
+        """Parsed original of a blob, None if not loaded in this worker / 文件的已解析原始文档，本进程未加载时为None"""
+        parsed = self._parsed.get(path)
+        if parsed is not None:
+            self.hits += 1
+        return parsed
+
+    def publish(self, path: str, processor, content: List[Dict[str, Any]]) -> ParsedDocument:
+        """
+        Share a freshly parsed original / 共享新解析的原始文档
+
+        Args:
+            path: Blob path / 文件路径
+            processor: Processor that parsed the blob / 解析该文件的处理器
+            content: Extracted original content / 提取的原始内容
+
+        Returns:
+            The shared parse. If another request published the same blob first, that one is
+            returned and the caller should fork from it instead of keeping its own parse
+            共享的解析结果。如果其他请求已先共享了同一文件，返回已有的结果，调用方应从其fork而不是保留自己的解析结果
+        """
+        with self._lock:
+            parsed = self._parsed.get(path)
+            if parsed is None:
+                parsed = ParsedDocument(processor, content)
+                self._parsed[path] = parsed
+                self.loads += 1
+            return parsed
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Cache statistics / 缓存统计信息
+
+        Returns:
+            Parsed originals held, parses shared and parses done / 持有的已解析原始文档数、共享次数和解析次数
+        """
+        return {
+            'parsed': len(self._parsed),
+            'hits': self.hits,
+            'loads': self.loads
+        }
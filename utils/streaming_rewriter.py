@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming OOXML rewriter module / 流式OOXML改写模块
+Streams word/document.xml with an lxml pull parser, rewrites the target paragraphs of
+each body block as it passes and writes the result straight into the output zip
+without building the full tree
+使用lxml拉取式解析器流式读取word/document.xml，逐个改写经过的正文内容块中的目标段落并直接写入输出zip，
+不构建完整元素树
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import posixpath
+import shutil
+import zipfile
+from copy import deepcopy
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from docx.oxml import element_class_lookup
+except ImportError:
+    # python-docx 1.x moved the lookup into docx.oxml.parser / python-docx 1.x将其移到docx.oxml.parser中
+    from docx.oxml.parser import element_class_lookup
+from lxml import etree
+
+from utils.body_walker import element_paragraphs
+from utils.comments_writer import CommentsAccumulator, EMPTY_COMMENTS_XML, W_NS
+from utils.modification_plan import ModificationPlan
+from utils.text_matcher import RuleKey
+
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+RT_OFFICE_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+RT_COMMENTS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/comments"
+CT_COMMENTS = "application/vnd.openxmlformats-officedocument.wordprocessingml.comments+xml"
+
+# 与内容块对应的正文子元素 / Body children that map to content blocks
+BLOCK_KINDS = {f"{{{W_NS}}}p": 'paragraph', f"{{{W_NS}}}tbl": 'table'}
+
+# 只打开起止标签、不整体缓存的容器；其子元素逐个整体处理 / Containers streamed open/close, their children are handled whole
+_CONTAINERS = {f"{{{W_NS}}}document", f"{{{W_NS}}}body"}
+
+# 每次送入解析器的字节数 / Bytes fed to the parser at a time
+_READ_SIZE = 1024 * 1024
+
+_XML_DECLARATION = b"<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n"
+
+
+class _BlobPart:
+    """Minimal stand-in for a package part holding raw bytes / 保存原始字节的最小部件替身"""
+
+    def __init__(self, blob: bytes):
+        self.blob = blob
+        self._blob = blob
+
+
+class _ScopedWriter:
+    """
+    Writes streamed elements inside their open containers / 在已打开的容器内写出流式元素
+    The open containers are mirrored by an empty shell tree and each element is serialized
+    inside it, so only namespaces not already declared by a container are declared again
+    已打开的容器由一棵空的外壳树镜像，每个元素在外壳中序列化，只有容器尚未声明的命名空间才会再次声明
+    """
+
+    _MARKER = b'<!--streaming-rewriter-marker-->'
+
+    def __init__(self, dst):
+        self.dst = dst
+        self._open: List[Tuple[Any, bytes, bytes]] = []  # (外壳元素, 其内容之前的字节, 其内容之后的字节)
+        dst.write(_XML_DECLARATION)
+
+    def open(self, element):
+        """Write the start tag of a container / 写出容器的起始标签"""
+        if self._open:
+            shell = etree.SubElement(self._open[-1][0], element.tag, dict(element.attrib))
+        else:
+            # 根元素携带全部命名空间声明 / Root carries all namespace declarations
+            shell = etree.Element(element.tag, dict(element.attrib), nsmap=element.nsmap)
+        shell.append(etree.Comment(self._MARKER[4:-3].decode()))
+        raw = etree.tostring(shell.getroottree())
+        shell.remove(shell[0])
+        position = raw.index(self._MARKER)
+        head, tail = raw[:position], raw[position + len(self._MARKER):]
+
+        outer_head = self._open[-1][1] if self._open else b''
+        self.dst.write(head[len(outer_head):])
+        self._open.append((shell, head, tail))
+
+    def close(self):
+        """Write the end tag of the innermost container / 写出最内层容器的结束标签"""
+        shell, _, tail = self._open.pop()
+        outer_tail = self._open[-1][2] if self._open else b''
+        self.dst.write(tail[:len(tail) - len(outer_tail)])
+        if self._open:
+            self._open[-1][0].remove(shell)
+
+    def write(self, element):
+        """Write a complete element into the innermost container / 将完整元素写入最内层容器"""
+        shell, head, tail = self._open[-1]
+        shell.append(element)
+        raw = etree.tostring(shell.getroottree())
+        shell.remove(element)
+        self.dst.write(raw[len(head):len(raw) - len(tail)])
+
+
+def _iterparse(src):
+    """
+    iterparse producing python-docx element classes / 生成python-docx元素类的iterparse
+    Body tables can then be read with python-docx's Table like in the object-model engine
+    这样正文表格可以与对象模型引擎一样通过python-docx的Table读取
+    """
+    parser = etree.XMLPullParser(events=('start', 'end'), huge_tree=True)
+    parser.set_element_class_lookup(element_class_lookup)
+    while True:
+        data = src.read(_READ_SIZE)
+        if not data:
+            break
+        parser.feed(data)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+class StreamingDocxRewriter:
+    """
+    Streaming modification engine / 流式修改引擎
+    Produces the same replacements, highlights and comments as the object-model
+    engine, visiting the same paragraphs, but only one block-level element is held
+    in memory at a time
+    产生与对象模型引擎相同的替换、高亮和批注，访问的段落也相同，但同一时间只在内存中保留一个块级元素
+    """
+
+    def __init__(self, modification_map: Dict[RuleKey, str], reason_for: Callable[[RuleKey], str],
+                 author: str = "Document Editor"):
+        """
+        Initialize rewriter / 初始化改写器
+
+        Args:
+            modification_map: (original_text, match_type) rule key -> new_text / (原文, 匹配方式)规则键到新文本的映射
+            reason_for: Returns the comment text for a rule key / 返回规则键对应的批注内容
+            author: Comment author / 批注作者
+        """
+        self.plan = ModificationPlan(modification_map)
+        self.reason_for = reason_for
+        self.author = author
+        self.paragraph_count = 0
+        self.hit_count = 0
+        self.modified_blocks = []  # 有替换的正文内容块 ('paragraph'|'table', 索引)
+        self.modified_elements = {}  # 有替换的内容块 -> 改写后元素的副本 / Touched block -> copy of its rewritten element
+        self._current_block = None
+
+    def rewrite(self, source, output) -> Dict[str, int]:
+        """
+        Rewrite a docx package into output / 将docx包改写到输出
+
+        Args:
+            source: Path or binary file object of the original docx / 原始docx的路径或二进制文件对象
+            output: Path or binary file object for the result / 结果的路径或二进制文件对象
+
+        Returns:
+            Statistics with modified paragraph and hit counts, the touched blocks and a copy of
+            each touched block's element, so callers can refresh them without reading the output
+            包含修改段落数和命中数的统计、有替换的内容块以及这些内容块元素的副本，调用方无需读取输出即可刷新
+        """
+        self.paragraph_count = 0
+        self.hit_count = 0
+        self.modified_blocks = []
+        self.modified_elements = {}
+
+        with zipfile.ZipFile(source) as zin, zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zout:
+            names = zin.namelist()
+            document_name = self._find_document_part(zin)
+            rels_name = posixpath.join(posixpath.dirname(document_name), '_rels',
+                                       posixpath.basename(document_name) + '.rels')
+
+            rels_root = etree.fromstring(zin.read(rels_name)) if rels_name in names else \
+                etree.Element(f"{{{PKG_REL_NS}}}Relationships", nsmap={None: PKG_REL_NS})
+            comments_name = self._find_comments_part(rels_root, document_name)
+
+            # 已有批注关系但部件缺失时沿用该关系的目标 / Reuse an existing relationship whose part is missing
+            new_relationship = comments_name is None
+            new_comments_part = comments_name not in names
+            if new_comments_part:
+                comments_part = _BlobPart(EMPTY_COMMENTS_XML)
+                if new_relationship:
+                    comments_name = posixpath.join(posixpath.dirname(document_name), 'comments.xml')
+            else:
+                comments_part = _BlobPart(zin.read(comments_name))
+            comments = CommentsAccumulator(comments_part)
+
+            for info in zin.infolist():
+                name = info.filename
+                if name == document_name:
+                    with zin.open(info) as src, zout.open(name, 'w', force_zip64=True) as dst:
+                        self._stream_document(src, dst, comments)
+                elif name == comments_name:
+                    continue  # 文档流处理完后再写入 / Written after the document body
+                elif name == rels_name and new_relationship:
+                    self._add_comments_relationship(rels_root, comments_name, document_name)
+                    zout.writestr(name, self._serialize(rels_root))
+                elif name == '[Content_Types].xml' and new_comments_part:
+                    zout.writestr(name, self._add_comments_content_type(zin.read(name), comments_name))
+                else:
+                    with zin.open(info) as src, zout.open(info, 'w', force_zip64=True) as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+            if new_relationship and rels_name not in names:
+                self._add_comments_relationship(rels_root, comments_name, document_name)
+                zout.writestr(rels_name, self._serialize(rels_root))
+
+            comments.flush()
+            zout.writestr(comments_name, comments_part._blob)
+
+        return {'paragraphs': self.paragraph_count, 'hits': self.hit_count, 'blocks': self.modified_blocks,
+                'elements': self.modified_elements}
+
+    def _stream_document(self, src, dst, comments: CommentsAccumulator):
+        """Stream document.xml from src to dst rewriting the body blocks / 流式复制document.xml并改写正文内容块"""
+        writer = _ScopedWriter(dst)
+        stack = []  # 每个打开元素的类型：container / leaf / inner
+        counters = {'paragraph': 0, 'table': 0}
+        for event, element in _iterparse(src):
+            if event == 'start':
+                at_block_level = not stack or stack[-1] == 'container'
+                if at_block_level and element.tag in _CONTAINERS:
+                    writer.open(element)
+                    stack.append('container')
+                elif at_block_level:
+                    # w:body的直接子元素按段落和表格分别编号（与内容块索引一致），其他位置的元素不是内容块
+                    self._current_block = self._block_key(element.tag, counters) if len(stack) == 2 else None
+                    stack.append('leaf')
+                else:
+                    stack.append('inner')
+                continue
+
+            kind = stack.pop()
+            if kind == 'inner':
+                continue
+
+            parent = element.getparent()
+            if kind == 'container':
+                writer.close()
+            else:
+                if self._current_block is not None:
+                    # 与对象模型引擎相同的段落：正文段落本身和表格单元格段落，不含文本框和内容控件
+                    # Same paragraphs as the object-model engine: the body paragraph itself and table
+                    # cell paragraphs, not text boxes or content controls
+                    for paragraph in list(element_paragraphs(self._current_block[0], element)):
+                        self._rewrite_paragraph(paragraph, comments)
+                    # 只保留有替换的内容块 / Only touched blocks are kept
+                    if self.modified_blocks and self.modified_blocks[-1] == self._current_block:
+                        self.modified_elements[self._current_block] = deepcopy(element)
+                element.tail = None
+                if parent is not None:
+                    parent.remove(element)
+                writer.write(element)
+
+            # 已写出的元素立即释放 / Release written elements right away
+            if parent is not None and kind == 'container':
+                parent.remove(element)
+            element.clear()
+
+    def _rewrite_paragraph(self, paragraph, comments: CommentsAccumulator):
+        """Apply the plan to one w:p / 在一个w:p上应用修改计划"""
+        replaced = self.plan.rewrite_paragraph(
+            paragraph, lambda key: comments.add(self.reason_for(key), self.author))
+        if replaced:
+            self.paragraph_count += 1
+            self.hit_count += replaced
+            block = self._current_block
+            if block is not None and (not self.modified_blocks or self.modified_blocks[-1] != block):
+                self.modified_blocks.append(block)
+
+    @staticmethod
+    def _block_key(tag: str, counters: Dict[str, int]) -> Optional[Tuple[str, int]]:
+        """Content block key of a body child, None for other elements / 正文子元素对应的内容块，其他元素为None"""
+        kind = BLOCK_KINDS.get(tag)
+        if kind is None:
+            return None
+        counters[kind] += 1
+        return kind, counters[kind] - 1
+
+    @staticmethod
+    def _find_document_part(zin: zipfile.ZipFile) -> str:
+        """Locate the main document part through the package relationships / 通过包关系定位主文档部件"""
+        try:
+            root = etree.fromstring(zin.read('_rels/.rels'))
+        except KeyError:
+            return 'word/document.xml'
+        for rel in root.iterchildren(f"{{{PKG_REL_NS}}}Relationship"):
+            if rel.get('Type') == RT_OFFICE_DOCUMENT:
+                return rel.get('Target').lstrip('/')
+        return 'word/document.xml'
+
+    @staticmethod
+    def _find_comments_part(rels_root, document_name: str) -> Optional[str]:
+        """Resolve the comments part name from document relationships / 从文档关系解析批注部件名"""
+        for rel in rels_root.iterchildren(f"{{{PKG_REL_NS}}}Relationship"):
+            if rel.get('Type') == RT_COMMENTS:
+                target = rel.get('Target')
+                if target.startswith('/'):
+                    return target.lstrip('/')
+                return posixpath.normpath(posixpath.join(posixpath.dirname(document_name), target))
+        return None
+
+    @staticmethod
+    def _add_comments_relationship(rels_root, comments_name: str, document_name: str):
+        """Relate the document part to a new comments part / 为文档部件添加指向新批注部件的关系"""
+        existing = {rel.get('Id') for rel in rels_root}
+        number = 1
+        while f"rId{number}" in existing:
+            number += 1
+        etree.SubElement(rels_root, f"{{{PKG_REL_NS}}}Relationship", {
+            'Id': f"rId{number}",
+            'Type': RT_COMMENTS,
+            'Target': posixpath.relpath(comments_name, posixpath.dirname(document_name)),
+        })
+
+    @classmethod
+    def _add_comments_content_type(cls, content_types: bytes, comments_name: str) -> bytes:
+        """Register the comments part content type / 注册批注部件的内容类型"""
+        root = etree.fromstring(content_types)
+        for override in root.iterchildren(f"{{{CT_NS}}}Override"):
+            if override.get('PartName') == '/' + comments_name:
+                return content_types
+        etree.SubElement(root, f"{{{CT_NS}}}Override", {
+            'PartName': '/' + comments_name,
+            'ContentType': CT_COMMENTS,
+        })
+        return cls._serialize(root)
+
+    @staticmethod
+    def _serialize(root) -> bytes:
+        return etree.tostring(root, encoding='UTF-8', xml_declaration=True, standalone=True)
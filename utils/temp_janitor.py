@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Temp janitor module / 临时文件清理模块
+Background thread enforcing the temporary file lifetime: documents not accessed within
+the lifetime are removed with their files, and orphaned files in the upload, temp and
+system temp folders are swept. Each pass works in bounded batches
+在后台线程中执行临时文件保存期限：超过保存期限未被访问的文档连同其文件一起删除，并清扫上传目录、
+临时目录和系统临时目录中的孤立文件。每轮清理按有限批次进行
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import fnmatch
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence
+
+from utils.document_store import DocumentStore
+
+# 系统临时目录中由本应用写入的文件 / Files this application writes to the system temp folder
+SYSTEM_TEMP_PATTERNS = ('*_converted.docx', '*_converted_*.docx', 'streamed_*.docx')
+
+
+class TempFileJanitor:
+    """
+    Periodic cleanup of expired documents and orphaned files / 定期清理过期文档和孤立文件
+    Files whose name starts with a registered doc_id or a referenced upload's content hash
+    belong to that document or upload and are only removed when it goes away
+    文件名以已登记doc_id或被引用上传文件的内容哈希开头的文件属于该文档或上传文件，只在其删除后才清理
+    """
+
+    def __init__(self, store: DocumentStore, discard: Callable[[str], Any], lifetime: float,
+                 folders: Sequence[str], interval: float = 600, batch_size: int = 100,
+                 system_temp_folder: Optional[str] = None, exclude: Iterable[str] = ()):
+        """
+        Initialize janitor / 初始化清理器
+
+        Args:
+            store: Document store / 文档存储
+            discard: Removes a document and its files by doc_id / 按doc_id删除文档及其文件
+            lifetime: Seconds a document or file may stay unused / 文档或文件未使用时的保存秒数
+            folders: Folders swept for orphaned files, recursively / 递归清扫孤立文件的目录
+            interval: Seconds between passes / 两轮清理之间的秒数
+            batch_size: Maximum documents and files removed per pass / 每轮最多删除的文档数和文件数
+            system_temp_folder: System temp folder, only SYSTEM_TEMP_PATTERNS are swept there
+                                系统临时目录，其中只清扫匹配SYSTEM_TEMP_PATTERNS的文件
+            exclude: Files never removed, e.g. the registry database / 永不删除的文件，例如登记表数据库
+        """
+        self.store = store
+        self.discard = discard
+        self.lifetime = lifetime
+        self.folders = tuple(folders)
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.system_temp_folder = system_temp_folder
+        self.exclude = {os.path.abspath(path) for path in exclude}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {
+            'passes': 0,
+            'documents_expired': 0,
+            'files_removed': 0,
+            'bytes_removed': 0,
+            'errors': 0,
+            'last_pass': None,
+            'last_pass_seconds': None
+        }
+
+    def start(self):
+        """Start the background thread once / 启动后台线程（只启动一次）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='temp-janitor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread / 停止后台线程"""
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                self._stats['errors'] += 1
+                print(f"临时文件清理失败: {str(e)}")
+
+    def run_once(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        Run one cleanup pass / 执行一轮清理
+
+        Args:
+            now: Current time, for tests / 当前时间，用于测试
+
+        Returns:
+            Documents expired and files removed in this pass / 本轮过期的文档数和删除的文件数
+        """
+        started = time.time()
+        cutoff = (now or started) - self.lifetime
+
+        expired = 0
+        for doc_id in self.store.registry.expired(cutoff, self.batch_size):
+            doc_info = self.store.peek(doc_id)
+            if doc_info is None or doc_info.get('status') == 'processing':
+                continue
+            try:
+                self.discard(doc_id)
+                expired += 1
+            except Exception as e:
+                self._stats['errors'] += 1
+                print(f"删除过期文档失败 {doc_id}: {str(e)}")
+
+        # 过期文档删除之后再读取，已删除文档的文件在本轮即成为孤立文件
+        # Read after expiring so files of the documents just removed are already orphans
+        live_ids = set(self.store.registry.ids()) | set(self.store.registry.blob_hashes())
+        removed = 0
+        removed_bytes = 0
+        for path, size in self._orphans(cutoff, live_ids):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                self._stats['errors'] += 1
+                print(f"删除临时文件失败 {path}: {str(e)}")
+                continue
+            removed += 1
+            removed_bytes += size
+            if removed >= self.batch_size:
+                break
+
+        with self._lock:
+            self._stats['passes'] += 1
+            self._stats['documents_expired'] += expired
+            self._stats['files_removed'] += removed
+            self._stats['bytes_removed'] += removed_bytes
+            self._stats['last_pass'] = started
+            self._stats['last_pass_seconds'] = round(time.time() - started, 3)
+        return {'documents_expired': expired, 'files_removed': removed}
+
+    def _orphans(self, cutoff: float, live_ids: set) -> Iterator[tuple]:
+        """Yield (path, size) of files older than cutoff that no document owns / 生成早于cutoff且不属于任何文档的文件(路径, 大小)"""
+        for folder in self.folders:
+            yield from self._scan(folder, cutoff, live_ids, None, recursive=True)
+        if self.system_temp_folder:
+            yield from self._scan(self.system_temp_folder, cutoff, live_ids, SYSTEM_TEMP_PATTERNS, recursive=False)
+
+    def _scan(self, folder: str, cutoff: float, live_ids: set, patterns: Optional[Sequence[str]],
+              recursive: bool) -> Iterator[tuple]:
+        try:
+            entries = os.scandir(folder)
+        except OSError:
+            return
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            yield from self._scan(entry.path, cutoff, live_ids, patterns, recursive)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    if patterns is not None and not any(fnmatch.fnmatch(entry.name, p) for p in patterns):
+                        continue
+                    if self._is_excluded(entry.path) or self._owner(entry.name) in live_ids:
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if stat.st_mtime < cutoff:
+                    yield entry.path, stat.st_size
+
+    def _is_excluded(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        # SQLite的-wal/-shm文件与数据库一同排除 / SQLite -wal/-shm files are excluded with the database
+        return any(path == excluded or path.startswith(excluded + '-') for excluded in self.exclude)
+
+    @staticmethod
+    def _owner(name: str) -> str:
+        """doc_id or content hash prefix of a '<owner>_<name>' file / '<所有者>_<文件名>'格式文件的doc_id或内容哈希前缀"""
+        return name.split('_', 1)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Janitor statistics / 清理器统计信息
+
+        Returns:
+            Pass count, totals removed and the last pass time / 清理轮数、删除总数以及上一轮的时间
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['running'] = self._thread is not None and self._thread.is_alive()
+        stats['interval'] = self.interval
+        stats['lifetime'] = self.lifetime
+        return stats
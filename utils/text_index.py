@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+N-gram text index module / N元组文本索引模块
+Inverted index from character n-grams to paragraph positions, built once per
+document so that lookups go straight to candidate paragraphs (CJK friendly)
+字符N元组到段落位置的倒排索引，每个文档构建一次，查找时直接定位候选段落（适用于中文）
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+class NGramIndex:
+    """
+    Character n-gram inverted index / 字符N元组倒排索引
+    Candidates are a superset of real matches and are verified against the stored text
+    候选集合是实际匹配的超集，需要用存储的文本进行验证
+    """
+
+    def __init__(self, texts: List[str], n: int = 2):
+        """
+        Build the index / 构建索引
+
+        Args:
+            texts: Paragraph texts by position / 按位置排列的段落文本
+            n: Gram length, 2 suits CJK text / N元组长度，2适合中文
+        """
+        self.n = n
+        self.texts = texts
+        self._postings: Dict[str, Set[int]] = {}
+
+        for position, text in enumerate(texts):
+            for gram in {text[i:i + n] for i in range(len(text) - n + 1)}:
+                postings = self._postings.get(gram)
+                if postings is None:
+                    postings = self._postings[gram] = set()
+                postings.add(position)
+
+    @classmethod
+    def from_state(cls, texts: List[str], state: Dict[str, Any]) -> 'NGramIndex':
+        """
+        Rebuild an index from export_state() without re-scanning the texts / 由export_state()的结果重建索引，不重新扫描文本
+
+        Args:
+            texts: Paragraph texts the state was built from / 构建该状态时的段落文本
+            state: Exported state / 导出的状态
+        """
+        index = cls.__new__(cls)
+        index.n = state['n']
+        index.texts = texts
+        index._postings = {gram: set(positions) for gram, positions in state['postings'].items()}
+        return index
+
+    def export_state(self) -> Dict[str, Any]:
+        """
+        JSON-serializable postings, texts are stored by the caller / 可JSON序列化的倒排表，文本由调用方保存
+
+        Returns:
+            {'n', 'postings': {gram: [positions]}}
+        """
+        return {
+            'n': self.n,
+            'postings': {gram: sorted(positions) for gram, positions in self._postings.items()}
+        }
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def candidates(self, pattern: str) -> Set[int]:
+        """
+        Positions that may contain pattern / 可能包含模式的段落位置
+
+        Args:
+            pattern: Literal text / 字面文本
+
+        Returns:
+            Set of paragraph positions / 段落位置集合
+        """
+        if not pattern:
+            return set()
+
+        if len(pattern) < self.n:
+            # 模式短于N元组时直接验证 / Too short for grams, check directly
+            return {position for position, text in enumerate(self.texts) if pattern in text}
+
+        posting_sets = []
+        for gram in {pattern[i:i + self.n] for i in range(len(pattern) - self.n + 1)}:
+            postings = self._postings.get(gram)
+            if not postings:
+                return set()
+            posting_sets.append(postings)
+
+        posting_sets.sort(key=len)
+        result = set(posting_sets[0])
+        for postings in posting_sets[1:]:
+            result &= postings
+            if not result:
+                break
+        return result
+
+    def candidates_for_any(self, patterns: Iterable[str]) -> Set[int]:
+        """Positions that may contain any of the patterns / 可能包含任一模式的段落位置"""
+        result = set()
+        for pattern in patterns:
+            result |= self.candidates(pattern)
+        return result
+
+    def find(self, pattern: str, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Locate verified occurrences of pattern / 定位经过验证的模式出现位置
+
+        Args:
+            pattern: Literal text / 字面文本
+            limit: Maximum number of hits / 最大命中数
+
+        Returns:
+            List of (position, offset) in document order / 按文档顺序排列的(段落位置, 偏移)列表
+        """
+        hits = []
+        for position in sorted(self.candidates(pattern)):
+            text = self.texts[position]
+            offset = text.find(pattern)
+            while offset >= 0:
+                hits.append((position, offset))
+                if limit is not None and len(hits) >= limit:
+                    return hits
+                offset = text.find(pattern, offset + len(pattern))
+        return hits
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Multi-pattern text matcher module / 多模式文本匹配模块
+Compiles a set of literal patterns into an Aho-Corasick automaton so that
+every modification key can be located in a single pass over a paragraph
+使用Aho-Corasick自动机编译一组字面模式，一次遍历段落即可定位所有修改条目
+
+Document Preview Editor
+Copyright (c) 2025 sawyer-shi
+Licensed under the Apache License, Version 2.0
+https://github.com/sawyer-shi/document-preview-editor
+"""
+
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Match tuple: (start, end, pattern) / 匹配元组：(起始位置, 结束位置, 模式)
+Match = Tuple[int, int, str]
+
+# Rule key: (pattern, match_type); case-insensitive matching is a match type of its own, so
+# the same text with different match types or case handling makes different rules
+# 规则键：(模式, 匹配方式)；忽略大小写本身就是一种匹配方式，相同文本的不同匹配方式或大小写处理是不同的规则
+RuleKey = Tuple[str, str]
+
+# Rule match tuple: (start, end, rule key) / 规则匹配元组：(起始位置, 结束位置, 规则键)
+RuleMatch = Tuple[int, int, RuleKey]
+
+# Supported match types / 支持的匹配方式
+MATCH_LITERAL = 'literal'
+MATCH_REGEX = 'regex'
+MATCH_WHOLE_WORD = 'whole_word'
+MATCH_CASE_INSENSITIVE = 'case_insensitive'
+MATCH_TYPES = (MATCH_LITERAL, MATCH_REGEX, MATCH_WHOLE_WORD, MATCH_CASE_INSENSITIVE)
+
+# Accepted spellings in CSV and JSON input / CSV和JSON输入中接受的写法
+_MATCH_TYPE_ALIASES = {
+    '': MATCH_LITERAL,
+    'literal': MATCH_LITERAL,
+    'exact': MATCH_LITERAL,
+    '精确': MATCH_LITERAL,
+    '字面': MATCH_LITERAL,
+    'regex': MATCH_REGEX,
+    'regexp': MATCH_REGEX,
+    '正则': MATCH_REGEX,
+    'whole_word': MATCH_WHOLE_WORD,
+    'wholeword': MATCH_WHOLE_WORD,
+    'word': MATCH_WHOLE_WORD,
+    '全词': MATCH_WHOLE_WORD,
+    'case_insensitive': MATCH_CASE_INSENSITIVE,
+    'ignore_case': MATCH_CASE_INSENSITIVE,
+    'nocase': MATCH_CASE_INSENSITIVE,
+    '忽略大小写': MATCH_CASE_INSENSITIVE,
+}
+
+
+def normalize_match_type(value: Optional[str]) -> Optional[str]:
+    """
+    Normalize a user supplied match type / 规范化用户提供的匹配方式
+
+    Args:
+        value: Match type as written in CSV or JSON, None means literal / CSV或JSON中的匹配方式，None表示字面匹配
+
+    Returns:
+        One of MATCH_TYPES, or None if unknown / MATCH_TYPES之一，无法识别时返回None
+    """
+    if value is None:
+        return MATCH_LITERAL
+    key = str(value).strip().lower().replace('-', '_').replace(' ', '_')
+    return _MATCH_TYPE_ALIASES.get(key)
+
+
+def compile_rule(pattern: str, match_type: str):
+    """
+    Compile a non-literal rule into a regular expression / 将非字面规则编译为正则表达式
+
+    Raises:
+        re.error: If a regex rule is invalid / 正则规则无效时抛出
+    """
+    if match_type == MATCH_REGEX:
+        return re.compile(pattern)
+    if match_type == MATCH_WHOLE_WORD:
+        return re.compile(r'(?<!\w)' + re.escape(pattern) + r'(?!\w)')
+    if match_type == MATCH_CASE_INSENSITIVE:
+        return re.compile(re.escape(pattern), re.IGNORECASE)
+    raise ValueError(f"not a compiled match type: {match_type}")
+
+
+class AhoCorasickMatcher:
+    """
+    Aho-Corasick multi-pattern matcher / Aho-Corasick多模式匹配器
+    Built once per modification set and reused for every paragraph
+    每个修改集合构建一次，并在所有段落间复用
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        """
+        Compile patterns into the automaton / 将模式编译为自动机
+
+        Args:
+            patterns: Literal patterns, empty strings are ignored / 字面模式，忽略空字符串
+        """
+        self.patterns: List[str] = []
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[int] = [-1]  # pattern index ending at node / 在该节点结束的模式索引
+        self._dict_link: List[int] = [0]  # next node on fail chain with output / 失败链上下一个有输出的节点
+
+        seen = set()
+        for pattern in patterns:
+            if not pattern or pattern in seen:
+                continue
+            seen.add(pattern)
+            self._add_pattern(pattern)
+
+        self._build_links()
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def _add_pattern(self, pattern: str):
+        """Insert a pattern into the trie / 将模式插入字典树"""
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(-1)
+                self._dict_link.append(0)
+                self._goto[node][char] = next_node
+            node = next_node
+        self._output[node] = len(self.patterns)
+        self.patterns.append(pattern)
+
+    def _build_links(self):
+        """Compute failure and dictionary-suffix links (BFS) / 计算失败链接和字典后缀链接（广度优先）"""
+        queue = deque()
+        for child in self._goto[0].values():
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+
+                fail_node = self._fail[child]
+                self._dict_link[child] = fail_node if self._output[fail_node] >= 0 else self._dict_link[fail_node]
+
+    def iter_all(self, text: str):
+        """
+        Yield every (possibly overlapping) match / 生成所有（可能重叠的）匹配
+
+        Args:
+            text: Text to scan / 要扫描的文本
+
+        Yields:
+            (start, end, pattern) tuples / (起始, 结束, 模式)元组
+        """
+        if not self.patterns or not text:
+            return
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        dict_link = self._dict_link
+        patterns = self.patterns
+
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+
+            hit = node if output[node] >= 0 else dict_link[node]
+            while hit:
+                pattern = patterns[output[hit]]
+                end = position + 1
+                yield end - len(pattern), end, pattern
+                hit = dict_link[hit]
+
+    def find_all(self, text: str) -> List[Match]:
+        """
+        Find non-overlapping matches, leftmost then longest first / 查找不重叠的匹配，最左优先、最长优先
+
+        Overlaps are resolved deterministically: the match starting earliest wins,
+        and among matches with the same start the longest one wins
+        重叠按确定性规则处理：起始位置最早者优先，起始相同时最长者优先
+
+        Args:
+            text: Text to scan / 要扫描的文本
+
+        Returns:
+            Sorted list of (start, end, pattern) / 排序后的(起始, 结束, 模式)列表
+        """
+        candidates = sorted(self.iter_all(text), key=lambda match: (match[0], -(match[1] - match[0])))
+
+        matches = []
+        last_end = 0
+        for start, end, pattern in candidates:
+            if start >= last_end:
+                matches.append((start, end, pattern))
+                last_end = end
+        return matches
+
+    def contains_any(self, text: str) -> bool:
+        """Check whether any pattern occurs in text / 检查文本中是否出现任一模式"""
+        for _ in self.iter_all(text):
+            return True
+        return False
+
+
+class RuleMatcher:
+    """
+    Mixed literal / pattern rule matcher / 字面与模式混合规则匹配器
+    Literal rules share one Aho-Corasick automaton and the remaining rules form a
+    small set of regular expressions; both are compiled once per modification set
+    字面规则共用一个Aho-Corasick自动机，其余规则组成少量正则表达式；每个修改集合只编译一次
+    """
+
+    def __init__(self, rules: Iterable[RuleKey]):
+        """
+        Compile rules / 编译规则
+
+        Args:
+            rules: (pattern, match_type) rule keys / (模式, 匹配方式)规则键
+
+        Raises:
+            re.error: If a regex rule is invalid / 正则规则无效时抛出
+        """
+        literals = []
+        self._patterns: Dict[RuleKey, 're.Pattern'] = {}
+        # 保持顺序去重 / Deduplicated in order
+        self.keys: List[RuleKey] = list(dict.fromkeys(key for key in rules if key[0]))
+        self._key_set = set(self.keys)
+
+        for key in self.keys:
+            pattern, match_type = key
+            if match_type == MATCH_LITERAL:
+                literals.append(pattern)
+            else:
+                self._patterns[key] = compile_rule(pattern, match_type)
+
+        self.literals = AhoCorasickMatcher(literals)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._key_set
+
+    @property
+    def indexable_keys(self) -> List[RuleKey]:
+        """Keys whose text must appear verbatim, usable with a text index / 文本必须原样出现、可用于文本索引的规则键"""
+        return [key for key in self.keys if key[1] in (MATCH_LITERAL, MATCH_WHOLE_WORD)]
+
+    @property
+    def fully_indexable(self) -> bool:
+        """Whether every rule can be narrowed down by a text index / 是否所有规则都能通过文本索引缩小范围"""
+        return all(key[1] in (MATCH_LITERAL, MATCH_WHOLE_WORD) for key in self.keys)
+
+    def find_all(self, text: str) -> List[RuleMatch]:
+        """
+        Find non-overlapping rule matches, leftmost then longest first / 查找不重叠的规则匹配，最左优先、最长优先
+
+        Args:
+            text: Text to scan / 要扫描的文本
+
+        Returns:
+            Sorted list of (start, end, rule key) / 排序后的(起始, 结束, 规则键)列表
+        """
+        if not self._patterns:
+            return [(start, end, (pattern, MATCH_LITERAL)) for start, end, pattern in self.literals.find_all(text)]
+
+        candidates = [(start, end, (pattern, MATCH_LITERAL)) for start, end, pattern in self.literals.iter_all(text)]
+        for key, compiled in self._patterns.items():
+            for match in compiled.finditer(text):
+                if match.end() > match.start():
+                    candidates.append((match.start(), match.end(), key))
+        candidates.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+
+        matches = []
+        last_end = 0
+        for start, end, key in candidates:
+            if start >= last_end:
+                matches.append((start, end, key))
+                last_end = end
+        return matches
+
+    def replacement(self, key: RuleKey, template: str, text: str, start: int) -> str:
+        """
+        Replacement text for a match / 计算匹配的替换文本
+
+        Regex rules may refer to groups in the template (\\1, \\g<name>)
+        正则规则的替换模板可以引用分组（\\1、\\g<name>）
+
+        Args:
+            key: Rule key returned by find_all / find_all返回的规则键
+            template: Configured new_text / 配置的新文本
+            text: Text that was scanned / 被扫描的文本
+            start: Match start offset / 匹配起始偏移
+        """
+        if key[1] != MATCH_REGEX:
+            return template
+        match = self._patterns[key].match(text, start)
+        if match is None:
+            return template
+        try:
+            return match.expand(template)
+        except (re.error, IndexError):
+            # 模板中的反斜杠不是分组引用时按原样使用 / Use the template verbatim if it is not a valid expansion
+            return template